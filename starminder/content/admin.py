@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from starminder.content.models import Reminder, Star
+from starminder.content.models import OutboxEmail, Reminder, Star
 
+admin.site.register(OutboxEmail)
 admin.site.register(Reminder)
 admin.site.register(Star)
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0009_star_archived"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reminder",
+            index=models.Index(
+                fields=["user", "-created_at"], name="reminder_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="star",
+            index=models.Index(
+                fields=["reminder", "id", "provider_id"], name="star_reminder_shown_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:19
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_delivered_at(apps, schema_editor):
+    # every existing reminder was sent as soon as it was created
+    Reminder = apps.get_model("content", "Reminder")
+    Reminder.objects.update(delivered_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0010_reminder_star_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reminder",
+            name="delivered_at",
+            field=models.DateTimeField(
+                blank=True, default=django.utils.timezone.now, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_delivered_at, migrations.RunPython.noop),
+    ]
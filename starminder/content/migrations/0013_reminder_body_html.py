@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:49
+
+from itertools import batched
+
+import emoji
+from django.db import migrations, models
+from django.template.loader import render_to_string
+
+BATCH_SIZE = 500
+
+
+def render_reminder_bodies(apps, schema_editor):
+    Reminder = apps.get_model("content", "Reminder")
+    reminders = Reminder.objects.prefetch_related("star_set").order_by("id")
+    for batch in batched(reminders.iterator(chunk_size=BATCH_SIZE), BATCH_SIZE):
+        for reminder in batch:
+            stars = list(reminder.star_set.all())
+            # historical models lack Star.description_pretty
+            for star in stars:
+                star.description_pretty = emoji.emojize(
+                    star.description, language="alias"
+                )
+            reminder.body_html = render_to_string(
+                "_reminder_body.html", {"stars": stars}
+            )
+        Reminder.objects.bulk_update(batch, ["body_html"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0012_outboxemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reminder",
+            name="body_html",
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(render_reminder_bodies, migrations.RunPython.noop),
+    ]
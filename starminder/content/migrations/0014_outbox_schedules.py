@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:12
+
+from django.db import migrations
+
+# reminder emails only go out through these, so they are created on migrate
+# rather than left to `setup_schedules`, which keeps them up to date afterwards,
+# including which cluster they are routed to
+OUTBOX_SCHEDULES = [
+    (
+        "dispatch_outbox_minutely",
+        "starminder.content.outbox.dispatch_outbox",
+        "* * * * *",
+    ),
+    ("purge_outbox_daily", "starminder.content.outbox.purge_outbox", "30 4 * * *"),
+]
+
+
+def create_outbox_schedules(apps, schema_editor):
+    Schedule = apps.get_model("django_q", "Schedule")
+    for name, func, cron in OUTBOX_SCHEDULES:
+        Schedule.objects.get_or_create(
+            name=name,
+            defaults={
+                "func": func,
+                "schedule_type": "C",
+                "cron": cron,
+                "cluster": None,
+            },
+        )
+
+
+def delete_outbox_schedules(apps, schema_editor):
+    Schedule = apps.get_model("django_q", "Schedule")
+    Schedule.objects.filter(name__in=[name for name, *_ in OUTBOX_SCHEDULES]).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0013_reminder_body_html"),
+        ("django_q", "0014_schedule_cluster"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_outbox_schedules, delete_outbox_schedules),
+    ]
@@ -1,5 +1,22 @@
+from collections.abc import Iterable
+
 from django.conf import settings
-from django.db.models import CASCADE, ForeignKey, Manager
+from django.db.models import (
+    CASCADE,
+    SET_NULL,
+    CharField,
+    DateTimeField,
+    ForeignKey,
+    Index,
+    Manager,
+    PositiveIntegerField,
+    Q,
+    QuerySet,
+    TextField,
+)
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import SafeString, mark_safe
 import emoji
 
 from starminder.core.models import StarFieldsBase, TimestampedModel
@@ -8,14 +25,27 @@ from starminder.core.models import StarFieldsBase, TimestampedModel
 TIMESTAMP_FORMAT = "%A %Y-%m-%d %H:%M:%S"
 
 
+class ReminderManager(Manager["Reminder"]):
+    def delivered(self) -> "QuerySet[Reminder]":
+        """Reminders that were sent, leaving out ones built ahead of their slot."""
+        return self.get_queryset().filter(delivered_at__isnull=False)
+
+
 class Reminder(TimestampedModel):
-    objects: "Manager[Reminder]"
+    objects: ReminderManager = ReminderManager()
     star_set: "Manager[Star]"
 
     user = ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE)
+    delivered_at = DateTimeField(null=True, blank=True, default=timezone.now)
+    # reminders don't change once created, so their stars are rendered once
+    body_html = TextField(blank=True)
 
     class Meta:
         verbose_name = "Reminder"
+        indexes = [
+            # feeds list a user's reminders newest first
+            Index(fields=["user", "-created_at"], name="reminder_user_created_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.user.username}, {self.created_at.date()}"
@@ -24,6 +54,12 @@ class Reminder(TimestampedModel):
     def title(self) -> str:
         return f"Reminder: {self.created_at.strftime(TIMESTAMP_FORMAT)}"
 
+    @property
+    def body(self) -> SafeString:
+        """The rendered stars, stored when the reminder was created."""
+        # rendered by the autoescaping template engine
+        return mark_safe(self.body_html)
+
 
 class Star(TimestampedModel, StarFieldsBase):
     objects: "Manager[Star]"
@@ -32,6 +68,14 @@ class Star(TimestampedModel, StarFieldsBase):
 
     class Meta:
         verbose_name = "Star"
+        indexes = [
+            # the repos shown since the cycle started, when the shown set is
+            # rebuilt; plain key columns, SQLite ignores INCLUDE
+            Index(
+                fields=["reminder", "id", "provider_id"],
+                name="star_reminder_shown_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.owner}/{self.name}, {self.provider}, {self.reminder}"
@@ -39,3 +83,50 @@ class Star(TimestampedModel, StarFieldsBase):
     @property
     def description_pretty(self) -> str:
         return emoji.emojize(self.description, language="alias")
+
+
+def render_reminder_body(stars: Iterable[Star]) -> str:
+    """Render a reminder's stars into the HTML shared by its email, page and feed."""
+    return render_to_string("_reminder_body.html", {"stars": stars})
+
+
+class OutboxEmail(TimestampedModel):
+    """An email waiting in, or sent from, the outbox (see starminder.content.outbox)."""
+
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "pending"),
+        (STATUS_SENT, "sent"),
+        (STATUS_FAILED, "failed"),
+    ]
+
+    objects: "Manager[OutboxEmail]"
+
+    reminder = ForeignKey(Reminder, on_delete=SET_NULL, null=True, blank=True)
+    recipient = CharField(max_length=254)
+    subject = CharField(max_length=255)
+    html = TextField()
+    text = TextField()
+    status = CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = PositiveIntegerField(default=0)
+    # pushed back while a dispatcher holds the email and after each failure
+    next_attempt_at = DateTimeField(default=timezone.now)
+    sent_at = DateTimeField(null=True, blank=True)
+    last_error = TextField(blank=True)
+
+    class Meta:
+        verbose_name = "Outbox Email"
+        indexes = [
+            # the dispatcher drains pending emails in next_attempt_at order
+            Index(
+                fields=["next_attempt_at"],
+                condition=Q(status="pending"),
+                name="outbox_pending_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.status}: {self.recipient}, {self.subject}"
@@ -0,0 +1,171 @@
+import asyncio
+from datetime import timedelta
+from http import HTTPStatus
+from time import monotonic
+
+import httpx
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from loguru import logger
+
+from starminder.content.email import build_email_request
+from starminder.content.models import OutboxEmail, Reminder
+from starminder.core.http import get_async_client, run_async
+
+# emails claimed from the outbox per batch
+OUTBOX_BATCH_SIZE = 100
+# other dispatchers leave a claimed email alone for this long; a dispatcher
+# dying mid-batch has its emails sent again once the claim runs out
+OUTBOX_CLAIM_SECONDS = 300
+# stop claiming batches after this long, well inside the email queue's timeout;
+# the next run picks up whatever is left
+OUTBOX_DISPATCH_SECONDS = 45
+
+# why a send failed and whether it is worth retrying, None when it was sent
+type SendResult = tuple[str, bool] | None
+
+
+def enqueue_email(
+    recipient: str,
+    subject: str,
+    html: str,
+    text: str,
+    reminder: Reminder | None = None,
+) -> OutboxEmail:
+    """Add an email to the outbox for the next `dispatch_outbox` run to send."""
+    logger.info(f"Adding email to {recipient} to the outbox")
+
+    return OutboxEmail.objects.create(
+        reminder=reminder,
+        recipient=recipient,
+        subject=subject,
+        html=html,
+        text=text,
+    )
+
+
+def dispatch_outbox() -> None:
+    """Send the outbox's due emails in batches until none are left."""
+    started = monotonic()
+    sent_count = failed_count = 0
+
+    while monotonic() - started < OUTBOX_DISPATCH_SECONDS:
+        if not (emails := claim_outbox_batch()):
+            break
+
+        results = run_async(send_outbox_batch(emails))
+        batch_sent_count = record_outbox_results(emails, results)
+        sent_count += batch_sent_count
+        failed_count += len(emails) - batch_sent_count
+
+    logger.info(f"Dispatched {sent_count} emails, {failed_count} failed")
+
+
+def claim_outbox_batch() -> list[OutboxEmail]:
+    """Take the next due emails, hiding them from other dispatchers."""
+    now = timezone.now()
+
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:OUTBOX_BATCH_SIZE]
+        )
+        if emails:
+            OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(
+                next_attempt_at=now + timedelta(seconds=OUTBOX_CLAIM_SECONDS),
+                updated_at=now,
+            )
+
+    return emails
+
+
+async def send_outbox_batch(emails: list[OutboxEmail]) -> list[SendResult]:
+    """Send a batch on the pooled ForwardEmail transport, a few at a time."""
+    semaphore = asyncio.Semaphore(settings.OUTBOX_CONCURRENCY)
+
+    async with get_async_client("forwardemail") as client:
+
+        async def send(email: OutboxEmail) -> SendResult:
+            async with semaphore:
+                try:
+                    response = await client.post(
+                        settings.FORWARDEMAIL_API_URL,
+                        **build_email_request(
+                            email.recipient, email.subject, email.html, email.text
+                        ),
+                    )
+                except httpx.HTTPError as error:
+                    return repr(error), True
+
+            if response.status_code == HTTPStatus.OK:
+                return None
+
+            # rejected emails (bad address, bad token) won't go through on retry
+            retryable = (
+                response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+                or response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+            )
+            return f"{response.status_code}: {response.text[:500]}", retryable
+
+        return await asyncio.gather(*(send(email) for email in emails))
+
+
+def record_outbox_results(emails: list[OutboxEmail], results: list[SendResult]) -> int:
+    """Store each email's delivery status, scheduling retries; return the sent count."""
+    now = timezone.now()
+
+    sent_ids = [email.id for email, result in zip(emails, results) if result is None]
+    OutboxEmail.objects.filter(id__in=sent_ids).update(
+        status=OutboxEmail.STATUS_SENT,
+        attempts=F("attempts") + 1,
+        sent_at=now,
+        last_error="",
+        updated_at=now,
+    )
+
+    failed_emails = []
+    for email, result in zip(emails, results):
+        if result is None:
+            continue
+
+        error, retryable = result
+        email.attempts += 1
+        email.last_error = error
+        email.updated_at = now
+
+        if retryable and email.attempts < settings.OUTBOX_MAX_ATTEMPTS:
+            email.next_attempt_at = now + timedelta(
+                seconds=settings.OUTBOX_RETRY_BACKOFF_SECONDS
+                * 2 ** (email.attempts - 1)
+            )
+            logger.warning(
+                f"Email to {email.recipient} failed, retrying at "
+                f"{email.next_attempt_at}: {error}"
+            )
+        else:
+            email.status = OutboxEmail.STATUS_FAILED
+            logger.critical(f"Email sending failed: {email.recipient}, {error}")
+
+        failed_emails.append(email)
+
+    OutboxEmail.objects.bulk_update(
+        failed_emails,
+        ["status", "attempts", "next_attempt_at", "last_error", "updated_at"],
+    )
+
+    return len(sent_ids)
+
+
+def purge_outbox() -> None:
+    """Delete sent and failed emails older than `OUTBOX_RETENTION_DAYS`."""
+    cutoff = timezone.now() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    deleted_count, _ = (
+        OutboxEmail.objects.exclude(status=OutboxEmail.STATUS_PENDING)
+        .filter(updated_at__lt=cutoff)
+        .delete()
+    )
+
+    logger.info(f"Purged {deleted_count} outbox emails")
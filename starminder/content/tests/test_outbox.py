@@ -0,0 +1,246 @@
+import asyncio
+import json
+from datetime import timedelta
+from http import HTTPStatus
+from unittest.mock import patch
+
+import httpx
+import pytest
+from django.utils import timezone
+from django_q.models import Schedule
+
+from starminder.content.models import OutboxEmail
+from starminder.content.outbox import dispatch_outbox, enqueue_email, purge_outbox
+
+FAKE_FORWARDEMAIL_URL = "http://forwardemail.test/v1/emails"
+
+
+@pytest.fixture(autouse=True)
+def fake_forwardemail(settings):
+    settings.FORWARDEMAIL_API_URL = FAKE_FORWARDEMAIL_URL
+    settings.FORWARDEMAIL_TOKEN = "test_token"
+    settings.OUTBOX_RETRY_BACKOFF_SECONDS = 60
+    settings.OUTBOX_MAX_ATTEMPTS = 3
+
+
+def forwardemail_transport(
+    statuses: dict[str, int] | None = None,
+    requests: list[httpx.Request] | None = None,
+) -> httpx.MockTransport:
+    """Fake ForwardEmail API, answering each recipient with its status or 200."""
+    statuses = statuses or {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if requests is not None:
+            requests.append(request)
+        recipient = json.loads(request.content)["to"]
+        return httpx.Response(statuses.get(recipient, HTTPStatus.OK), text="ok")
+
+    return httpx.MockTransport(handler)
+
+
+def create_emails(count: int) -> list[OutboxEmail]:
+    return [
+        enqueue_email(
+            recipient=f"user{i}@example.com",
+            subject="Test Subject",
+            html="<p>Test HTML</p>",
+            text="Test text",
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.mark.django_db
+def test_enqueue_email_adds_pending_email() -> None:
+    (email,) = create_emails(1)
+
+    assert email.status == OutboxEmail.STATUS_PENDING
+    assert email.attempts == 0
+    assert email.next_attempt_at <= timezone.now()
+
+
+@pytest.mark.django_db
+@patch("starminder.content.outbox.OUTBOX_BATCH_SIZE", 2)
+@patch("starminder.core.http.get_async_transport")
+def test_dispatch_outbox_sends_every_due_email_in_batches(
+    mock_get_async_transport,
+) -> None:
+    requests = []
+    mock_get_async_transport.return_value = forwardemail_transport(requests=requests)
+    create_emails(5)
+
+    dispatch_outbox()
+
+    assert len(requests) == 5
+    assert {str(request.url) for request in requests} == {FAKE_FORWARDEMAIL_URL}
+    assert requests[0].headers["Authorization"] == "Basic dGVzdF90b2tlbjo="
+    assert not OutboxEmail.objects.exclude(status=OutboxEmail.STATUS_SENT).exists()
+    assert not OutboxEmail.objects.filter(sent_at__isnull=True).exists()
+    assert set(OutboxEmail.objects.values_list("attempts", flat=True)) == {1}
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_dispatch_outbox_bounds_concurrent_sends(
+    mock_get_async_transport, settings
+) -> None:
+    settings.OUTBOX_CONCURRENCY = 2
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(HTTPStatus.OK)
+
+    mock_get_async_transport.return_value = httpx.MockTransport(handler)
+    create_emails(6)
+
+    dispatch_outbox()
+
+    assert OutboxEmail.objects.filter(status=OutboxEmail.STATUS_SENT).count() == 6
+    assert max_in_flight == 2
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_dispatch_outbox_retries_transient_failures_with_backoff(
+    mock_get_async_transport,
+) -> None:
+    requests = []
+    mock_get_async_transport.return_value = forwardemail_transport(
+        {"user0@example.com": HTTPStatus.SERVICE_UNAVAILABLE}, requests
+    )
+    failing, sent = create_emails(2)
+
+    dispatch_outbox()
+
+    failing.refresh_from_db()
+    assert failing.status == OutboxEmail.STATUS_PENDING
+    assert failing.attempts == 1
+    assert failing.last_error.startswith("503")
+    assert failing.next_attempt_at > timezone.now() + timedelta(seconds=50)
+    sent.refresh_from_db()
+    assert sent.status == OutboxEmail.STATUS_SENT
+    # the failed email waits out its backoff instead of being retried right away
+    assert len(requests) == 2
+
+    OutboxEmail.objects.filter(id=failing.id).update(next_attempt_at=timezone.now())
+    dispatch_outbox()
+
+    failing.refresh_from_db()
+    assert failing.attempts == 2
+    assert failing.next_attempt_at > timezone.now() + timedelta(seconds=110)
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_dispatch_outbox_retries_network_errors(mock_get_async_transport) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused")
+
+    mock_get_async_transport.return_value = httpx.MockTransport(handler)
+    (email,) = create_emails(1)
+
+    dispatch_outbox()
+
+    email.refresh_from_db()
+    assert email.status == OutboxEmail.STATUS_PENDING
+    assert email.attempts == 1
+    assert "connection refused" in email.last_error
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_dispatch_outbox_fails_rejected_emails(mock_get_async_transport) -> None:
+    mock_get_async_transport.return_value = forwardemail_transport(
+        {"user0@example.com": HTTPStatus.BAD_REQUEST}
+    )
+    (email,) = create_emails(1)
+
+    dispatch_outbox()
+
+    email.refresh_from_db()
+    assert email.status == OutboxEmail.STATUS_FAILED
+    assert email.attempts == 1
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_dispatch_outbox_fails_emails_out_of_attempts(
+    mock_get_async_transport,
+) -> None:
+    mock_get_async_transport.return_value = forwardemail_transport(
+        {"user0@example.com": HTTPStatus.TOO_MANY_REQUESTS}
+    )
+    (email,) = create_emails(1)
+    OutboxEmail.objects.filter(id=email.id).update(attempts=2)
+
+    dispatch_outbox()
+
+    email.refresh_from_db()
+    assert email.status == OutboxEmail.STATUS_FAILED
+    assert email.attempts == 3
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_dispatch_outbox_skips_emails_not_yet_due(
+    mock_get_async_transport,
+) -> None:
+    requests = []
+    mock_get_async_transport.return_value = forwardemail_transport(requests=requests)
+    (email,) = create_emails(1)
+    OutboxEmail.objects.filter(id=email.id).update(
+        next_attempt_at=timezone.now() + timedelta(minutes=5)
+    )
+
+    dispatch_outbox()
+
+    assert not requests
+    email.refresh_from_db()
+    assert email.status == OutboxEmail.STATUS_PENDING
+
+
+@pytest.mark.django_db
+def test_purge_outbox_deletes_old_sent_and_failed_emails(settings) -> None:
+    settings.OUTBOX_RETENTION_DAYS = 30
+    old_sent, old_failed, old_pending, recent_sent = create_emails(4)
+    OutboxEmail.objects.filter(id=old_sent.id).update(
+        status=OutboxEmail.STATUS_SENT,
+        updated_at=timezone.now() - timedelta(days=31),
+    )
+    OutboxEmail.objects.filter(id=old_failed.id).update(
+        status=OutboxEmail.STATUS_FAILED,
+        updated_at=timezone.now() - timedelta(days=31),
+    )
+    OutboxEmail.objects.filter(id=old_pending.id).update(
+        updated_at=timezone.now() - timedelta(days=31),
+    )
+    OutboxEmail.objects.filter(id=recent_sent.id).update(
+        status=OutboxEmail.STATUS_SENT,
+    )
+
+    purge_outbox()
+
+    assert set(OutboxEmail.objects.values_list("id", flat=True)) == {
+        old_pending.id,
+        recent_sent.id,
+    }
+
+
+@pytest.mark.django_db
+def test_outbox_schedules_are_created_by_migration() -> None:
+    assert set(
+        Schedule.objects.filter(
+            func__startswith="starminder.content.outbox."
+        ).values_list("func", "cluster")
+    ) == {
+        # routed by setup_schedules, not the migration
+        ("starminder.content.outbox.dispatch_outbox", None),
+        ("starminder.content.outbox.purge_outbox", None),
+    }
@@ -4,7 +4,7 @@ from django.contrib.sites.models import Site
 from django.test import Client
 from django.urls import reverse
 
-from starminder.content.models import Reminder, Star
+from starminder.content.models import Reminder, Star, render_reminder_body
 
 
 @pytest.fixture
@@ -55,7 +55,7 @@ def other_user_reminder(user2):
 
 @pytest.fixture
 def star(reminder):
-    return Star.objects.create(
+    star = Star.objects.create(
         reminder=reminder,
         provider="github",
         provider_id="12345",
@@ -67,6 +67,14 @@ def star(reminder):
         repo_url="https://github.com/test-owner/test-repo",
         project_url="https://example.com",
     )
+    store_body(reminder)
+    return star
+
+
+def store_body(reminder) -> None:
+    """Render the reminder's stars as the pipeline does when creating it."""
+    reminder.body_html = render_reminder_body(reminder.star_set.all())
+    reminder.save(update_fields=["body_html"])
 
 
 @pytest.mark.django_db
@@ -95,6 +103,18 @@ class TestReminderListView:
         assert reminder2 in reminders
         assert other_user_reminder not in reminders
 
+    def test_hides_undelivered_reminders(
+        self, client: Client, user, reminder, social_app
+    ):
+        prebuilt = Reminder.objects.create(user=user, delivered_at=None)
+        url = reverse("reminder_list", kwargs={"feed_id": user.user_profile.feed_id})
+        response = client.get(url)
+
+        assert response.status_code == 200
+        reminders = list(response.context["reminders"])
+        assert reminder in reminders
+        assert prebuilt not in reminders
+
     def test_orders_reminders_by_created_at_desc(
         self, client: Client, user, reminder, reminder2, social_app
     ):
@@ -168,6 +188,29 @@ class TestReminderDetailView:
         assert response.status_code == 200
         assert response.context["reminder"] == reminder
 
+    def test_serves_stored_body(self, client: Client, user, reminder, social_app):
+        Reminder.objects.filter(id=reminder.id).update(body_html="<p>Stored body</p>")
+        url = reverse(
+            "reminder_detail",
+            kwargs={"feed_id": user.user_profile.feed_id, "reminder_id": reminder.id},
+        )
+        response = client.get(url)
+
+        assert response.status_code == 200
+        assert "<p>Stored body</p>" in response.content.decode()
+
+    def test_does_not_store_body_on_view(
+        self, client: Client, user, reminder, social_app
+    ):
+        url = reverse(
+            "reminder_detail",
+            kwargs={"feed_id": user.user_profile.feed_id, "reminder_id": reminder.id},
+        )
+        client.get(url)
+
+        reminder.refresh_from_db()
+        assert reminder.body_html == ""
+
     def test_reminder_includes_stars(
         self, client: Client, user, reminder, star, social_app
     ):
@@ -227,7 +270,28 @@ class TestAtomFeedView:
         assert star.provider in content
         assert star.repo_url in content
 
+    def test_feed_hides_undelivered_reminders(self, client: Client, user):
+        prebuilt = Reminder.objects.create(user=user, delivered_at=None)
+        url = reverse("atom_feed", kwargs={"feed_id": user.user_profile.feed_id})
+        response = client.get(url)
+
+        assert response.status_code == 200
+        assert f"/{prebuilt.id}/" not in response.content.decode()
+
+    def test_feed_serves_stored_bodies(
+        self, client: Client, user, reminder, reminder2, django_assert_max_num_queries
+    ):
+        Reminder.objects.update(body_html="<p>Stored body</p>")
+        url = reverse("atom_feed", kwargs={"feed_id": user.user_profile.feed_id})
+
+        # no per-reminder star queries or template renders
+        with django_assert_max_num_queries(6):
+            response = client.get(url)
+
+        assert response.content.decode().count("Stored body") == 2
+
     def test_feed_item_without_stars(self, client: Client, user, reminder):
+        store_body(reminder)
         url = reverse("atom_feed", kwargs={"feed_id": user.user_profile.feed_id})
         response = client.get(url)
 
@@ -284,6 +348,7 @@ class TestAtomFeedView:
             repo_url="https://github.com/test-owner-2/test-repo-2",
             project_url=None,
         )
+        store_body(reminder)
 
         url = reverse("atom_feed", kwargs={"feed_id": user.user_profile.feed_id})
         response = client.get(url)
@@ -304,6 +369,7 @@ class TestAtomFeedView:
             star_count=25,
             repo_url="https://github.com/test-owner-3/test-repo-3",
         )
+        store_body(reminder)
 
         url = reverse("atom_feed", kwargs={"feed_id": user.user_profile.feed_id})
         response = client.get(url)
@@ -5,7 +5,6 @@ from django.contrib.syndication.views import Feed
 from django.db.models import QuerySet
 from django.http import HttpRequest
 from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
 from django.utils.feedgenerator import Atom1Feed
 from django.views.generic import DetailView, ListView
 
@@ -21,8 +20,8 @@ class ReminderListView(ListView):
         feed_id = self.kwargs["feed_id"]
         user_profile = get_object_or_404(UserProfile, feed_id=feed_id)
         return (
-            Reminder.objects.filter(user=user_profile.user)
-            .prefetch_related("star_set")
+            Reminder.objects.delivered()
+            .filter(user=user_profile.user)
             .order_by("-created_at")
         )
 
@@ -44,9 +43,7 @@ class ReminderDetailView(DetailView):
     def get_queryset(self) -> QuerySet[Reminder]:
         feed_id = self.kwargs["feed_id"]
         user_profile = get_object_or_404(UserProfile, feed_id=feed_id)
-        return Reminder.objects.filter(user=user_profile.user).prefetch_related(
-            "star_set"
-        )
+        return Reminder.objects.delivered().filter(user=user_profile.user)
 
     def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
         context = super().get_context_data(**kwargs)
@@ -75,8 +72,9 @@ class AtomFeedView(Feed):
 
     def items(self, obj: UserProfile) -> QuerySet[Reminder]:
         return (
-            Reminder.objects.filter(user=obj.user)
-            .prefetch_related("user", "star_set")
+            Reminder.objects.delivered()
+            .filter(user=obj.user)
+            .prefetch_related("user")
             .order_by("-created_at")
         )
 
@@ -84,7 +82,7 @@ class AtomFeedView(Feed):
         return item.title
 
     def item_description(self, item: Reminder) -> str:
-        return render_to_string("_reminder_body.html", {"reminder": item})
+        return item.body
 
     def item_link(self, item: Reminder) -> str:
         return f"/reminders/{item.user.user_profile.feed_id}/{item.id}/"
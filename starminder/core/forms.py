@@ -15,6 +15,13 @@ class UserProfileConfigForm(forms.ModelForm):
         widget=forms.Select(),
     )
 
+    # optional so older clients keep the stored strategy
+    sampling_strategy = forms.ChoiceField(
+        choices=UserProfile.SAMPLING_STRATEGY_CHOICES,
+        required=False,
+        widget=forms.Select(),
+    )
+
     class Meta:
         model = UserProfile
         fields = [
@@ -23,6 +30,7 @@ class UserProfileConfigForm(forms.ModelForm):
             "day_of_week",
             "hour_of_day",
             "include_archived",
+            "sampling_strategy",
         ]
         widgets = {
             "reminder_email": forms.EmailInput(),
@@ -36,4 +44,5 @@ class UserProfileConfigForm(forms.ModelForm):
             "day_of_week": "Day of week",
             "hour_of_day": "Hour of day (0-23)",
             "include_archived": "Archived repositories",
+            "sampling_strategy": "Sampling strategy",
         }
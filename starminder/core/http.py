@@ -0,0 +1,142 @@
+import asyncio
+import os
+import threading
+import weakref
+from collections.abc import Coroutine, Iterable
+from typing import Any
+
+import httpx
+from django.conf import settings
+from httpx_retries import Retry, RetryTransport
+
+_lock = threading.Lock()
+_pid = os.getpid()
+_clients: dict[str, httpx.Client] = {}
+_async_transports: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[str, httpx.AsyncBaseTransport]
+] = weakref.WeakKeyDictionary()
+_runners: dict[int, asyncio.Runner] = {}
+
+
+class SharedAsyncTransport(httpx.AsyncBaseTransport):
+    """A pooled transport that outlives the clients borrowing it."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+
+def get_client_config(service: str) -> dict[str, Any]:
+    """Merge the default HTTP client settings with the ones for `service`."""
+    return {**settings.HTTP_CLIENT_DEFAULTS, **settings.HTTP_CLIENTS.get(service, {})}
+
+
+def build_transport_kwargs(config: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "limits": httpx.Limits(
+            max_connections=config["max_connections"],
+            max_keepalive_connections=config["max_keepalive_connections"],
+            keepalive_expiry=config["keepalive_expiry"],
+        ),
+    }
+
+
+def build_retry(config: dict[str, Any]) -> Retry:
+    return Retry(
+        total=config["retries"],
+        allowed_methods=config["retry_methods"],
+        backoff_factor=config["backoff_factor"],
+        status_forcelist=config["retry_statuses"],
+        respect_retry_after_header=config["respect_retry_after"],
+    )
+
+
+def reset_after_fork() -> None:
+    """Forget pools inherited from a parent process, their sockets aren't ours."""
+    global _pid
+
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _clients.clear()
+        _async_transports.clear()
+        _runners.clear()
+
+
+def get_client(service: str) -> httpx.Client:
+    """Return this process's pooled client for `service`, creating it on first use."""
+    with _lock:
+        reset_after_fork()
+
+        if service not in _clients:
+            config = get_client_config(service)
+            _clients[service] = httpx.Client(
+                transport=RetryTransport(
+                    transport=httpx.HTTPTransport(**build_transport_kwargs(config)),
+                    retry=build_retry(config),
+                ),
+                timeout=config["timeout"],
+            )
+
+        return _clients[service]
+
+
+def get_async_transport(service: str) -> httpx.AsyncBaseTransport:
+    """Return the running event loop's pooled transport for `service`."""
+    loop = asyncio.get_running_loop()
+
+    with _lock:
+        reset_after_fork()
+
+        loop_transports = _async_transports.setdefault(loop, {})
+        if service not in loop_transports:
+            config = get_client_config(service)
+            loop_transports[service] = RetryTransport(
+                transport=httpx.AsyncHTTPTransport(**build_transport_kwargs(config)),
+                retry=build_retry(config),
+            )
+
+        return SharedAsyncTransport(loop_transports[service])
+
+
+def get_async_client(service: str, **kwargs: Any) -> httpx.AsyncClient:
+    """Build a lightweight async client on top of the pooled transport for `service`.
+
+    Closing the client leaves the pool open, so it's safe to use per request
+    context (e.g. per token) with its own headers and params.
+    """
+    return httpx.AsyncClient(
+        transport=get_async_transport(service),
+        timeout=get_client_config(service)["timeout"],
+        **kwargs,
+    )
+
+
+def run_async[T](coroutine: Coroutine[Any, Any, T]) -> T:
+    """Run `coroutine` on this thread's long-lived event loop.
+
+    Unlike `asyncio.run`, the loop survives between calls, so do its pools.
+    Each thread gets its own loop, so sync code running in a worker thread of
+    an already running loop can still call this.
+    """
+    with _lock:
+        reset_after_fork()
+
+        runner = _runners.setdefault(threading.get_ident(), asyncio.Runner())
+
+    return runner.run(coroutine)
+
+
+async def cancel_pending(tasks: Iterable[asyncio.Task[Any]]) -> None:
+    """Cancel the `tasks` still running and wait for them to wind down.
+
+    Left alone, they would linger on the long-lived loop of `run_async`.
+    """
+    tasks = list(tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0008_userprofile_enabled"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="sampling_strategy",
+            field=models.CharField(
+                choices=[
+                    ("uniform", "at random"),
+                    ("popular", "favoring popular ones"),
+                    ("stale", "favoring ones I haven’t seen in a while"),
+                ],
+                default="uniform",
+                max_length=16,
+            ),
+        ),
+    ]
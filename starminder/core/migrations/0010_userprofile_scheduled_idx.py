@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0010_reminder_star_indexes"),
+        ("core", "0009_userprofile_sampling_strategy"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="userprofile",
+            index=models.Index(
+                condition=models.Q(("enabled", True)),
+                fields=["hour_of_day", "day_of_week"],
+                name="userprofile_scheduled_idx",
+            ),
+        ),
+    ]
@@ -12,6 +12,7 @@ from django.db.models import (
     CharField,
     DateTimeField,
     EmailField,
+    Index,
     IntegerField,
     Manager,
     Model,
@@ -29,6 +30,7 @@ from django.dispatch import receiver
 from django_q.tasks import schedule
 
 from starminder.core.push import send_push_notification
+from starminder.core.queues import STAGE_SIGNUP, get_queue_options
 
 
 class TimestampedModel(Model):
@@ -102,6 +104,16 @@ class UserProfile(TimestampedModel):
         (SUNDAY, "Sunday"),
     ]
 
+    SAMPLING_UNIFORM = "uniform"
+    SAMPLING_POPULAR = "popular"
+    SAMPLING_STALE = "stale"
+
+    SAMPLING_STRATEGY_CHOICES = [
+        (SAMPLING_UNIFORM, "at random"),
+        (SAMPLING_POPULAR, "favoring popular ones"),
+        (SAMPLING_STALE, "favoring ones I haven’t seen in a while"),
+    ]
+
     objects: UserProfileManager = UserProfileManager()
 
     user = OneToOneField(CustomUser, on_delete=CASCADE, related_name="user_profile")
@@ -118,6 +130,11 @@ class UserProfile(TimestampedModel):
         validators=[MinValueValidator(0), MaxValueValidator(23)],
     )
     include_archived = BooleanField(default=True)
+    sampling_strategy = CharField(
+        max_length=16,
+        choices=SAMPLING_STRATEGY_CHOICES,
+        default=SAMPLING_UNIFORM,
+    )
     enabled = BooleanField(default=True)
 
     cycle_start = OneToOneField(
@@ -147,6 +164,14 @@ class UserProfile(TimestampedModel):
 
     class Meta:
         verbose_name = "User Profile"
+        indexes = [
+            # UserProfileManager.scheduled_for, run every hour
+            Index(
+                fields=["hour_of_day", "day_of_week"],
+                condition=Q(enabled=True),
+                name="userprofile_scheduled_idx",
+            ),
+        ]
 
 
 @receiver(post_save, sender=CustomUser)
@@ -166,6 +191,7 @@ def create_user_profile(
                 "starminder.implementations.jobs.user_job",
                 instance.id,
                 next_run=datetime.now() + timedelta(minutes=1),
+                **get_queue_options(STAGE_SIGNUP),
             )
         except Exception as e:
             # Don't let scheduling errors prevent user creation
@@ -2,6 +2,8 @@ import httpx
 from django.conf import settings
 from loguru import logger
 
+from starminder.core.http import get_client
+
 
 PUSHOVER_API_URL = "https://api.pushover.net/1/messages.json"
 
@@ -27,7 +29,7 @@ def send_push_notification(message: str, title: str | None = None) -> bool:
         data["title"] = title
 
     try:
-        response = httpx.post(PUSHOVER_API_URL, data=data, timeout=10)
+        response = get_client("pushover").post(PUSHOVER_API_URL, data=data)
         response.raise_for_status()
         logger.info(f"Pushover notification sent: {title or message[:50]}")
         return True
@@ -0,0 +1,21 @@
+from typing import Any
+
+from django.conf import settings
+
+# pipeline stages, each with its own django-q queue (see Q_CLUSTER["ALT_CLUSTERS"])
+STAGE_FETCH = "fetch"
+STAGE_SAMPLE = "sample"
+STAGE_EMAIL = "email"
+STAGE_CLEANUP = "cleanup"
+STAGE_SIGNUP = "signup"
+
+
+def get_queue_options(stage: str) -> dict[str, Any]:
+    """Return the `async_task`/`schedule` options routing a task to `stage`.
+
+    Without split stages everything stays on the main cluster's queue.
+    """
+    if not settings.Q_STAGE_CLUSTERS_ENABLED:
+        return {}
+
+    return {"cluster": stage}
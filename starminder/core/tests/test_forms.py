@@ -120,7 +120,8 @@ class TestUserProfileConfigForm:
         assert "day_of_week" in form.fields
         assert "hour_of_day" in form.fields
         assert "include_archived" in form.fields
-        assert len(form.fields) == 5
+        assert "sampling_strategy" in form.fields
+        assert len(form.fields) == 6
 
     def test_form_excludes_enabled_field(self):
         form = UserProfileConfigForm()
@@ -205,3 +206,33 @@ class TestUserProfileConfigForm:
         assert "max_entries" in form.errors
         assert "day_of_week" in form.errors
         assert "hour_of_day" in form.errors
+
+    def test_form_saves_sampling_strategy(self, user_profile):
+        form_data = {
+            "max_entries": 5,
+            "day_of_week": UserProfile.EVERY_DAY,
+            "hour_of_day": 9,
+            "include_archived": True,
+            "sampling_strategy": UserProfile.SAMPLING_STALE,
+        }
+        form = UserProfileConfigForm(data=form_data, instance=user_profile)
+        assert form.is_valid()
+
+        saved_profile = form.save()
+        assert saved_profile.sampling_strategy == UserProfile.SAMPLING_STALE
+
+    def test_form_keeps_sampling_strategy_when_omitted(self, user_profile):
+        user_profile.sampling_strategy = UserProfile.SAMPLING_POPULAR
+        user_profile.save()
+
+        form_data = {
+            "max_entries": 5,
+            "day_of_week": UserProfile.EVERY_DAY,
+            "hour_of_day": 9,
+            "include_archived": True,
+        }
+        form = UserProfileConfigForm(data=form_data, instance=user_profile)
+        assert form.is_valid()
+
+        saved_profile = form.save()
+        assert saved_profile.sampling_strategy == UserProfile.SAMPLING_POPULAR
@@ -0,0 +1,139 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+
+from starminder.core.http import (
+    build_retry,
+    get_async_client,
+    get_async_transport,
+    get_client,
+    get_client_config,
+    run_async,
+)
+
+
+def test_get_client_config_merges_service_overrides(settings) -> None:
+    settings.HTTP_CLIENT_DEFAULTS = {"timeout": 10.0, "retries": 5}
+    settings.HTTP_CLIENTS = {"pushover": {"retries": 2}}
+
+    assert get_client_config("pushover") == {"timeout": 10.0, "retries": 2}
+    assert get_client_config("github") == {"timeout": 10.0, "retries": 5}
+
+
+def test_github_retry_leaves_rate_limits_to_the_governor() -> None:
+    github_retry = build_retry(get_client_config("github"))
+    pushover_retry = build_retry(get_client_config("pushover"))
+
+    assert not github_retry.is_retryable_status_code(429)
+    assert github_retry.is_retryable_status_code(503)
+    assert not github_retry.respect_retry_after_header
+    assert pushover_retry.is_retryable_status_code(429)
+
+
+def failing_once_transport(methods: list[str]) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        methods.append(request.method)
+        return httpx.Response(503 if len(methods) == 1 else 200)
+
+    return httpx.MockTransport(handler)
+
+
+@patch("starminder.core.http._clients", {})
+@patch("starminder.core.http.httpx.HTTPTransport")
+def test_pushover_posts_are_retried(mock_http_transport, settings) -> None:
+    settings.HTTP_CLIENT_DEFAULTS = {
+        **settings.HTTP_CLIENT_DEFAULTS,
+        "backoff_factor": 0,
+    }
+    methods = []
+    mock_http_transport.return_value = failing_once_transport(methods)
+
+    response = get_client("pushover").post("https://api.pushover.net/1/messages.json")
+
+    assert response.status_code == 200
+    assert methods == ["POST", "POST"]
+
+
+@patch("starminder.core.http.httpx.AsyncHTTPTransport")
+def test_github_graphql_posts_are_retried(mock_async_http_transport, settings) -> None:
+    settings.HTTP_CLIENT_DEFAULTS = {
+        **settings.HTTP_CLIENT_DEFAULTS,
+        "backoff_factor": 0,
+    }
+    methods = []
+    mock_async_http_transport.return_value = failing_once_transport(methods)
+
+    async def post_query() -> httpx.Response:
+        async with get_async_client("github") as client:
+            return await client.post("https://api.github.com/graphql", json={})
+
+    # a fresh loop, so the transport isn't one pooled by another test
+    response = asyncio.run(post_query())
+
+    assert response.status_code == 200
+    assert methods == ["POST", "POST"]
+
+
+@patch("starminder.core.http._clients", {})
+@patch("starminder.core.http.httpx.HTTPTransport")
+def test_forwardemail_leaves_retries_to_the_outbox(
+    mock_http_transport, settings
+) -> None:
+    settings.HTTP_CLIENT_DEFAULTS = {
+        **settings.HTTP_CLIENT_DEFAULTS,
+        "backoff_factor": 0,
+    }
+    methods = []
+    mock_http_transport.return_value = failing_once_transport(methods)
+
+    response = get_client("forwardemail").post(settings.FORWARDEMAIL_API_URL)
+
+    assert response.status_code == 503
+    assert methods == ["POST"]
+
+
+def test_get_client_reuses_client_per_service() -> None:
+    assert get_client("pushover") is get_client("pushover")
+    assert get_client("pushover") is not get_client("forwardemail")
+
+
+def test_get_client_forgets_clients_after_fork() -> None:
+    client = get_client("pushover")
+
+    with patch("starminder.core.http._pid", -1):
+        assert get_client("pushover") is not client
+
+
+def test_async_transport_pool_is_shared_within_loop() -> None:
+    async def get_pools() -> tuple[httpx.AsyncBaseTransport, ...]:
+        async with get_async_client("github") as client:
+            first_pool = client._transport.transport
+
+        return first_pool, get_async_transport("github").transport
+
+    first_pool, second_pool = run_async(get_pools())
+
+    assert first_pool is second_pool
+    assert run_async(get_pools())[0] is first_pool
+
+
+def test_run_async_reuses_event_loop() -> None:
+    async def get_loop() -> object:
+        return asyncio.get_running_loop()
+
+    assert run_async(get_loop()) is run_async(get_loop())
+
+
+def test_run_async_uses_a_loop_per_thread() -> None:
+    async def get_loop() -> object:
+        return asyncio.get_running_loop()
+
+    async def get_loops() -> tuple[object, object]:
+        return asyncio.get_running_loop(), await asyncio.to_thread(
+            run_async, get_loop()
+        )
+
+    outer_loop, thread_loop = run_async(get_loops())
+
+    assert outer_loop is not thread_loop
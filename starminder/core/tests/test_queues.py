@@ -0,0 +1,38 @@
+import pytest
+from django.core.management import call_command
+from django_q.models import Schedule
+
+from starminder.core.queues import STAGE_EMAIL, get_queue_options
+
+
+def test_get_queue_options_keeps_main_cluster_by_default(settings) -> None:
+    settings.Q_STAGE_CLUSTERS_ENABLED = False
+
+    assert get_queue_options(STAGE_EMAIL) == {}
+
+
+def test_get_queue_options_routes_to_stage_cluster(settings) -> None:
+    settings.Q_STAGE_CLUSTERS_ENABLED = True
+
+    assert get_queue_options(STAGE_EMAIL) == {"cluster": "email"}
+
+
+def test_every_stage_has_a_cluster(settings) -> None:
+    from starminder.core import queues
+
+    stages = {
+        value for name, value in vars(queues).items() if name.startswith("STAGE_")
+    }
+
+    assert stages == set(settings.Q_CLUSTER["ALT_CLUSTERS"])
+
+
+@pytest.mark.django_db
+def test_setup_schedules_follows_stage_cluster_toggle(settings) -> None:
+    settings.Q_STAGE_CLUSTERS_ENABLED = True
+    call_command("setup_schedules")
+    assert Schedule.objects.get(name="dispatch_outbox_minutely").cluster == "email"
+
+    settings.Q_STAGE_CLUSTERS_ENABLED = False
+    call_command("setup_schedules")
+    assert Schedule.objects.get(name="dispatch_outbox_minutely").cluster is None
@@ -2,7 +2,6 @@ from http import HTTPMethod
 from typing import Any
 
 from allauth.socialaccount.models import SocialAccount
-import httpx
 from django.contrib.auth import logout
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.http import HttpRequest, HttpResponse
@@ -12,6 +11,7 @@ from django.views import View
 from django.views.generic import FormView, TemplateView
 
 from starminder.core.forms import UserProfileConfigForm
+from starminder.core.http import get_client
 
 
 class HomepageView(TemplateView):
@@ -59,7 +59,7 @@ class DeleteAccountView(LoginRequiredMixin, View):
             for social_token in social_account.socialtoken_set.all():
                 app_client_id = social_token.app.client_id
 
-                httpx.request(
+                get_client("github").request(
                     method=HTTPMethod.DELETE,
                     url=f"https://api.github.com/applications/{app_client_id}/grant",
                     auth=(social_token.app.client_id, social_token.app.secret),
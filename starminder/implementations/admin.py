@@ -1,5 +1,23 @@
 from django.contrib import admin
 
-from starminder.implementations.models import TempStar
+from starminder.implementations.models import (
+    JobLease,
+    PrebuiltReminder,
+    RateLimitBudget,
+    ShownSet,
+    ShuffleCycle,
+    SnapshotPage,
+    SnapshotStar,
+    SyncState,
+    TempStar,
+)
 
 admin.site.register(TempStar)
+admin.site.register(SnapshotStar)
+admin.site.register(SnapshotPage)
+admin.site.register(SyncState)
+admin.site.register(RateLimitBudget)
+admin.site.register(ShuffleCycle)
+admin.site.register(ShownSet)
+admin.site.register(PrebuiltReminder)
+admin.site.register(JobLease)
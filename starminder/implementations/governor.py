@@ -0,0 +1,114 @@
+import hashlib
+from datetime import UTC, datetime, timedelta
+from http import HTTPStatus
+
+import httpx
+from django.conf import settings
+from django.utils import timezone
+from loguru import logger
+
+from starminder.implementations.models import RateLimitBudget
+
+APP_KEY = "app"
+
+# GitHub budgets REST and GraphQL requests separately (X-RateLimit-Resource)
+RESOURCE_CORE = "core"
+RESOURCE_GRAPHQL = "graphql"
+
+# latest budgets seen by this process, persisted by flush()
+_observed: dict[str, tuple[int, datetime]] = {}
+
+
+class RateLimitExhausted(Exception):
+    def __init__(self, key: str, reset_at: datetime) -> None:
+        super().__init__(f"GitHub rate limit for {key} exhausted until {reset_at}")
+        self.key = key
+        self.reset_at = reset_at
+
+
+def get_token_key(token: str, resource: str = RESOURCE_CORE) -> str:
+    """Identify a token's budget for one rate limit resource without storing it."""
+    return f"token:{hashlib.sha256(token.encode()).hexdigest()[:16]}:{resource}"
+
+
+def is_exhausted(remaining: int) -> bool:
+    return remaining <= settings.GITHUB_RATE_LIMIT_RESERVE
+
+
+async def observe_response(response: httpx.Response) -> None:
+    """Record a GitHub response's rate limit headers, stopping before exhaustion.
+
+    Meant as an httpx response event hook, so it raises mid-fetch instead of
+    letting the remaining requests burn through the reserve or get retried.
+    """
+    key = get_token_key(
+        response.request.headers["Authorization"].removeprefix("Bearer "),
+        response.headers.get("X-RateLimit-Resource", RESOURCE_CORE),
+    )
+
+    retry_after = response.headers.get("Retry-After")
+    if retry_after and response.status_code in (
+        HTTPStatus.FORBIDDEN,
+        HTTPStatus.TOO_MANY_REQUESTS,
+    ):
+        # secondary limits hit every worker bursting at once, so pause them all
+        reset_at = timezone.now() + timedelta(seconds=int(retry_after))
+        _observed[key] = (0, reset_at)
+        _observed[APP_KEY] = (0, reset_at)
+        raise RateLimitExhausted(APP_KEY, reset_at)
+
+    remaining = response.headers.get("X-RateLimit-Remaining")
+    reset = response.headers.get("X-RateLimit-Reset")
+    if remaining is None or reset is None:
+        return
+
+    reset_at = datetime.fromtimestamp(int(reset), tz=UTC)
+    _observed[key] = (int(remaining), reset_at)
+
+    if is_exhausted(int(remaining)):
+        raise RateLimitExhausted(key, reset_at)
+
+
+def flush() -> None:
+    """Share the budgets this process has seen with the other workers."""
+    while _observed:
+        key, (remaining, reset_at) = _observed.popitem()
+        RateLimitBudget.objects.update_or_create(
+            key=key,
+            defaults={"remaining": remaining, "reset_at": reset_at},
+        )
+
+
+def get_blocked_until(
+    tokens: list[str],
+    resource: str = RESOURCE_CORE,
+) -> datetime | None:
+    """Return when the most exhausted of `tokens` (or the app) may be used again.
+
+    Only the tokens' budgets for `resource` are checked, both the shared ones
+    and those this process hasn't flushed yet.
+    """
+    keys = [APP_KEY, *(get_token_key(token, resource) for token in tokens)]
+    now = timezone.now()
+    budgets = {
+        budget.key: (budget.remaining, budget.reset_at)
+        for budget in RateLimitBudget.objects.filter(key__in=keys)
+    }
+    # budgets this process saw since its last flush(), e.g. a secondary limit
+    # another user of the same batch just ran into, are the freshest
+    for key in keys:
+        if observed := _observed.get(key):
+            budgets[key] = observed
+
+    blocked_until = max(
+        (
+            reset_at
+            for remaining, reset_at in budgets.values()
+            if reset_at > now and is_exhausted(remaining)
+        ),
+        default=None,
+    )
+    if blocked_until:
+        logger.info(f"GitHub rate limit exhausted until {blocked_until}")
+
+    return blocked_until
@@ -1,267 +1,1514 @@
+import asyncio
+import hashlib
 import random
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import defaultdict
+from collections.abc import AsyncIterator, Sequence
+from contextlib import aclosing
+from http import HTTPStatus
+from itertools import batched
+from typing import Any
 
 from allauth.socialaccount.models import SocialToken
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, QuerySet
 from django.template.loader import render_to_string
-from django_q.tasks import async_task
+from django.utils import timezone
+from django_q.tasks import async_task, schedule
 from loguru import logger
 import httpx
-from httpx_retries import Retry, RetryTransport
 import sentry_sdk
 
-from starminder.content.models import Reminder, Star
-from starminder.core.models import CustomUser, UserProfile
-from starminder.implementations.models import TempStar
+from starminder.content.models import (
+    OutboxEmail,
+    Reminder,
+    Star,
+    render_reminder_body,
+)
+from starminder.content.outbox import enqueue_email
+from starminder.core.http import cancel_pending, get_async_client, run_async
+from starminder.core.models import CustomUser, StarFieldsBase, UserProfile
+from starminder.core.queues import (
+    STAGE_CLEANUP,
+    STAGE_FETCH,
+    STAGE_SAMPLE,
+    get_queue_options,
+)
+from starminder.implementations import governor, leases
+from starminder.implementations.models import (
+    PrebuiltReminder,
+    ShownSet,
+    ShuffleCycle,
+    SnapshotPage,
+    SnapshotStar,
+    SyncState,
+    TempStar,
+)
+from starminder.implementations.sampling import (
+    ReservoirSampler,
+    SortedIdSet,
+    fetch_in_order,
+    pack_ids,
+    sample_queryset,
+    splice_into_tail,
+    unpack_ids,
+    weighted_sample,
+)
+
+
+GITHUB_STARRED_URL = "https://api.github.com/user/starred"
+GITHUB_PAGE_SIZE = 100
+GITHUB_MAX_CONCURRENT_PAGES = 8
+
+FETCHER_REST = "rest"
+FETCHER_GRAPHQL = "graphql"
+
+# aliases shape the nodes like REST repository objects, so parse_star handles both
+STARRED_REPOSITORIES_QUERY = """
+query ($first: Int!, $after: String) {
+  viewer {
+    starredRepositories(first: $first, after: $after) {
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+      nodes {
+        id: databaseId
+        name
+        owner {
+          login
+          ... on User {
+            id: databaseId
+          }
+          ... on Organization {
+            id: databaseId
+          }
+        }
+        description
+        stargazers_count: stargazerCount
+        html_url: url
+        homepage: homepageUrl
+        archived: isArchived
+      }
+    }
+  }
+}
+"""
+
+# a page of starred repos and the position to resume after it
+type StarredPage = tuple[list[dict[str, Any]], str | None]
+
+BULK_CREATE_BATCH_SIZE = 1000
+
+# users per start_jobs task, each costing a single token query
+USER_JOB_BATCH_SIZE = 100
+
+SYNC_MODE_STAGING = "staging"
+SYNC_MODE_SNAPSHOT = "snapshot"
+SYNC_MODE_INCREMENTAL = "incremental"
+SYNC_MODE_RESERVOIR = "reservoir"
+CATALOG_SYNC_MODES = {SYNC_MODE_SNAPSHOT, SYNC_MODE_INCREMENTAL}
+
+CYCLE_MODE_SHOWN = "shown"
+CYCLE_MODE_PERMUTATION = "permutation"
+
+# how many days' worth of staleness a never shown repo weighs
+NEVER_SHOWN_WEIGHT = 365
+
+STAR_FIELD_NAMES = [field.name for field in StarFieldsBase._meta.get_fields()]
+
+STAR_UPDATE_FIELDS = [
+    "name",
+    "owner",
+    "owner_id",
+    "description",
+    "star_count",
+    "repo_url",
+    "project_url",
+    "archived",
+    "updated_at",
+]
+
+
+def get_user_slot(user_id: int) -> int:
+    """Stable minute of the delivery window the user's job starts in."""
+    digest = hashlib.sha256(str(user_id).encode()).digest()
+    return int.from_bytes(digest[:4]) % max(
+        settings.REMINDER_DELIVERY_WINDOW_MINUTES, 1
+    )
+
+
+def queue_user_jobs(user_ids: list[int], slot: int, due_slot: datetime) -> None:
+    if settings.ASYNC_PIPELINE:
+        func = "starminder.implementations.pipeline.run_pipeline"
+    else:
+        func = "starminder.implementations.jobs.user_jobs"
+
+    # schedules keep their args as literals, so the slot travels as a string
+    due_slot_iso = due_slot.isoformat()
+
+    if not slot:
+        async_task(func, user_ids, due_slot_iso, **get_queue_options(STAGE_FETCH))
+        return
+
+    schedule(
+        func,
+        user_ids,
+        due_slot_iso,
+        next_run=timezone.now() + timedelta(minutes=slot),
+        **get_queue_options(STAGE_FETCH),
+    )
 
 
 def start_jobs() -> None:
-    """Find all profiles scheduled for current hour and queue user_job for each."""
+    """Find all profiles scheduled for current hour and queue user jobs in batches.
+
+    Users are spread over the delivery window by a stable per-user minute slot,
+    so each hour's work doesn't hit GitHub and the workers all at once. Their
+    jobs all run under this hour's lease slot, however late in it they start.
+    """
     logger.info("Scheduling all applicable jobs…")
 
-    scheduled_profiles = UserProfile.objects.scheduled_for(datetime.now())
-    logger.info(f"Found {len(scheduled_profiles)} scheduled profiles")
+    due_slot = leases.get_slot()
 
-    for profile in scheduled_profiles:
-        async_task(
-            "starminder.implementations.jobs.user_job",
-            profile.user.id,
-        )
+    user_ids = (
+        UserProfile.objects.scheduled_for(datetime.now())
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+    )
 
-    logger.info("Done!")
+    user_ids_by_slot: defaultdict[int, list[int]] = defaultdict(list)
+    for user_id in user_ids.iterator(chunk_size=USER_JOB_BATCH_SIZE):
+        user_ids_by_slot[get_user_slot(user_id)].append(user_id)
 
+    for slot, slot_user_ids in sorted(user_ids_by_slot.items()):
+        for batch in batched(slot_user_ids, USER_JOB_BATCH_SIZE):
+            queue_user_jobs(list(batch), slot, due_slot)
 
-def user_job(user_id: int) -> None:
-    """Fetch user and tokens, queue pager."""
-    logger.info(f"Processing user job for {user_id=}")
+    user_count = sum(len(slot_user_ids) for slot_user_ids in user_ids_by_slot.values())
+    logger.info(f"Queued {user_count} scheduled users in {len(user_ids_by_slot)} slots")
+    logger.info("Done!")
 
-    user = CustomUser.objects.get(id=user_id)
-    logger.info(f"Found user {user.username}")
 
-    tokens = list(SocialToken.objects.filter(account__user=user))
-    logger.info(f"Found {len(tokens)} tokens for {user.username}")
+def queue_pager(user_id: int, token_ids: list[int], slot: datetime) -> None:
+    logger.info(f"Found {len(token_ids)} tokens for {user_id=}")
 
-    if not tokens:
+    if not token_ids:
         logger.info("No tokens found, exiting")
+        leases.complete([user_id], slot)
         return
 
+    # only IDs are queued, so the broker stores a few bytes instead of pickled
+    # models and every task reads fresh rows; the slot goes along so the last
+    # task completes the lease it was started under
     async_task(
         "starminder.implementations.jobs.pager",
-        user,
-        tokens,
+        user_id,
+        token_ids,
+        slot,
+        **get_queue_options(STAGE_FETCH),
+    )
+
+
+def user_jobs(user_ids: list[int], due_slot: str | None = None) -> None:
+    """Look up the tokens of a batch of users at once, queue pager for each.
+
+    Users whose reminder was built ahead of time only get it sent. The jobs
+    run under the lease slot `due_slot` (ISO format), the current one if not
+    given.
+    """
+    logger.info(f"Processing user jobs for {len(user_ids)} users")
+
+    slot = datetime.fromisoformat(due_slot) if due_slot else leases.get_slot()
+    user_ids = leases.acquire(user_ids, slot)
+
+    delivered_ids = deliver_prebuilt_reminders(user_ids, slot)
+    user_ids = [user_id for user_id in user_ids if user_id not in delivered_ids]
+
+    token_ids_by_user: defaultdict[int, list[int]] = defaultdict(list)
+    for user_id, token_id in (
+        SocialToken.objects.filter(account__user_id__in=user_ids)
+        .order_by("id")
+        .values_list("account__user_id", "id")
+    ):
+        token_ids_by_user[user_id].append(token_id)
+
+    # users without tokens are done too, all in one go
+    tokenless_ids = [
+        user_id for user_id in user_ids if user_id not in token_ids_by_user
+    ]
+    leases.complete(delivered_ids + tokenless_ids, slot)
+
+    for user_id in user_ids:
+        if token_ids := token_ids_by_user.get(user_id):
+            queue_pager(user_id, token_ids, slot)
+
+
+def prebuild_jobs() -> None:
+    """Queue building the reminders due in `REMINDER_PREBUILD_LEAD_MINUTES`.
+
+    They are stored undelivered, so at their slot `user_jobs` only sends them.
+    Prebuilt reminders whose slot has passed, e.g. as the user was disabled in
+    the meantime, are discarded. The last hour's are kept, as users spread
+    over the delivery window may still be getting theirs.
+    """
+    logger.info("Scheduling reminder prebuilds…")
+
+    stale_slot = leases.get_slot() - timedelta(hours=1)
+    discard_prebuilt_reminders(
+        list(PrebuiltReminder.objects.filter(due_slot__lt=stale_slot))
+    )
+
+    lead = timedelta(minutes=settings.REMINDER_PREBUILD_LEAD_MINUTES)
+    due_at = datetime.now() + lead
+    due_slot = leases.get_slot(timezone.now() + lead)
+    user_ids = (
+        UserProfile.objects.scheduled_for(due_at)
+        .filter(user__prebuilt_reminder__isnull=True)
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
     )
 
+    user_count = 0
+    for batch in batched(
+        user_ids.iterator(chunk_size=USER_JOB_BATCH_SIZE), USER_JOB_BATCH_SIZE
+    ):
+        async_task(
+            "starminder.implementations.pipeline.prebuild_reminders",
+            list(batch),
+            due_slot,
+            **get_queue_options(STAGE_FETCH),
+        )
+        user_count += len(batch)
+
+    logger.info(f"Queued prebuilds for {user_count} users due at {due_at}")
+
+
+def get_cycle_state(user: CustomUser) -> dict[str, Any]:
+    """Note where the user's cycle is, before a prebuilt reminder advances it."""
+    cycle_state: dict[str, Any] = {"cycle_start_id": user.user_profile.cycle_start_id}
+
+    if settings.REMINDER_CYCLE_MODE == CYCLE_MODE_PERMUTATION and (
+        cycle := ShuffleCycle.objects.filter(user=user).first()
+    ):
+        cycle_state["shuffle_position"] = cycle.position
+        cycle_state["shuffle_provider_ids"] = bytes(cycle.provider_ids)
 
-def pager(
+    return cycle_state
+
+
+def save_prebuilt_reminder(
     user: CustomUser,
-    tokens: list[SocialToken],
-    page: int = 1,
+    reminder: Reminder,
+    email: dict[str, str] | None,
+    due_slot: datetime,
+    cycle_state: dict[str, Any],
 ) -> None:
-    """Fetch starred repos from GitHub API and create TempStar objects."""
-    logger.info(f"Pager for {user.username}, page {page}, {len(tokens)} tokens")
-
-    current_token = tokens[0]
-
-    httpx_transport = RetryTransport(retry=Retry(total=5, backoff_factor=0.5))
-    with httpx.Client(transport=httpx_transport) as client:
-        response = client.get(
-            "https://api.github.com/user/starred",
-            headers={
-                "Accept": "application/vnd.github+json",
-                "Authorization": f"Bearer {current_token.token}",
-            },
-            params={
-                "per_page": 100,
-                "page": page,
-            },
+    """Keep the reminder for `due_slot`, with the `get_cycle_state` from before it."""
+    shuffle_provider_ids = cycle_state.get("shuffle_provider_ids")
+    if (
+        shuffle_provider_ids is not None
+        and ShuffleCycle.objects.filter(
+            user=user, provider_ids=shuffle_provider_ids
+        ).exists()
+    ):
+        # the order is unchanged, moving the position back is enough
+        shuffle_provider_ids = None
+
+    PrebuiltReminder.objects.create(
+        user=user,
+        reminder=reminder,
+        email=email,
+        due_slot=due_slot,
+        cycle_start_id=cycle_state["cycle_start_id"],
+        shuffle_position=cycle_state.get("shuffle_position"),
+        shuffle_provider_ids=shuffle_provider_ids,
+    )
+
+
+def deliver_prebuilt_reminders(user_ids: list[int], slot: datetime) -> list[int]:
+    """Deliver the users' reminders prebuilt for `slot`, return those users' IDs.
+
+    The others are discarded: ones for an earlier slot are past due, and the
+    reminder built now for the remaining users takes the place of later ones.
+    """
+    prebuilt_reminders = list(PrebuiltReminder.objects.filter(user_id__in=user_ids))
+    discard_prebuilt_reminders(
+        [prebuilt for prebuilt in prebuilt_reminders if prebuilt.due_slot != slot]
+    )
+    prebuilt_reminders = [
+        prebuilt for prebuilt in prebuilt_reminders if prebuilt.due_slot == slot
+    ]
+    if not prebuilt_reminders:
+        return []
+
+    with transaction.atomic():
+        OutboxEmail.objects.bulk_create(
+            OutboxEmail(reminder_id=prebuilt.reminder_id, **prebuilt.email)
+            for prebuilt in prebuilt_reminders
+            if prebuilt.email
         )
-    response.raise_for_status()
-    items = response.json()
+        Reminder.objects.filter(
+            id__in=[prebuilt.reminder_id for prebuilt in prebuilt_reminders]
+        ).update(delivered_at=timezone.now())
+        PrebuiltReminder.objects.filter(
+            id__in=[prebuilt.id for prebuilt in prebuilt_reminders]
+        ).delete()
 
-    logger.info(f"Received {len(items)} items from GitHub API")
+    logger.info(f"Delivered {len(prebuilt_reminders)} prebuilt reminders")
+    return [prebuilt.user_id for prebuilt in prebuilt_reminders]
 
-    for item in items:
+
+def discard_prebuilt_reminders(prebuilt_reminders: list[PrebuiltReminder]) -> None:
+    """Delete prebuilt reminders that won't be delivered, along with their stars.
+
+    Their users' cycles go back to where they were before the reminders were
+    built. The shown sets counted those stars, so they are rebuilt next time.
+    """
+    if not prebuilt_reminders:
+        return
+
+    with transaction.atomic():
+        Reminder.objects.filter(
+            id__in=[prebuilt.reminder_id for prebuilt in prebuilt_reminders]
+        ).delete()
+        ShownSet.objects.filter(
+            user_id__in=[prebuilt.user_id for prebuilt in prebuilt_reminders]
+        ).delete()
+
+        for prebuilt in prebuilt_reminders:
+            restore_cycle(prebuilt)
+
+    logger.info(f"Discarded {len(prebuilt_reminders)} prebuilt reminders")
+
+
+def restore_cycle(prebuilt: PrebuiltReminder) -> None:
+    """Put the user's cycle back to where it was before `prebuilt` was built."""
+    UserProfile.objects.filter(user_id=prebuilt.user_id).update(
+        cycle_start_id=prebuilt.cycle_start_id,
+        updated_at=timezone.now(),
+    )
+
+    if prebuilt.shuffle_position is None:
+        return
+
+    cycle_fields: dict[str, Any] = {"position": prebuilt.shuffle_position}
+    if prebuilt.shuffle_provider_ids is not None:
+        cycle_fields["provider_ids"] = prebuilt.shuffle_provider_ids
+    ShuffleCycle.objects.filter(user_id=prebuilt.user_id).update(
+        **cycle_fields, updated_at=timezone.now()
+    )
+
+
+def user_job(user_id: int) -> None:
+    """Look up the user's tokens, queue pager with their IDs.
+
+    A reminder prebuilt for this slot is sent instead, and one prebuilt for
+    another slot is discarded.
+    """
+    logger.info(f"Processing user job for {user_id=}")
+
+    slot = leases.get_slot()
+    if not leases.acquire([user_id], slot):
+        return
+
+    if deliver_prebuilt_reminders([user_id], slot):
+        leases.complete([user_id], slot)
+        return
+
+    token_ids = list(
+        SocialToken.objects.filter(account__user_id=user_id)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    queue_pager(user_id, token_ids, slot)
+
+
+def github_client(
+    token: str,
+    media_type: str = "application/vnd.github+json",
+    **params: Any,
+) -> httpx.AsyncClient:
+    """Build a GitHub API client authenticated with `token` on the shared pool."""
+    return get_async_client(
+        "github",
+        headers={
+            "Accept": media_type,
+            "Authorization": f"Bearer {token}",
+        },
+        params=params,
+        event_hooks={"response": [governor.observe_response]},
+    )
+
+
+async def fetch_starred_page(
+    client: httpx.AsyncClient,
+    page: int,
+    etag: str | None = None,
+) -> httpx.Response:
+    """Fetch a single page of starred repos, conditionally if `etag` is given."""
+    response = await client.get(
+        GITHUB_STARRED_URL,
+        headers={"If-None-Match": etag} if etag else None,
+        params={
+            "per_page": GITHUB_PAGE_SIZE,
+            "page": page,
+        },
+    )
+    if response.status_code != HTTPStatus.NOT_MODIFIED:
+        response.raise_for_status()
+    return response
+
+
+def get_last_page(response: httpx.Response) -> int:
+    """Read the last page number from the `Link: rel="last"` header, if any."""
+    last_link = response.links.get("last")
+    if not last_link:
+        return 1
+
+    return int(httpx.URL(last_link["url"]).params.get("page", 1))
+
+
+async def iter_starred_pages_rest(
+    token: str,
+    position: str | None = None,
+) -> AsyncIterator[StarredPage]:
+    """Yield a token's REST pages as they arrive, fetching the rest concurrently.
+
+    Pages arrive out of order, so each one comes with the first page number
+    not yet yielded, or None after the last page.
+    """
+    start_page = int(position) if position else 1
+
+    async with github_client(token) as client:
+        first_response = await fetch_starred_page(client, start_page)
+        last_page = max(get_last_page(first_response), start_page)
+        logger.info(f"Found {last_page} pages of starred repos from {start_page}")
+
+        yielded_pages = {start_page}
+        next_page = start_page + 1
+
+        def get_position() -> str | None:
+            nonlocal next_page
+            while next_page in yielded_pages:
+                next_page += 1
+            return str(next_page) if next_page <= last_page else None
+
+        yield first_response.json(), get_position()
+
+        semaphore = asyncio.Semaphore(GITHUB_MAX_CONCURRENT_PAGES)
+
+        async def fetch_bounded(page: int) -> tuple[int, httpx.Response]:
+            async with semaphore:
+                return page, await fetch_starred_page(client, page)
+
+        tasks = [
+            asyncio.ensure_future(fetch_bounded(page))
+            for page in range(start_page + 1, last_page + 1)
+        ]
         try:
-            TempStar.objects.create(
-                user=user,
-                provider="github",
-                provider_id=str(item["id"]),
-                name=item["name"],
-                owner=item["owner"]["login"],
-                owner_id=str(item["owner"]["id"]),
-                description=item.get("description"),
-                star_count=item["stargazers_count"],
-                repo_url=item["html_url"],
-                project_url=item.get("homepage"),
-                archived=item.get("archived", False),
+            for next_response in asyncio.as_completed(tasks):
+                page, response = await next_response
+                yielded_pages.add(page)
+                yield response.json(), get_position()
+        finally:
+            # an error, or the caller stopping early, leaves the rest running
+            await cancel_pending(tasks)
+
+
+async def iter_starred_pages_graphql(
+    token: str,
+    position: str | None = None,
+) -> AsyncIterator[StarredPage]:
+    """Yield a token's pages via GraphQL, selecting only the fields we store.
+
+    Each page comes with its end cursor, or None after the last page.
+    """
+    async with github_client(token) as client:
+        cursor = position
+        while True:
+            response = await client.post(
+                settings.GITHUB_GRAPHQL_URL,
+                json={
+                    "query": STARRED_REPOSITORIES_QUERY,
+                    "variables": {"first": GITHUB_PAGE_SIZE, "after": cursor},
+                },
             )
-        except TypeError:
-            if not item.get("owner"):
-                logger.info(
-                    f"Skipping repo {item.get('name', 'unknown')} with deleted owner"
-                )
-            else:
-                raise
-        except Exception as error:
-            sentry_sdk.capture_exception(error, extras={"item": item})
-
-    # no way to know if there are more pages without trying
-    if len(items) == 100:
-        logger.info("Scheduling next page")
-        async_task(
-            "starminder.implementations.jobs.pager",
-            user,
-            tokens,
-            page + 1,
-        )
+            response.raise_for_status()
+            payload = response.json()
 
-    # partial page means no more pages for this token
-    elif len(tokens) > 1:
-        logger.info("Scheduling next token")
-        async_task(
-            "starminder.implementations.jobs.pager",
-            user,
-            tokens[1:],
-            1,
-        )
+            if errors := payload.get("errors"):
+                raise RuntimeError(f"GitHub GraphQL query failed: {errors}")
 
-    # no more tokens means we're done, queue generate_data
-    else:
-        logger.info("All pages processed, scheduling generate_data")
-        async_task(
-            "starminder.implementations.jobs.generate_data",
-            user.id,
-        )
+            starred = payload["data"]["viewer"]["starredRepositories"]
+            page_info = starred["pageInfo"]
+            if not page_info["hasNextPage"]:
+                yield starred["nodes"], None
+                return
 
+            cursor = page_info["endCursor"]
+            yield starred["nodes"], cursor
 
-def generate_data(user_id: int) -> None:
-    """Sample TempStars, create Reminder and Stars, queue email sending, clean up."""
-    logger.info(f"Generating data for user_id={user_id}")
 
-    user = CustomUser.objects.get(id=user_id)
-    logger.info(f"Found user {user.username}")
+def get_rate_limit_resource() -> str:
+    """The GitHub rate limit that the configured sync mode and fetcher draw from."""
+    if (
+        settings.STAR_FETCHER == FETCHER_GRAPHQL
+        and settings.STAR_SYNC_MODE not in CATALOG_SYNC_MODES
+    ):
+        return governor.RESOURCE_GRAPHQL
+
+    return governor.RESOURCE_CORE
+
+
+def iter_starred_pages(
+    token: str,
+    position: str | None = None,
+) -> AsyncIterator[StarredPage]:
+    """Yield a token's pages of starred repos with the configured fetcher.
+
+    Every page comes with the position to resume after it, once it and all
+    the pages before it are processed.
+    """
+    if settings.STAR_FETCHER == FETCHER_GRAPHQL:
+        return iter_starred_pages_graphql(token, position)
+
+    return iter_starred_pages_rest(token, position)
+
+
+async def fetch_starred(token: str) -> list[dict[str, Any]]:
+    """Fetch all pages of starred repos for a single token."""
+    return [item async for items, _ in iter_starred_pages(token) for item in items]
+
+
+async def fetch_starred_conditional(
+    token: str,
+    pages: dict[int, SnapshotPage],
+) -> dict[int, httpx.Response]:
+    """Fetch all pages for a single token, sending the stored ETag for each.
+
+    Stars are requested oldest first, so new stars only add to the last page.
+    Any change to one of a page's repos, e.g. its stargazer count, changes the
+    page's ETag, so 304s mostly come from pages of dormant repos. An unchanged
+    page says nothing about the others, so every page is requested,
+    concurrently; a 304 saves the rate limit and upserting the page.
+    """
+    async with github_client(token, sort="created", direction="asc") as client:
+
+        async def fetch(page: int) -> httpx.Response:
+            stored_page = pages.get(page)
+            return await fetch_starred_page(
+                client, page, stored_page.etag if stored_page else None
+            )
+
+        first_response = await fetch(1)
+        if first_response.status_code == HTTPStatus.NOT_MODIFIED and (
+            "last" not in first_response.links
+        ):
+            last_page = max(pages)
+        else:
+            last_page = get_last_page(first_response)
+
+        semaphore = asyncio.Semaphore(GITHUB_MAX_CONCURRENT_PAGES)
+
+        async def fetch_bounded(page: int) -> httpx.Response:
+            async with semaphore:
+                return await fetch(page)
+
+        tasks = [
+            asyncio.ensure_future(fetch_bounded(page))
+            for page in range(2, last_page + 1)
+        ]
+        try:
+            other_responses = await asyncio.gather(*tasks)
+        finally:
+            await cancel_pending(tasks)
+        responses = dict(enumerate([first_response, *other_responses], start=1))
+
+        # a full last page means new stars may have spilled onto new pages
+        while is_full_page(responses[last_page], pages.get(last_page)):
+            last_page += 1
+            responses[last_page] = await fetch(last_page)
+
+    return responses
+
+
+def is_full_page(response: httpx.Response, stored_page: SnapshotPage | None) -> bool:
+    """Check whether a page holds as many repos as a page can."""
+    if response.status_code == HTTPStatus.NOT_MODIFIED and stored_page:
+        return len(stored_page.provider_ids) == GITHUB_PAGE_SIZE
+
+    return len(response.json()) == GITHUB_PAGE_SIZE
 
-    previously_shown_ids = set()
 
-    if cycle_start := user.user_profile.cycle_start:
-        logger.info(f"Current cycle started at Star ID: {cycle_start.id}")
+def parse_star(item: dict[str, Any]) -> dict[str, Any] | None:
+    """Map a GitHub repository object to StarFieldsBase fields."""
+    if not item.get("owner"):
+        logger.info(f"Skipping repo {item.get('name', 'unknown')} with deleted owner")
+        return None
 
-        previously_shown_ids = set(
-            Star.objects.filter(reminder__user=user, id__gte=cycle_start.id)
-            .values_list("provider_id", flat=True)
-            .distinct()
+    return {
+        "provider": "github",
+        "provider_id": str(item["id"]),
+        "name": item["name"],
+        "owner": item["owner"]["login"],
+        "owner_id": str(item["owner"]["id"]),
+        "description": item.get("description"),
+        "star_count": item["stargazers_count"],
+        "repo_url": item["html_url"],
+        "project_url": item.get("homepage"),
+        "archived": item.get("archived", False),
+    }
+
+
+def parse_stars(
+    items: list[dict[str, Any]],
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """Normalize a batch of GitHub repo objects, collecting malformed ones."""
+    fields = []
+    errors = []
+    for item in items:
+        try:
+            if star_fields := parse_star(item):
+                fields.append(star_fields)
+        except (KeyError, TypeError) as error:
+            errors.append({"item": item, "error": repr(error)})
+
+    return fields, errors
+
+
+def report_parse_errors(errors: list[dict[str, Any]]) -> None:
+    """Report a batch's malformed items to Sentry in one event."""
+    if not errors:
+        return
+
+    logger.warning(f"Skipped {len(errors)} malformed items")
+    sentry_sdk.capture_message(
+        f"Skipped {len(errors)} malformed starred repos",
+        extras={"errors": errors},
+    )
+
+
+def upsert_snapshot_stars(user: CustomUser, items: list[dict[str, Any]]) -> list[str]:
+    """Insert or update SnapshotStars for GitHub repo objects, return their IDs."""
+    fields, errors = parse_stars(items)
+    report_parse_errors(errors)
+
+    SnapshotStar.objects.bulk_create(
+        [SnapshotStar(user=user, **star_fields) for star_fields in fields],
+        batch_size=BULK_CREATE_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["user", "provider", "provider_id"],
+        update_fields=STAR_UPDATE_FIELDS,
+    )
+
+    return [star_fields["provider_id"] for star_fields in fields]
+
+
+def get_catalog_provider_ids(user: CustomUser) -> set[str]:
+    return set(
+        SnapshotStar.objects.filter(user=user).values_list("provider_id", flat=True)
+    )
+
+
+def get_snapshot_pages(token: SocialToken) -> dict[int, SnapshotPage]:
+    return {page.number: page for page in SnapshotPage.objects.filter(token=token)}
+
+
+def store_snapshot_pages(
+    user: CustomUser,
+    token: SocialToken,
+    pages: dict[int, SnapshotPage],
+    responses: dict[int, httpx.Response],
+) -> set[str]:
+    """Upsert the token's changed pages and return the provider IDs of all of them."""
+    seen_provider_ids: set[str] = set()
+
+    unchanged_count = 0
+    for number, response in sorted(responses.items()):
+        if response.status_code == HTTPStatus.NOT_MODIFIED:
+            seen_provider_ids.update(pages[number].provider_ids)
+            unchanged_count += 1
+            continue
+
+        provider_ids = upsert_snapshot_stars(user, response.json())
+        SnapshotPage.objects.update_or_create(
+            token=token,
+            number=number,
+            defaults={
+                "user": user,
+                "etag": response.headers.get("ETag", ""),
+                "provider_ids": provider_ids,
+            },
         )
-        logger.info(f"Found {len(previously_shown_ids)} repos shown in current cycle")
+        seen_provider_ids.update(provider_ids)
 
-    else:
-        logger.info("No cycle start found, starting fresh cycle")
+    SnapshotPage.objects.filter(token=token, number__gt=max(responses)).delete()
+    logger.info(f"{unchanged_count} of {len(responses)} pages unchanged")
+    return seen_provider_ids
 
-    temp_stars_kwargs = {"user": user}
-    archive_label = "unarchived"
-    if not user.user_profile.include_archived:
-        temp_stars_kwargs["archived"] = False
-        archive_label = "archived"
-        logger.info("Filtering out archived repositories")
 
-    unshown_temp_stars = list(
-        TempStar.objects.filter(**temp_stars_kwargs).exclude(
-            provider_id__in=previously_shown_ids
+def remove_unstarred_repos(user: CustomUser, seen_provider_ids: set[str]) -> None:
+    stale_provider_ids = get_catalog_provider_ids(user) - seen_provider_ids
+    SnapshotStar.objects.filter(user=user, provider_id__in=stale_provider_ids).delete()
+    logger.info(f"Removed {len(stale_provider_ids)} unstarred repos from snapshot")
+
+
+async def refresh_snapshot(
+    user: CustomUser,
+    tokens: list[SocialToken],
+) -> None:
+    """Refresh the user's SnapshotStars, skipping pages that come back 304."""
+    seen_provider_ids: set[str] = set()
+
+    for token in tokens:
+        pages = await sync_to_async(get_snapshot_pages)(token)
+        responses = await fetch_starred_conditional(token.token, pages)
+        seen_provider_ids |= await sync_to_async(store_snapshot_pages)(
+            user, token, pages, responses
         )
+
+    await sync_to_async(remove_unstarred_repos)(user, seen_provider_ids)
+
+
+def sync_snapshot(user: CustomUser, tokens: list[SocialToken]) -> None:
+    """Run `refresh_snapshot` from a sync task, its queries on the task's thread."""
+    async_to_sync(refresh_snapshot)(user, tokens)
+
+
+async def fetch_new_stars(
+    token: str,
+    known_provider_ids: set[str],
+) -> list[dict[str, Any]]:
+    """Fetch stars newest first, stopping at the first one already in the catalog."""
+    new_items: list[dict[str, Any]] = []
+
+    async with github_client(
+        token,
+        media_type="application/vnd.github.star+json",
+        sort="created",
+        direction="desc",
+    ) as client:
+        page = 1
+        while True:
+            response = await fetch_starred_page(client, page)
+            items = response.json()
+
+            for item in items:
+                if str(item["repo"]["id"]) in known_provider_ids:
+                    logger.info(f"Reached known star from {item['starred_at']}")
+                    return new_items
+                new_items.append(item["repo"])
+
+            if len(items) < GITHUB_PAGE_SIZE:
+                return new_items
+
+            page += 1
+
+
+def is_full_sync_due(sync_state: SyncState) -> bool:
+    full_sync_interval = timedelta(days=settings.FULL_SYNC_INTERVAL_DAYS)
+    return (
+        sync_state.full_synced_at is None
+        or sync_state.full_synced_at + full_sync_interval <= timezone.now()
     )
 
-    logger.info(f"Found {len(unshown_temp_stars)} unshown {archive_label} temp stars")
 
-    if len(unshown_temp_stars) < user.user_profile.max_entries:
-        logger.info(
-            f"Only {len(unshown_temp_stars)} unshown repos, "
-            f"but need {user.user_profile.max_entries}. Querying all repos."
+async def refresh_incremental(
+    user: CustomUser,
+    tokens: list[SocialToken],
+) -> None:
+    """Add newly starred repos to the catalog, with a periodic full sweep."""
+    sync_state, _ = await sync_to_async(SyncState.objects.get_or_create)(user=user)
+
+    if is_full_sync_due(sync_state):
+        logger.info("Full sync due, sweeping the whole catalog")
+        await refresh_snapshot(user, tokens)
+        sync_state.full_synced_at = timezone.now()
+        await sync_to_async(sync_state.save)()
+        return
+
+    known_provider_ids = await sync_to_async(get_catalog_provider_ids)(user)
+
+    for token in tokens:
+        items = await fetch_new_stars(token.token, known_provider_ids)
+        logger.info(f"Received {len(items)} new items from GitHub API")
+        await sync_to_async(upsert_snapshot_stars)(user, items)
+
+
+def sync_incremental(user: CustomUser, tokens: list[SocialToken]) -> None:
+    """Run `refresh_incremental` from a sync task, its queries on the task's thread."""
+    async_to_sync(refresh_incremental)(user, tokens)
+
+
+async def sample_starred(
+    tokens: list[str],
+    sample_size: int,
+    include_archived: bool,
+    previously_shown_ids: SortedIdSet,
+) -> tuple[ReservoirSampler[dict[str, Any]], ReservoirSampler[dict[str, Any]]]:
+    """Stream every token's pages through reservoirs of unshown and of all stars."""
+    unshown = ReservoirSampler[dict[str, Any]](sample_size)
+    everything = ReservoirSampler[dict[str, Any]](sample_size)
+    seen_provider_ids: set[str] = set()
+
+    for token in tokens:
+        async for items, _ in iter_starred_pages(token):
+            fields, errors = parse_stars(items)
+            report_parse_errors(errors)
+
+            for star_fields in fields:
+                provider_id = star_fields["provider_id"]
+                if provider_id in seen_provider_ids:
+                    continue
+                if star_fields["archived"] and not include_archived:
+                    continue
+
+                seen_provider_ids.add(provider_id)
+                everything.add(star_fields)
+                if provider_id not in previously_shown_ids:
+                    unshown.add(star_fields)
+
+    return unshown, everything
+
+
+def sample_reminder(
+    user: CustomUser,
+    tokens: list[SocialToken],
+    slot: datetime,
+) -> None:
+    """Sample a reminder straight from the GitHub stream, storing only the winners."""
+    user_profile = user.user_profile
+    previously_shown_ids = get_previously_shown_ids(user)
+
+    unshown, everything = run_async(
+        sample_starred(
+            [token.token for token in tokens],
+            user_profile.max_entries,
+            user_profile.include_archived,
+            previously_shown_ids,
         )
+    )
+    reminder = create_sampled_reminder(
+        user, unshown, everything, len(previously_shown_ids)
+    )
+    if reminder:
+        queue_reminder_email(user, reminder)
+    leases.complete([user.id], slot)
 
-        all_temp_stars = list(TempStar.objects.filter(**temp_stars_kwargs))
 
-        if not all_temp_stars:
-            logger.info("No temp stars found, exiting")
-            return
+def create_sampled_reminder(
+    user: CustomUser,
+    unshown: ReservoirSampler[dict[str, Any]],
+    everything: ReservoirSampler[dict[str, Any]],
+    previously_shown_count: int,
+    delivered: bool = True,
+) -> Reminder | None:
+    """Create a reminder from the streamed reservoirs, if anything was starred."""
+    logger.info(f"Streamed {everything.seen} candidate repos, {unshown.seen} unshown")
+
+    if not everything.seen:
+        logger.info("No stars found, exiting")
+        return None
 
+    if unshown.seen < user.user_profile.max_entries:
         logger.info(
             f"Cycle will reset with this reminder "
-            f"({len(unshown_temp_stars)} unshown, {len(all_temp_stars)} total)."
+            f"({unshown.seen} unshown, {everything.seen} total)."
         )
+        sampled_fields = everything.sample
+    else:
+        sampled_fields = unshown.sample
+
+    random.shuffle(sampled_fields)
+
+    return create_reminder(
+        user,
+        [Star(**star_fields) for star_fields in sampled_fields],
+        get_cutoff_index(everything.seen, previously_shown_count),
+        delivered,
+    )
+
+
+def stage_temp_stars(
+    user: CustomUser,
+    items: list[dict[str, Any]],
+    seen_provider_ids: set[str] | None = None,
+) -> int:
+    """Normalize GitHub repo objects in memory and upsert them as TempStars.
+
+    Repos already in `seen_provider_ids`, e.g. starred with another of the
+    user's tokens, are skipped, and the set is updated with the staged ones.
+    """
+    fields, errors = parse_stars(items)
+    report_parse_errors(errors)
+
+    if seen_provider_ids is None:
+        seen_provider_ids = set()
+
+    new_fields = []
+    for star_fields in fields:
+        if star_fields["provider_id"] in seen_provider_ids:
+            continue
+        seen_provider_ids.add(star_fields["provider_id"])
+        new_fields.append(star_fields)
+
+    TempStar.objects.bulk_create(
+        [TempStar(user=user, **star_fields) for star_fields in new_fields],
+        batch_size=BULK_CREATE_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["user", "provider", "provider_id"],
+        update_fields=STAR_UPDATE_FIELDS,
+    )
+    return len(new_fields)
+
+
+def load_ingest_checkpoint(user: CustomUser) -> SyncState:
+    """Get the user's SyncState, dropping a checkpoint that can't be resumed.
+
+    A stale checkpoint's staged stars go with it, ingestion starts over.
+    """
+    sync_state, _ = SyncState.objects.get_or_create(user=user)
+    checkpoint = sync_state.checkpoint
+
+    if checkpoint and (
+        checkpoint["fetcher"] != settings.STAR_FETCHER
+        or sync_state.checkpointed_at
+        + timedelta(minutes=settings.INGEST_CHECKPOINT_TTL_MINUTES)
+        <= timezone.now()
+    ):
+        logger.info("Discarding stale ingestion checkpoint")
+        TempStar.objects.filter(user=user).delete()
+        clear_ingest_checkpoint(sync_state)
+    elif checkpoint:
+        logger.info(f"Resuming ingestion from {checkpoint}")
+
+    return sync_state
+
+
+def get_resume_position(
+    sync_state: SyncState,
+    token: SocialToken,
+) -> tuple[bool, str | None]:
+    """Whether `token` was ingested already, and where to resume it from."""
+    checkpoint = sync_state.checkpoint
+    if not checkpoint or token.id > checkpoint["token_id"]:
+        return False, None
+
+    if token.id < checkpoint["token_id"]:
+        return True, None
+
+    return checkpoint["position"] is None, checkpoint["position"]
+
+
+def save_ingest_checkpoint(
+    sync_state: SyncState,
+    token_id: int,
+    position: str | None,
+) -> None:
+    """Record that `token_id`'s pages before `position` are staged, None for all."""
+    sync_state.checkpoint = {
+        "fetcher": settings.STAR_FETCHER,
+        "token_id": token_id,
+        "position": position,
+    }
+    sync_state.checkpointed_at = timezone.now()
+    sync_state.save(update_fields=["checkpoint", "checkpointed_at", "updated_at"])
 
-        temp_stars_to_sample = all_temp_stars
-        total_repos_available = len(all_temp_stars)
 
+def clear_ingest_checkpoint(sync_state: SyncState) -> None:
+    sync_state.checkpoint = None
+    sync_state.checkpointed_at = None
+    sync_state.save(update_fields=["checkpoint", "checkpointed_at", "updated_at"])
+
+
+async def stage_starred(
+    user: CustomUser,
+    tokens: list[SocialToken],
+) -> None:
+    """Fetch all starred repos and stage them as TempStars, once per repo.
+
+    Progress is checkpointed after every page, so a retry after a timeout, a
+    crash or a rate limit picks up where the last attempt stopped.
+    """
+    sync_state = await sync_to_async(load_ingest_checkpoint)(user)
+    seen_provider_ids: set[str] = set()
+
+    for token in tokens:
+        finished, position = get_resume_position(sync_state, token)
+        if finished:
+            continue
+
+        staged_count = 0
+        async with aclosing(iter_starred_pages(token.token, position)) as pages:
+            async for items, next_position in pages:
+                staged_count += await sync_to_async(stage_temp_stars)(
+                    user, items, seen_provider_ids
+                )
+                await sync_to_async(save_ingest_checkpoint)(
+                    sync_state, token.id, next_position
+                )
+        logger.info(f"Staged {staged_count} temp stars")
+
+    await sync_to_async(clear_ingest_checkpoint)(sync_state)
+
+
+def create_temp_stars(user: CustomUser, tokens: list[SocialToken]) -> None:
+    """Run `stage_starred` from a sync task, its queries on the task's thread."""
+    async_to_sync(stage_starred)(user, tokens)
+
+
+def ingest_stars(
+    user: CustomUser,
+    tokens: list[SocialToken],
+    slot: datetime | None = None,
+) -> None:
+    """Fetch all starred repos with the configured sync mode.
+
+    Reservoir syncs sample the reminder as they go, completing the `slot` lease.
+    """
+    if settings.STAR_SYNC_MODE == SYNC_MODE_RESERVOIR:
+        sample_reminder(user, tokens, slot or leases.get_slot())
+    elif settings.STAR_SYNC_MODE == SYNC_MODE_SNAPSHOT:
+        sync_snapshot(user, tokens)
+    elif settings.STAR_SYNC_MODE == SYNC_MODE_INCREMENTAL:
+        sync_incremental(user, tokens)
     else:
-        temp_stars_to_sample = unshown_temp_stars
-        total_repos_available = TempStar.objects.filter(**temp_stars_kwargs).count()
+        create_temp_stars(user, tokens)
+
 
-    sample_size = min(user.user_profile.max_entries, len(temp_stars_to_sample))
-    sampled_temp_stars = random.sample(temp_stars_to_sample, sample_size)
+def reschedule_user_job(user_id: int, next_run: datetime, slot: datetime) -> None:
+    """Run the whole user job again once GitHub lets us."""
+    logger.info(f"Rescheduling user job for {user_id=} at {next_run}")
+    # the rerun may land in the same slot
+    leases.release(user_id, slot)
+    schedule(
+        "starminder.implementations.jobs.user_job",
+        user_id,
+        next_run=next_run,
+        **get_queue_options(STAGE_FETCH),
+    )
 
-    logger.info(f"Sampled {sample_size} temp stars")
 
-    cutoff_index = total_repos_available - len(previously_shown_ids)
-    logger.info(
-        f"Cutoff index: {cutoff_index} "
-        f"(total: {total_repos_available}, shown: {len(previously_shown_ids)})"
-    )
-
-    reminder = Reminder.objects.create(user_id=user_id)
-
-    for idx, temp_star in enumerate(sampled_temp_stars):
-        star = Star.objects.create(
-            reminder=reminder,
-            provider=temp_star.provider,
-            provider_id=temp_star.provider_id,
-            owner=temp_star.owner,
-            owner_id=temp_star.owner_id,
-            name=temp_star.name,
-            description=temp_star.description,
-            star_count=temp_star.star_count,
-            repo_url=temp_star.repo_url,
-            project_url=temp_star.project_url,
-            archived=temp_star.archived,
+def pager(user_id: int, token_ids: list[int], slot: datetime | None = None) -> None:
+    """Fetch all starred repos from GitHub API and store them for sampling.
+
+    `slot` is the one the user's lease was acquired for, the current one if
+    not given.
+    """
+    slot = slot or leases.get_slot()
+    user = CustomUser.objects.select_related("user_profile").get(id=user_id)
+    tokens = list(
+        SocialToken.objects.filter(id__in=token_ids, account__user=user).order_by("id")
+    )
+    logger.info(f"Pager for {user.username}, {len(tokens)} tokens")
+
+    if not tokens:
+        logger.info("Tokens are gone, exiting")
+        leases.complete([user.id], slot)
+        return
+
+    if blocked_until := governor.get_blocked_until(
+        [token.token for token in tokens], get_rate_limit_resource()
+    ):
+        reschedule_user_job(user.id, blocked_until, slot)
+        return
+
+    try:
+        ingest_stars(user, tokens, slot)
+    except governor.RateLimitExhausted as error:
+        logger.warning(str(error))
+        # staged stars are kept, the rerun resumes from the ingestion checkpoint
+        reschedule_user_job(user.id, error.reset_at, slot)
+        return
+    finally:
+        governor.flush()
+
+    # winners are sampled while streaming, so there is nothing left to generate
+    if settings.STAR_SYNC_MODE == SYNC_MODE_RESERVOIR:
+        return
+
+    logger.info("All pages processed, scheduling generate_data")
+    async_task(
+        "starminder.implementations.jobs.generate_data",
+        user.id,
+        slot,
+        **get_queue_options(STAGE_SAMPLE),
+    )
+
+
+def get_shown_stars(user: CustomUser) -> QuerySet[Star]:
+    """Stars shown to the user since the current cycle started."""
+    if not (cycle_start_id := user.user_profile.cycle_start_id):
+        return Star.objects.none()
+
+    return Star.objects.filter(reminder__user=user, id__gte=cycle_start_id)
+
+
+def get_previously_shown_ids(user: CustomUser) -> SortedIdSet:
+    """Load the provider IDs shown since the current cycle started.
+
+    The packed set is maintained by create_reminder, and only rebuilt from
+    Stars when it belongs to another cycle, e.g. after an admin edit.
+    """
+    cycle_start_id = user.user_profile.cycle_start_id
+    shown_set = ShownSet.objects.filter(user=user).first()
+
+    if shown_set and shown_set.cycle_start_id == cycle_start_id:
+        previously_shown_ids = SortedIdSet.from_bytes(shown_set.provider_ids)
+    else:
+        logger.info(f"Rebuilding shown set for cycle start {cycle_start_id}")
+        previously_shown_ids = SortedIdSet(
+            get_shown_stars(user).values_list("provider_id", flat=True)
         )
+        save_shown_ids(user, previously_shown_ids)
 
-        if idx == cutoff_index or (idx == 0 and user.user_profile.cycle_start is None):
-            user.user_profile.cycle_start = star
-            user.user_profile.save()
-            logger.info(
-                f"Cycle start set to Star ID {star.id} "
-                f"(star {idx + 1} of {len(sampled_temp_stars)} in this reminder)"
+    logger.info(f"Found {len(previously_shown_ids)} repos shown in current cycle")
+    return previously_shown_ids
+
+
+def uses_shown_set() -> bool:
+    """Whether reminders are sampled against the shown set, which then needs upkeep.
+
+    Permutation cycles track their own position, except in reservoir syncs.
+    """
+    return (
+        settings.REMINDER_CYCLE_MODE != CYCLE_MODE_PERMUTATION
+        or settings.STAR_SYNC_MODE == SYNC_MODE_RESERVOIR
+    )
+
+
+def save_shown_ids(user: CustomUser, shown_ids: SortedIdSet) -> None:
+    ShownSet.objects.bulk_create(
+        [
+            ShownSet(
+                user=user,
+                cycle_start_id=user.user_profile.cycle_start_id,
+                provider_ids=shown_ids.to_bytes(),
             )
+        ],
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=["cycle_start_id", "provider_ids", "updated_at"],
+    )
+
+
+def get_cutoff_index(total_repos_available: int, previously_shown_count: int) -> int:
+    """Index in the next reminder where the repos left in the cycle run out."""
+    cutoff_index = total_repos_available - previously_shown_count
+    logger.info(
+        f"Cutoff index: {cutoff_index} "
+        f"(total: {total_repos_available}, shown: {previously_shown_count})"
+    )
+    return cutoff_index
+
+
+def take_from_cycle(
+    cycle: ShuffleCycle,
+    provider_ids: set[str],
+    size: int,
+) -> tuple[list[str], int | None]:
+    """Take the next `size` starred repos of the cycle, starting a new one when done.
+
+    Repos starred since the shuffle are spliced into the unvisited tail, and
+    unstarred ones are skipped. Returns the taken provider IDs and the cutoff
+    index of a new cycle, if one was started. `cycle.provider_ids` is only
+    reassigned when the order changed, otherwise just `position` moves.
+    """
+    order = list(unpack_ids(cycle.provider_ids))
+    starred_ids = {int(provider_id) for provider_id in provider_ids}
+    new_ids = sorted(starred_ids.difference(order))
+    splice_into_tail(order, cycle.position, new_ids)
+    reordered = bool(new_ids)
+
+    taken: list[int] = []
+    cutoff_index = None
+    while len(taken) < min(size, len(starred_ids)):
+        if cycle.position == len(order):
+            # repos this reminder already took from the old cycle go last, so
+            # the new cycle still shows them without repeating them right away
+            cutoff_index = len(taken)
+            remaining_ids = sorted(starred_ids.difference(taken))
+            order = random.sample(remaining_ids, len(remaining_ids))
+            order += random.sample(taken, len(taken))
+            cycle.position = 0
+            reordered = True
+
+        provider_id = order[cycle.position]
+        cycle.position += 1
+        if provider_id in starred_ids:
+            taken.append(provider_id)
+
+    # finishing the cycle exactly means the next reminder starts fresh
+    if cutoff_index is None and cycle.position == len(order):
+        cutoff_index = len(taken)
+
+    if reordered:
+        cycle.provider_ids = pack_ids(order)
+    return [str(provider_id) for provider_id in taken], cutoff_index
+
+
+def sample_from_cycle(
+    user: CustomUser,
+    all_temp_stars: QuerySet[Any],
+) -> tuple[list[Any], int | None]:
+    """Sample the next stars of the user's stored shuffle cycle."""
+    cycle, _ = ShuffleCycle.objects.get_or_create(user=user)
+    stored_provider_ids = cycle.provider_ids
+
+    provider_ids = set(all_temp_stars.values_list("provider_id", flat=True))
+    taken, cutoff_index = take_from_cycle(
+        cycle, provider_ids, user.user_profile.max_entries
+    )
+    update_fields = ["position", "updated_at"]
+    if cycle.provider_ids is not stored_provider_ids:
+        update_fields.append("provider_ids")
+    cycle.save(update_fields=update_fields)
+    logger.info(
+        f"Took {len(taken)} repos from shuffle cycle, "
+        f"now at {cycle.position} of {len(cycle.provider_ids) // 8}"
+    )
 
-    logger.info(f"Created reminder and {len(sampled_temp_stars)} stars")
+    temp_stars = {
+        temp_star.provider_id: temp_star
+        for temp_star in all_temp_stars.filter(provider_id__in=taken)
+    }
+    return [temp_stars[provider_id] for provider_id in taken], cutoff_index
 
-    if cutoff_index == len(sampled_temp_stars):
-        user.user_profile.cycle_start = None
-        user.user_profile.save()
+
+def get_star_weights(user: CustomUser, rows: list[tuple[Any, ...]]) -> list[float]:
+    """Weigh `(pk, provider_id, star_count)` rows by the user's sampling strategy."""
+    strategy = user.user_profile.sampling_strategy
+
+    if strategy == UserProfile.SAMPLING_POPULAR:
+        # +1 so repos nobody else starred still get a chance
+        return [star_count + 1 for _, _, star_count in rows]
+
+    last_shown_at = dict(
+        Star.objects.filter(reminder__user=user)
+        .values("provider_id")
+        .annotate(last_shown_at=Max("created_at"))
+        .values_list("provider_id", "last_shown_at")
+    )
+    now = timezone.now()
+    return [
+        (now - last_shown_at[provider_id]).days + 1
+        if provider_id in last_shown_at
+        else NEVER_SHOWN_WEIGHT
+        for _, provider_id, _ in rows
+    ]
+
+
+def sample_stars(user: CustomUser, temp_stars: QuerySet[Any], size: int) -> list[Any]:
+    """Sample up to `size` of `temp_stars` with the user's sampling strategy."""
+    if user.user_profile.sampling_strategy == UserProfile.SAMPLING_UNIFORM:
+        return sample_queryset(temp_stars, size)
+
+    rows = list(temp_stars.values_list("pk", "provider_id", "star_count"))
+    sampled_pks = weighted_sample(
+        [pk for pk, _, _ in rows], get_star_weights(user, rows), size
+    )
+    return fetch_in_order(temp_stars, sampled_pks)
+
+
+def sample_unshown(
+    user: CustomUser,
+    all_temp_stars: QuerySet[Any],
+) -> tuple[list[Any], int | None]:
+    """Sample stars not shown in the current cycle, falling back to all of them."""
+    previously_shown_ids = get_previously_shown_ids(user)
+    unshown_temp_stars = all_temp_stars.exclude(
+        provider_id__in=[str(provider_id) for provider_id in previously_shown_ids.ids]
+    )
+    total_count = all_temp_stars.count()
+    unshown_count = unshown_temp_stars.count()
+    logger.info(f"Found {unshown_count} unshown temp stars")
+
+    if unshown_count < user.user_profile.max_entries:
         logger.info(
-            "Cycle completed exactly with this reminder. Next reminder starts fresh."
+            f"Only {unshown_count} unshown repos, "
+            f"but need {user.user_profile.max_entries}. Sampling all repos."
         )
+        logger.info(
+            f"Cycle will reset with this reminder "
+            f"({unshown_count} unshown, {total_count} total)."
+        )
+        temp_stars_to_sample = all_temp_stars
+    else:
+        temp_stars_to_sample = unshown_temp_stars
 
-    if user.user_profile.reminder_email:
-        logger.info(f"Found email for {user}, queuing email send…")
+    sampled_temp_stars = sample_stars(
+        user, temp_stars_to_sample, user.user_profile.max_entries
+    )
+    # shown repos that were unstarred since don't count against the cycle
+    return sampled_temp_stars, get_cutoff_index(
+        total_count, total_count - unshown_count
+    )
 
-        subject = f"☆ Starminder ☆ {reminder.title}"
-        html = render_to_string("email.html", {"reminder": reminder, "user": user})
-        text = render_to_string("email.txt", {"reminder": reminder, "user": user})
 
-        async_task(
-            "starminder.content.email.send_email",
-            recipient=user.user_profile.reminder_email,
-            subject=subject,
-            html=html,
-            text=text,
-        )
-        logger.info("Queued email send")
+def set_cycle_start(user_profile: UserProfile, cycle_start: Star | None) -> None:
+    """Point the profile's cycle at `cycle_start` with a single UPDATE.
+
+    The star always comes from the user's own new reminder, which is all
+    clean() checks, so this skips the full_clean() queries of save().
+    """
+    user_profile.cycle_start = cycle_start
+    UserProfile.objects.filter(pk=user_profile.pk).update(
+        cycle_start=cycle_start,
+        updated_at=timezone.now(),
+    )
 
+
+def create_reminder(
+    user: CustomUser,
+    sampled_stars: Sequence[StarFieldsBase],
+    cutoff_index: int | None,
+    delivered: bool = True,
+) -> Reminder:
+    """Create a Reminder with a Star per sampled repo and advance the cycle.
+
+    The star at `cutoff_index` is the first one of the next cycle. Reminders
+    built ahead of their slot aren't `delivered` until they are sent. The
+    reminder's body is rendered here, once, for its email, page and feed.
+    """
+    user_profile = user.user_profile
+
+    if cutoff_index == len(sampled_stars):
+        cycle_start_index = None
+    elif cutoff_index is not None and 0 <= cutoff_index < len(sampled_stars):
+        cycle_start_index = cutoff_index
+    elif user_profile.cycle_start_id is None and sampled_stars:
+        cycle_start_index = 0
     else:
+        cycle_start_index = None
+
+    stars = [
+        Star(**{name: getattr(sampled_star, name) for name in STAR_FIELD_NAMES})
+        for sampled_star in sampled_stars
+    ]
+
+    with transaction.atomic():
+        reminder = Reminder.objects.create(
+            user=user,
+            delivered_at=timezone.now() if delivered else None,
+            body_html=render_reminder_body(stars),
+        )
+        for star in stars:
+            star.reminder = reminder
+        stars = Star.objects.bulk_create(stars)
+        logger.info(f"Created reminder and {len(stars)} stars")
+
+        if cutoff_index == len(sampled_stars):
+            logger.info(
+                "Cycle completed exactly with this reminder. "
+                "Next reminder starts fresh."
+            )
+            set_cycle_start(user_profile, None)
+        elif cycle_start_index is not None:
+            cycle_start = stars[cycle_start_index]
+            logger.info(
+                f"Cycle start set to Star ID {cycle_start.id} "
+                f"(star {cycle_start_index + 1} of {len(stars)} in this reminder)"
+            )
+            set_cycle_start(user_profile, cycle_start)
+
+        if not uses_shown_set():
+            # not kept up to date here, so don't leave it to be trusted later
+            ShownSet.objects.filter(user=user).delete()
+        elif user_profile.cycle_start_id is None:
+            save_shown_ids(user, SortedIdSet())
+        elif cycle_start_index is not None:
+            save_shown_ids(
+                user,
+                SortedIdSet(star.provider_id for star in stars[cycle_start_index:]),
+            )
+        else:
+            shown_ids = get_previously_shown_ids(user)
+            shown_ids.update(star.provider_id for star in stars)
+            save_shown_ids(user, shown_ids)
+
+    return reminder
+
+
+def render_reminder_email(
+    user: CustomUser, reminder: Reminder
+) -> dict[str, str] | None:
+    """Render the reminder's `enqueue_email` arguments, if the user has an address."""
+    if not user.user_profile.reminder_email:
         logger.info(f"No email found for {user}")
+        return None
 
-    async_task(
-        "starminder.implementations.jobs.cleanup_temp_stars",
-        user_id,
-    )
+    return {
+        "recipient": user.user_profile.reminder_email,
+        "subject": f"☆ Starminder ☆ {reminder.title}",
+        "html": render_to_string("email.html", {"reminder": reminder, "user": user}),
+        "text": render_to_string("email.txt", {"reminder": reminder, "user": user}),
+    }
+
+
+def queue_reminder_email(user: CustomUser, reminder: Reminder) -> None:
+    """Render the reminder email into the outbox, if the user has an address."""
+    if not (email := render_reminder_email(user, reminder)):
+        return
+
+    logger.info(f"Found email for {user}, adding it to the outbox…")
+    enqueue_email(**email, reminder=reminder)
+
+
+def generate_reminder(user: CustomUser, delivered: bool = True) -> Reminder | None:
+    """Sample the user's stored stars into a new Reminder, if there are any."""
+    snapshot_mode = settings.STAR_SYNC_MODE in CATALOG_SYNC_MODES
+    star_model = SnapshotStar if snapshot_mode else TempStar
+
+    temp_stars_kwargs = {"user": user}
+    if not user.user_profile.include_archived:
+        temp_stars_kwargs["archived"] = False
+        logger.info("Filtering out archived repositories")
+
+    all_temp_stars = star_model.objects.filter(**temp_stars_kwargs)
+    if not all_temp_stars.exists():
+        logger.info("No temp stars found, exiting")
+        return None
+
+    if settings.REMINDER_CYCLE_MODE == CYCLE_MODE_PERMUTATION:
+        sampled_temp_stars, cutoff_index = sample_from_cycle(user, all_temp_stars)
+    else:
+        sampled_temp_stars, cutoff_index = sample_unshown(user, all_temp_stars)
+
+    logger.info(f"Sampled {len(sampled_temp_stars)} temp stars")
+
+    return create_reminder(user, sampled_temp_stars, cutoff_index, delivered)
+
+
+def generate_data(user_id: int, slot: datetime | None = None) -> None:
+    """Sample stored stars, create Reminder and Stars, queue email sending, clean up.
+
+    Completes the user's lease for `slot`, the current one if not given.
+    """
+    logger.info(f"Generating data for user_id={user_id}")
+    slot = slot or leases.get_slot()
+
+    user = CustomUser.objects.get(id=user_id)
+    logger.info(f"Found user {user.username}")
+
+    reminder = generate_reminder(user)
+    if not reminder:
+        # nothing to send this slot, a rerun wouldn't find anything either
+        leases.complete([user.id], slot)
+        return
+
+    queue_reminder_email(user, reminder)
+    leases.complete([user.id], slot)
+
+    # the snapshot is kept around for the next sync
+    if settings.STAR_SYNC_MODE not in CATALOG_SYNC_MODES:
+        async_task(
+            "starminder.implementations.jobs.cleanup_temp_stars",
+            user_id,
+            **get_queue_options(STAGE_CLEANUP),
+        )
 
     logger.info("Done!")
 
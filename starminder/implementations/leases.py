@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from loguru import logger
+
+from starminder.implementations.models import JobLease
+
+
+def get_slot(at: datetime | None = None) -> datetime:
+    """The hour a run belongs to, each user gets one run per slot."""
+    return (at or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+def acquire(
+    user_ids: list[int],
+    slot: datetime,
+    kind: str = JobLease.KIND_RUN,
+) -> list[int]:
+    """Lease `slot` for the users, return the IDs nobody else holds it for.
+
+    Leases of runs that never finished expire after `JOB_LEASE_MINUTES`, so a
+    crashed or timed out run can be retried within the slot.
+    """
+    if not user_ids:
+        return []
+
+    now = timezone.now()
+    holder = uuid4().hex
+
+    # past slots can't be run again anyway, expired leases are free to take
+    JobLease.objects.filter(user_id__in=user_ids, kind=kind).filter(
+        Q(slot__lt=slot) | Q(slot=slot, expires_at__lte=now)
+    ).delete()
+
+    JobLease.objects.bulk_create(
+        [
+            JobLease(
+                user_id=user_id,
+                slot=slot,
+                kind=kind,
+                holder=holder,
+                expires_at=now + timedelta(minutes=settings.JOB_LEASE_MINUTES),
+            )
+            for user_id in user_ids
+        ],
+        ignore_conflicts=True,
+    )
+    acquired_ids = set(
+        JobLease.objects.filter(slot=slot, kind=kind, holder=holder).values_list(
+            "user_id", flat=True
+        )
+    )
+
+    if dropped_count := len(user_ids) - len(acquired_ids):
+        logger.info(f"Dropped {dropped_count} duplicate {kind} jobs for {slot}")
+
+    return [user_id for user_id in user_ids if user_id in acquired_ids]
+
+
+def complete(
+    user_ids: list[int],
+    slot: datetime,
+    kind: str = JobLease.KIND_RUN,
+) -> None:
+    """Hold the users' leases for the rest of the slot, their runs are done."""
+    if not user_ids:
+        return
+
+    JobLease.objects.filter(user_id__in=user_ids, slot=slot, kind=kind).update(
+        expires_at=None
+    )
+
+
+def release(
+    user_id: int,
+    slot: datetime,
+    kind: str = JobLease.KIND_RUN,
+) -> None:
+    """Give up the user's lease, e.g. so a rescheduled run may take it."""
+    JobLease.objects.filter(user_id=user_id, slot=slot, kind=kind).delete()
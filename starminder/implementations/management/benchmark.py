@@ -0,0 +1,32 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from django.db import transaction
+
+
+def fake_starred_repos(count: int) -> list[dict[str, Any]]:
+    """GitHub starred repo objects to benchmark with, IDs well clear of real ones."""
+    return [
+        {
+            "id": 10_000_000 + i,
+            "name": f"benchmark-repo-{i}",
+            "owner": {"login": "benchmark-owner", "id": 1},
+            "description": "Benchmark repository",
+            "stargazers_count": i,
+            "html_url": f"https://github.com/benchmark-owner/benchmark-repo-{i}",
+            "homepage": None,
+        }
+        for i in range(count)
+    ]
+
+
+@contextmanager
+def rolled_back() -> Iterator[None]:
+    """Run the block in a transaction that is always rolled back.
+
+    Benchmarks run against a real user, whose data is left untouched.
+    """
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
@@ -0,0 +1,53 @@
+from time import perf_counter
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection
+
+from starminder.core.models import CustomUser
+from starminder.implementations.jobs import parse_star, stage_temp_stars
+from starminder.implementations.management.benchmark import (
+    fake_starred_repos,
+    rolled_back,
+)
+from starminder.implementations.models import TempStar
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-row vs bulk TempStar ingestion on the configured database"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "user_id",
+            type=int,
+            help="The ID of the user to attach benchmark rows to",
+        )
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=5000,
+            help="Number of starred repos to ingest per run",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        user = CustomUser.objects.get(id=options["user_id"])
+        items = fake_starred_repos(options["rows"])
+
+        self.stdout.write(f"Ingesting {len(items)} rows on {connection.vendor}")
+
+        with rolled_back():
+            start = perf_counter()
+            for item in items:
+                TempStar.objects.create(user=user, **parse_star(item))
+            self.report("per-row create", len(items), perf_counter() - start)
+
+        with rolled_back():
+            start = perf_counter()
+            created_count = stage_temp_stars(user, items)
+            self.report("bulk_create", created_count, perf_counter() - start)
+
+    def report(self, label: str, row_count: int, elapsed: float) -> None:
+        self.stdout.write(
+            f"{label}: {row_count} rows in {elapsed:.2f}s "
+            f"({row_count / elapsed:,.0f} rows/s)"
+        )
@@ -0,0 +1,74 @@
+from time import perf_counter
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection
+
+from starminder.content.models import Reminder, Star
+from starminder.core.models import CustomUser, UserProfile
+from starminder.implementations.jobs import parse_star, sample_stars, stage_temp_stars
+from starminder.implementations.management.benchmark import (
+    fake_starred_repos,
+    rolled_back,
+)
+from starminder.implementations.models import TempStar
+
+
+class Command(BaseCommand):
+    help = "Benchmark each reminder sampling strategy on the configured database"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "user_id",
+            type=int,
+            help="The ID of the user to attach benchmark rows to",
+        )
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=50_000,
+            help="Number of starred repos to sample from",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=10,
+            help="Number of reminders to sample per strategy",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        user = CustomUser.objects.select_related("user_profile").get(
+            id=options["user_id"]
+        )
+        items = fake_starred_repos(options["rows"])
+
+        self.stdout.write(
+            f"Sampling {user.user_profile.max_entries} of {len(items)} rows "
+            f"on {connection.vendor}"
+        )
+
+        with rolled_back():
+            stage_temp_stars(user, items)
+
+            # a shown history for the staleness strategy to weigh
+            reminder = Reminder.objects.create(user=user)
+            Star.objects.bulk_create(
+                Star(reminder=reminder, **parse_star(item)) for item in items[::10]
+            )
+
+            for strategy, _ in UserProfile.SAMPLING_STRATEGY_CHOICES:
+                user.user_profile.sampling_strategy = strategy
+                start = perf_counter()
+                for _ in range(options["runs"]):
+                    sample_stars(
+                        user,
+                        TempStar.objects.filter(user=user),
+                        user.user_profile.max_entries,
+                    )
+                self.report(strategy, options["runs"], perf_counter() - start)
+
+    def report(self, label: str, run_count: int, elapsed: float) -> None:
+        self.stdout.write(
+            f"{label}: {run_count} samples in {elapsed:.2f}s "
+            f"({elapsed / run_count * 1000:,.1f} ms/sample)"
+        )
@@ -0,0 +1,24 @@
+from itertools import batched
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from starminder.content.models import Reminder, render_reminder_body
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Re-render stored reminder bodies, e.g. after changing _reminder_body.html"
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        reminders = Reminder.objects.prefetch_related("star_set").order_by("id")
+
+        reminder_count = 0
+        for batch in batched(reminders.iterator(chunk_size=BATCH_SIZE), BATCH_SIZE):
+            for reminder in batch:
+                reminder.body_html = render_reminder_body(reminder.star_set.all())
+            Reminder.objects.bulk_update(batch, ["body_html"])
+            reminder_count += len(batch)
+
+        self.stdout.write(f"Rendered {reminder_count} reminder bodies")
@@ -1,23 +1,60 @@
 from typing import Any
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django_q.models import Schedule
 from loguru import logger
 
+from starminder.core.queues import STAGE_CLEANUP, STAGE_EMAIL, get_queue_options
+
+# start_jobs runs at this minute past every hour
+START_JOBS_MINUTE = 5
+
 
 class Command(BaseCommand):
     help = "Set up django-q schedules for recurring jobs"
 
     def handle(self, *args: Any, **options: Any) -> None:
-        schedule, created = Schedule.objects.get_or_create(
-            name="start_jobs_hourly",
+        self.setup_schedule(
+            "start_jobs_hourly",
+            "starminder.implementations.jobs.start_jobs",
+            f"{START_JOBS_MINUTE} * * * *",
+        )
+
+        # the outbox schedules are also created by a content migration, so
+        # reminders get sent without this command; it keeps their queues current
+        self.setup_schedule(
+            "dispatch_outbox_minutely",
+            "starminder.content.outbox.dispatch_outbox",
+            "* * * * *",
+            **get_queue_options(STAGE_EMAIL),
+        )
+        self.setup_schedule(
+            "purge_outbox_daily",
+            "starminder.content.outbox.purge_outbox",
+            "30 4 * * *",
+            **get_queue_options(STAGE_CLEANUP),
+        )
+
+        if lead_minutes := settings.REMINDER_PREBUILD_LEAD_MINUTES:
+            # lands `lead_minutes` before some hour's start_jobs run
+            self.setup_schedule(
+                "prebuild_jobs_hourly",
+                "starminder.implementations.jobs.prebuild_jobs",
+                f"{(START_JOBS_MINUTE - lead_minutes) % 60} * * * *",
+            )
+
+    def setup_schedule(self, name: str, func: str, cron: str, **fields: Any) -> None:
+        # updated in place, so toggling Q_STAGE_CLUSTERS_ENABLED moves the cluster
+        schedule, created = Schedule.objects.update_or_create(
+            name=name,
             defaults={
-                "func": "starminder.implementations.jobs.start_jobs",
+                "func": func,
                 "schedule_type": Schedule.CRON,
-                "cron": "5 * * * *",
+                "cron": cron,
+                "cluster": None,
+                **fields,
             },
         )
 
-        logger.info(
-            f"Schedule {'created' if created else 'already exists'}: {schedule.name}"
-        )
+        logger.info(f"Schedule {'created' if created else 'updated'}: {schedule.name}")
@@ -24,7 +24,7 @@ class Command(BaseCommand):
         site.name = parsenvy.str("DJANGO_SITE_DISPLAY_NAME") or "Starminder Local"
         site.save()
         self.stdout.write(self.style.SUCCESS(f"Updated Site to {site.domain}"))
-        
+
         social_app, created = SocialApp.objects.update_or_create(
             provider="github",
             defaults={
@@ -33,9 +33,9 @@ class Command(BaseCommand):
                 "secret": secret,
             },
         )
-        
+
         social_app.sites.add(site)
-        
+
         if created:
             self.stdout.write(self.style.SUCCESS("Created GitHub SocialApp"))
         else:
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("implementations", "0007_tempstar_archived"),
+        ("socialaccount", "0005_socialtoken_nullable_app"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SnapshotPage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("number", models.PositiveIntegerField()),
+                ("etag", models.CharField(blank=True, max_length=255)),
+                ("provider_ids", models.JSONField(default=list)),
+                (
+                    "token",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="socialaccount.socialtoken",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Snapshot Page",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("token", "number"), name="unique_snapshot_page"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="SnapshotStar",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("provider", models.CharField(max_length=255)),
+                ("provider_id", models.CharField(max_length=255)),
+                ("name", models.CharField(max_length=255)),
+                ("owner", models.CharField(max_length=255)),
+                ("owner_id", models.CharField(max_length=255)),
+                ("description", models.TextField(blank=True, null=True)),
+                ("star_count", models.IntegerField()),
+                ("repo_url", models.URLField(max_length=1024)),
+                (
+                    "project_url",
+                    models.URLField(blank=True, max_length=1024, null=True),
+                ),
+                ("archived", models.BooleanField(default=False)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Snapshot Star",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "provider", "provider_id"),
+                        name="unique_snapshot_star",
+                    )
+                ],
+            },
+        ),
+    ]
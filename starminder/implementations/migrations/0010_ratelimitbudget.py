@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("implementations", "0009_syncstate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RateLimitBudget",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("key", models.CharField(max_length=255, unique=True)),
+                ("remaining", models.PositiveIntegerField()),
+                ("reset_at", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Rate Limit Budget",
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def delete_duplicate_temp_stars(apps, schema_editor):
+    TempStar = apps.get_model("implementations", "TempStar")
+    seen = set()
+    duplicate_ids = []
+    for temp_star in TempStar.objects.order_by("id").only(
+        "id", "user_id", "provider", "provider_id"
+    ):
+        key = (temp_star.user_id, temp_star.provider, temp_star.provider_id)
+        if key in seen:
+            duplicate_ids.append(temp_star.id)
+        seen.add(key)
+    TempStar.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("implementations", "0010_ratelimitbudget"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_temp_stars, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="tempstar",
+            constraint=models.UniqueConstraint(
+                fields=("user", "provider", "provider_id"), name="unique_temp_star"
+            ),
+        ),
+    ]
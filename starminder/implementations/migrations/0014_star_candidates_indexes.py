@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("implementations", "0013_shownset"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="snapshotstar",
+            index=models.Index(
+                fields=["user", "archived", "provider_id"],
+                name="snapshotstar_candidates_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tempstar",
+            index=models.Index(
+                fields=["user", "archived", "provider_id"],
+                name="tempstar_candidates_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0011_reminder_delivered_at"),
+        ("implementations", "0014_star_candidates_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PrebuiltReminder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("email", models.JSONField(blank=True, null=True)),
+                ("due_slot", models.DateTimeField()),
+                (
+                    "shuffle_position",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                ("shuffle_provider_ids", models.BinaryField(blank=True, null=True)),
+                (
+                    "cycle_start",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="content.star",
+                    ),
+                ),
+                (
+                    "reminder",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="content.reminder",
+                    ),
+                ),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="prebuilt_reminder",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Prebuilt Reminder",
+            },
+        ),
+    ]
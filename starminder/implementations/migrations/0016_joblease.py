@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("implementations", "0015_prebuiltreminder"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobLease",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("slot", models.DateTimeField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("run", "run"), ("prebuild", "prebuild")],
+                        default="run",
+                        max_length=20,
+                    ),
+                ),
+                ("holder", models.CharField(max_length=32)),
+                ("expires_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Job Lease",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "kind", "slot"), name="unique_job_lease"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("implementations", "0016_joblease"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="syncstate",
+            name="checkpoint",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="syncstate",
+            name="checkpointed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,22 @@
+from allauth.socialaccount.models import SocialToken
 from django.conf import settings
-from django.db.models import CASCADE, ForeignKey, Manager
+from django.db.models import (
+    CASCADE,
+    SET_NULL,
+    BinaryField,
+    CharField,
+    DateTimeField,
+    ForeignKey,
+    Index,
+    JSONField,
+    Manager,
+    OneToOneField,
+    PositiveBigIntegerField,
+    PositiveIntegerField,
+    UniqueConstraint,
+)
 
+from starminder.content.models import Reminder, Star
 from starminder.core.models import StarFieldsBase, TimestampedModel
 
 
@@ -11,6 +27,217 @@ class TempStar(TimestampedModel, StarFieldsBase):
 
     class Meta:
         verbose_name = "Temporary Star"
+        constraints = [
+            UniqueConstraint(
+                fields=["user", "provider", "provider_id"],
+                name="unique_temp_star",
+            ),
+        ]
+        indexes = [
+            # reminder candidates, filtered by archived and joined on provider_id
+            Index(
+                fields=["user", "archived", "provider_id"],
+                name="tempstar_candidates_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"tmp: {self.owner}/{self.name}, {self.provider}, {self.user.username}"
+
+
+class SnapshotStar(TimestampedModel, StarFieldsBase):
+    """A starred repo in a user's persistent star snapshot."""
+
+    objects: "Manager[SnapshotStar]"
+
+    user = ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE)
+
+    class Meta:
+        verbose_name = "Snapshot Star"
+        constraints = [
+            UniqueConstraint(
+                fields=["user", "provider", "provider_id"],
+                name="unique_snapshot_star",
+            ),
+        ]
+        indexes = [
+            Index(
+                fields=["user", "archived", "provider_id"],
+                name="snapshotstar_candidates_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"snap: {self.owner}/{self.name}, {self.provider}, {self.user.username}"
+
+
+class SnapshotPage(TimestampedModel):
+    """ETag and repo IDs of one page of a token's starred list, for conditional sync."""
+
+    objects: "Manager[SnapshotPage]"
+
+    user = ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE)
+    token = ForeignKey(SocialToken, on_delete=CASCADE)
+    number = PositiveIntegerField()
+    etag = CharField(max_length=255, blank=True)
+    provider_ids = JSONField(default=list)
+
+    class Meta:
+        verbose_name = "Snapshot Page"
+        constraints = [
+            UniqueConstraint(
+                fields=["token", "number"],
+                name="unique_snapshot_page",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"page {self.number}, {self.user.username}"
+
+
+class SyncState(TimestampedModel):
+    """Per-user bookkeeping for star catalog syncs and resumable ingestion."""
+
+    objects: "Manager[SyncState]"
+
+    user = OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=CASCADE,
+        related_name="sync_state",
+    )
+    full_synced_at = DateTimeField(null=True, blank=True)
+    # where an interrupted staging ingestion resumes, see load_ingest_checkpoint
+    checkpoint = JSONField(null=True, blank=True)
+    checkpointed_at = DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Sync State"
+
+    def __str__(self) -> str:
+        return f"sync: {self.user.username}"
+
+
+class RateLimitBudget(TimestampedModel):
+    """Last seen GitHub rate limit for a token or the app, shared by all workers."""
+
+    objects: "Manager[RateLimitBudget]"
+
+    key = CharField(max_length=255, unique=True)
+    remaining = PositiveIntegerField()
+    reset_at = DateTimeField()
+
+    class Meta:
+        verbose_name = "Rate Limit Budget"
+
+    def __str__(self) -> str:
+        return f"{self.key}: {self.remaining} until {self.reset_at}"
+
+
+class ShuffleCycle(TimestampedModel):
+    """Packed provider IDs shuffled once per cycle, consumed in order from `position`."""
+
+    objects: "Manager[ShuffleCycle]"
+
+    user = OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=CASCADE,
+        related_name="shuffle_cycle",
+    )
+    provider_ids = BinaryField(default=bytes)
+    position = PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Shuffle Cycle"
+
+    def __str__(self) -> str:
+        return (
+            f"cycle: {self.user.username}, "
+            f"{self.position}/{len(self.provider_ids) // 8}"
+        )
+
+
+class ShownSet(TimestampedModel):
+    """Packed provider IDs shown to a user since the Star `cycle_start_id`."""
+
+    objects: "Manager[ShownSet]"
+
+    user = OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=CASCADE,
+        related_name="shown_set",
+    )
+    cycle_start_id = PositiveBigIntegerField(null=True, blank=True)
+    provider_ids = BinaryField(default=bytes)
+
+    class Meta:
+        verbose_name = "Shown Set"
+
+    def __str__(self) -> str:
+        return f"shown: {self.user.username}, {len(self.provider_ids) // 8} repos"
+
+
+class PrebuiltReminder(TimestampedModel):
+    """A reminder built ahead of the user's slot, waiting to be delivered."""
+
+    objects: "Manager[PrebuiltReminder]"
+
+    user = OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=CASCADE,
+        related_name="prebuilt_reminder",
+    )
+    reminder = OneToOneField(Reminder, on_delete=CASCADE)
+    # the rendered `enqueue_email` arguments, if the user has an address
+    email = JSONField(null=True, blank=True)
+    # the `leases.get_slot` hour it's delivered in, it's discarded after that
+    due_slot = DateTimeField()
+    # the user's cycle before this reminder advanced it, put back if it's
+    # discarded; the shuffle order is only kept if building reshuffled it
+    cycle_start = ForeignKey(
+        Star,
+        on_delete=SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    shuffle_position = PositiveIntegerField(null=True, blank=True)
+    shuffle_provider_ids = BinaryField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Prebuilt Reminder"
+
+    def __str__(self) -> str:
+        return f"prebuilt: {self.reminder}"
+
+
+class JobLease(TimestampedModel):
+    """Claim on running a user's reminder pipeline for one scheduled slot."""
+
+    KIND_RUN = "run"
+    KIND_PREBUILD = "prebuild"
+
+    KIND_CHOICES = [
+        (KIND_RUN, "run"),
+        (KIND_PREBUILD, "prebuild"),
+    ]
+
+    objects: "Manager[JobLease]"
+
+    user = ForeignKey(settings.AUTH_USER_MODEL, on_delete=CASCADE)
+    slot = DateTimeField()
+    kind = CharField(max_length=20, choices=KIND_CHOICES, default=KIND_RUN)
+    holder = CharField(max_length=32)
+    # null once the run finished, holding the slot until it is over
+    expires_at = DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Job Lease"
+        constraints = [
+            UniqueConstraint(
+                fields=["user", "kind", "slot"],
+                name="unique_job_lease",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind}: {self.user.username}, {self.slot}"
@@ -0,0 +1,228 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import sentry_sdk
+from allauth.socialaccount.models import SocialToken
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from loguru import logger
+
+from starminder.content.models import Reminder
+from starminder.core.http import run_async
+from starminder.core.models import CustomUser
+from starminder.implementations import governor, leases
+from starminder.implementations.jobs import (
+    SYNC_MODE_INCREMENTAL,
+    SYNC_MODE_RESERVOIR,
+    SYNC_MODE_SNAPSHOT,
+    cleanup_temp_stars,
+    create_sampled_reminder,
+    deliver_prebuilt_reminders,
+    generate_reminder,
+    get_cycle_state,
+    get_previously_shown_ids,
+    get_rate_limit_resource,
+    queue_reminder_email,
+    refresh_incremental,
+    refresh_snapshot,
+    render_reminder_email,
+    reschedule_user_job,
+    sample_starred,
+    save_prebuilt_reminder,
+    stage_starred,
+)
+from starminder.implementations.models import JobLease
+
+# The ORM is sync-only, so database calls go through asgiref's thread-sensitive
+# executor: one thread, one connection, serialized queries. They are short next
+# to the GitHub round trips, which all overlap on the loop. Emails go to the
+# outbox, which sends them in batches of its own.
+
+
+def run_pipeline(user_ids: list[int], due_slot: str | None = None) -> None:
+    """Run the whole reminder pipeline for a batch of users in this process."""
+    slot = datetime.fromisoformat(due_slot) if due_slot else None
+    run_async(process_users(user_ids, due_slot=slot))
+
+
+def prebuild_reminders(user_ids: list[int], due_slot: datetime | None = None) -> None:
+    """Build a batch of users' reminders due at `due_slot` now, to be sent then."""
+    run_async(process_users(user_ids, deliver=False, due_slot=due_slot))
+
+
+async def process_users(
+    user_ids: list[int],
+    deliver: bool = True,
+    due_slot: datetime | None = None,
+) -> None:
+    """Run every user's pipeline concurrently, bounded per external service.
+
+    When delivering, users with a prebuilt reminder only get it sent.
+    `due_slot` is the lease slot the batch runs under, derived from the
+    clock when not given.
+    """
+    logger.info(f"Running pipeline for {len(user_ids)} users")
+
+    if deliver:
+        slot, kind = due_slot or leases.get_slot(), JobLease.KIND_RUN
+    else:
+        slot = due_slot or leases.get_slot(
+            timezone.now() + timedelta(minutes=settings.REMINDER_PREBUILD_LEAD_MINUTES)
+        )
+        kind = JobLease.KIND_PREBUILD
+    user_ids = await sync_to_async(leases.acquire)(user_ids, slot, kind)
+
+    delivered_ids: list[int] = []
+    if deliver:
+        delivered_ids = await sync_to_async(deliver_prebuilt_reminders)(user_ids, slot)
+        user_ids = [user_id for user_id in user_ids if user_id not in delivered_ids]
+
+    users_and_tokens = await sync_to_async(get_users_and_tokens)(user_ids)
+    limits = {
+        service: asyncio.Semaphore(concurrency)
+        for service, concurrency in settings.PIPELINE_CONCURRENCY.items()
+    }
+
+    jobs = {
+        user.id: process_user(user, tokens, limits, slot, deliver)
+        for user, tokens in users_and_tokens
+    }
+
+    try:
+        results = await asyncio.gather(*jobs.values(), return_exceptions=True)
+    finally:
+        await sync_to_async(governor.flush)()
+
+    # one user's failure shouldn't cost the rest of the batch their reminders,
+    # and its lease expires so the run can be retried
+    completed_ids = list(delivered_ids)
+    for user_id, result in zip(jobs, results):
+        if isinstance(result, Exception):
+            logger.opt(exception=result).error(f"Pipeline failed for {user_id=}")
+            sentry_sdk.capture_exception(result)
+        else:
+            completed_ids.append(user_id)
+    await sync_to_async(leases.complete)(completed_ids, slot, kind)
+
+    logger.info("Done!")
+
+
+def get_users_and_tokens(
+    user_ids: list[int],
+) -> list[tuple[CustomUser, list[SocialToken]]]:
+    """Load a batch of users and their tokens in two queries."""
+    users = CustomUser.objects.select_related("user_profile").in_bulk(user_ids)
+
+    tokens_by_user: defaultdict[int, list[SocialToken]] = defaultdict(list)
+    for token in (
+        SocialToken.objects.filter(account__user_id__in=user_ids)
+        .select_related("account")
+        .order_by("id")
+    ):
+        tokens_by_user[token.account.user_id].append(token)
+
+    return [
+        (users[user_id], tokens_by_user[user_id])
+        for user_id in user_ids
+        if user_id in users
+    ]
+
+
+async def process_user(
+    user: CustomUser,
+    tokens: list[SocialToken],
+    limits: dict[str, asyncio.Semaphore],
+    slot: datetime,
+    deliver: bool = True,
+) -> None:
+    """Build and store one user's reminder and outbox its email, or keep it for later.
+
+    Prebuilt reminders are kept for `slot`. Prebuilds that can't run now are
+    left for the user's regular slot.
+    """
+    logger.info(f"Pipeline for {user.username}, {len(tokens)} tokens")
+
+    if not tokens:
+        logger.info("No tokens found, exiting")
+        return
+
+    if await is_rate_limited(user, tokens, slot, deliver):
+        return
+
+    cycle_state = None if deliver else await sync_to_async(get_cycle_state)(user)
+    try:
+        async with limits["github"]:
+            # a user ahead in the queue may have run into a limit meanwhile
+            if await is_rate_limited(user, tokens, slot, deliver):
+                return
+            reminder = await build_reminder(user, tokens, deliver)
+    except governor.RateLimitExhausted as error:
+        logger.warning(str(error))
+        # staged stars are kept, the rerun resumes from the ingestion checkpoint
+        if deliver:
+            await sync_to_async(reschedule_user_job)(user.id, error.reset_at, slot)
+        return
+
+    if not reminder:
+        return
+
+    if not deliver:
+        email = await sync_to_async(render_reminder_email)(user, reminder)
+        await sync_to_async(save_prebuilt_reminder)(
+            user, reminder, email, slot, cycle_state
+        )
+        logger.info(f"Prebuilt reminder for {user.username}")
+        return
+
+    await sync_to_async(queue_reminder_email)(user, reminder)
+
+
+async def is_rate_limited(
+    user: CustomUser,
+    tokens: list[SocialToken],
+    slot: datetime,
+    deliver: bool,
+) -> bool:
+    """Whether GitHub's limits block the user's tokens, rescheduling deliveries."""
+    blocked_until = await sync_to_async(governor.get_blocked_until)(
+        [token.token for token in tokens], get_rate_limit_resource()
+    )
+    if blocked_until and deliver:
+        await sync_to_async(reschedule_user_job)(user.id, blocked_until, slot)
+    return blocked_until is not None
+
+
+async def build_reminder(
+    user: CustomUser,
+    tokens: list[SocialToken],
+    delivered: bool = True,
+) -> Reminder | None:
+    """Ingest the user's stars with the configured sync mode and sample a reminder."""
+    if settings.STAR_SYNC_MODE == SYNC_MODE_RESERVOIR:
+        previously_shown_ids = await sync_to_async(get_previously_shown_ids)(user)
+        unshown, everything = await sample_starred(
+            [token.token for token in tokens],
+            user.user_profile.max_entries,
+            user.user_profile.include_archived,
+            previously_shown_ids,
+        )
+        return await sync_to_async(create_sampled_reminder)(
+            user, unshown, everything, len(previously_shown_ids), delivered
+        )
+
+    if settings.STAR_SYNC_MODE == SYNC_MODE_SNAPSHOT:
+        await refresh_snapshot(user, tokens)
+        return await sync_to_async(generate_reminder)(user, delivered)
+
+    if settings.STAR_SYNC_MODE == SYNC_MODE_INCREMENTAL:
+        await refresh_incremental(user, tokens)
+        return await sync_to_async(generate_reminder)(user, delivered)
+
+    await stage_starred(user, tokens)
+
+    try:
+        return await sync_to_async(generate_reminder)(user, delivered)
+    finally:
+        await sync_to_async(cleanup_temp_stars)(user.id)
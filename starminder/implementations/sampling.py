@@ -0,0 +1,119 @@
+import heapq
+import math
+import random
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from django.db import connections
+from django.db.models import Model, QuerySet
+
+
+class ReservoirSampler[T]:
+    """Uniform random sample of a fixed size over a stream of unknown length."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.seen = 0
+        self.sample: list[T] = []
+
+    def add(self, item: T) -> None:
+        self.seen += 1
+
+        if len(self.sample) < self.size:
+            self.sample.append(item)
+            return
+
+        index = random.randrange(self.seen)
+        if index < self.size:
+            self.sample[index] = item
+
+
+def pack_ids(ids: Iterable[int]) -> bytes:
+    """Pack numeric IDs as little-endian int64s, in the given order."""
+    packed = array("q", ids)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_ids(data: bytes) -> array[int]:
+    """Unpack IDs packed by `pack_ids`."""
+    ids = array("q")
+    ids.frombytes(data)
+    if sys.byteorder != "little":
+        ids.byteswap()
+    return ids
+
+
+class SortedIdSet:
+    """Numeric provider IDs as a sorted int64 array, compact to store and search."""
+
+    def __init__(self, ids: Iterable[int | str] = ()) -> None:
+        self.ids = array("q", sorted({int(id_) for id_ in ids}))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SortedIdSet":
+        id_set = cls()
+        id_set.ids = unpack_ids(data)
+        return id_set
+
+    def to_bytes(self) -> bytes:
+        return pack_ids(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, id_: object) -> bool:
+        if not isinstance(id_, int | str):
+            return False
+
+        value = int(id_)
+        index = bisect_left(self.ids, value)
+        return index < len(self.ids) and self.ids[index] == value
+
+    def update(self, ids: Iterable[int | str]) -> None:
+        # a linear merge with the few new IDs, no need to re-sort the whole set
+        new_ids = sorted({int(id_) for id_ in ids if id_ not in self})
+        self.ids = array("q", heapq.merge(self.ids, new_ids))
+
+
+def fetch_in_order[M: Model](queryset: QuerySet[M], pks: list[Any]) -> list[M]:
+    """Fetch the rows of `queryset` with primary keys `pks`, in that order."""
+    rows = queryset.in_bulk(pks)
+    return [rows[pk] for pk in pks]
+
+
+def sample_queryset[M: Model](queryset: QuerySet[M], size: int) -> list[M]:
+    """Pick up to `size` random rows of `queryset` without loading the others."""
+    if connections[queryset.db].vendor == "postgresql":
+        # top-N sort in the database, only the winners cross the wire
+        return list(queryset.order_by("?")[:size])
+
+    # elsewhere sample the primary keys, far lighter than full rows
+    ids = list(queryset.values_list("pk", flat=True))
+    return fetch_in_order(queryset, random.sample(ids, min(size, len(ids))))
+
+
+def weighted_sample[T](
+    items: Sequence[T], weights: Sequence[float], size: int
+) -> list[T]:
+    """Pick up to `size` distinct items, each with odds proportional to its weight.
+
+    Uses Efraimidis-Spirakis keys, so it's a single pass with a `size`-item heap
+    no matter how many items there are. Items weighing nothing are never picked.
+    """
+    keys = (
+        (math.log(1.0 - random.random()) / weight, index)
+        for index, weight in enumerate(weights)
+        if weight > 0
+    )
+    return [items[index] for _, index in heapq.nlargest(size, keys)]
+
+
+def splice_into_tail[T](order: list[T], position: int, items: Iterable[T]) -> None:
+    """Insert `items` at random places in the unvisited part of `order`."""
+    for item in items:
+        order.insert(random.randint(position, len(order)), item)
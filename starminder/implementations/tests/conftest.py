@@ -0,0 +1,45 @@
+import hashlib
+import json
+from typing import Any
+
+import httpx
+
+from starminder.implementations.jobs import GITHUB_STARRED_URL
+
+
+def github_repo(repo_id: int) -> dict[str, Any]:
+    return {
+        "id": repo_id,
+        "name": f"repo{repo_id}",
+        "owner": {"login": "owner", "id": 1},
+        "stargazers_count": 10,
+        "html_url": f"https://github.com/owner/repo{repo_id}",
+    }
+
+
+def github_transport(
+    pages: dict[int, list[dict[str, Any]]],
+    requests: list[httpx.Request] | None = None,
+) -> httpx.MockTransport:
+    """Fake GitHub starred API serving `pages`, with `Link` and `ETag` headers."""
+    last_page = max(pages, default=1)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if requests is not None:
+            requests.append(request)
+
+        page = int(request.url.params["page"])
+        items = pages.get(page, [])
+        etag = f'W/"{hashlib.md5(json.dumps(items).encode()).hexdigest()}"'
+        headers = {"ETag": etag}
+        if last_page > 1:
+            headers["Link"] = (
+                f'<{GITHUB_STARRED_URL}?per_page=100&page={last_page}>; rel="last"'
+            )
+
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers=headers)
+
+        return httpx.Response(200, json=items, headers=headers)
+
+    return httpx.MockTransport(handler)
@@ -0,0 +1,175 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import httpx
+import pytest
+from django.utils import timezone
+
+from starminder.implementations import governor
+from starminder.implementations.models import RateLimitBudget
+
+
+@pytest.fixture(autouse=True)
+def clear_observed():
+    governor._observed.clear()
+    yield
+    governor._observed.clear()
+
+
+def github_response(status_code: int = 200, **headers: str) -> httpx.Response:
+    return httpx.Response(
+        status_code,
+        headers=headers,
+        request=httpx.Request(
+            "GET",
+            "https://api.github.com/user/starred",
+            headers={"Authorization": "Bearer test_token"},
+        ),
+    )
+
+
+def observe(response: httpx.Response) -> None:
+    asyncio.run(governor.observe_response(response))
+
+
+def test_observe_response_records_remaining_budget(settings) -> None:
+    settings.GITHUB_RATE_LIMIT_RESERVE = 100
+
+    observe(
+        github_response(
+            **{"X-RateLimit-Remaining": "4000", "X-RateLimit-Reset": "1800000000"}
+        )
+    )
+
+    assert governor._observed[governor.get_token_key("test_token")] == (
+        4000,
+        datetime.fromtimestamp(1800000000, tz=UTC),
+    )
+
+
+def test_observe_response_keeps_budgets_per_resource(settings) -> None:
+    settings.GITHUB_RATE_LIMIT_RESERVE = 100
+
+    observe(
+        github_response(
+            **{
+                "X-RateLimit-Remaining": "4000",
+                "X-RateLimit-Reset": "1800000000",
+                "X-RateLimit-Resource": "core",
+            }
+        )
+    )
+    observe(
+        github_response(
+            **{
+                "X-RateLimit-Remaining": "3000",
+                "X-RateLimit-Reset": "1800000000",
+                "X-RateLimit-Resource": "graphql",
+            }
+        )
+    )
+
+    assert governor._observed[governor.get_token_key("test_token")][0] == 4000
+    assert (
+        governor._observed[
+            governor.get_token_key("test_token", governor.RESOURCE_GRAPHQL)
+        ][0]
+        == 3000
+    )
+
+
+def test_observe_response_raises_when_reserve_reached(settings) -> None:
+    settings.GITHUB_RATE_LIMIT_RESERVE = 100
+
+    with pytest.raises(governor.RateLimitExhausted) as excinfo:
+        observe(
+            github_response(
+                **{"X-RateLimit-Remaining": "100", "X-RateLimit-Reset": "1800000000"}
+            )
+        )
+
+    assert excinfo.value.reset_at == datetime.fromtimestamp(1800000000, tz=UTC)
+
+
+def test_observe_response_ignores_responses_without_headers() -> None:
+    observe(github_response())
+
+    assert governor._observed == {}
+
+
+def test_observe_response_pauses_app_on_retry_after() -> None:
+    with pytest.raises(governor.RateLimitExhausted) as excinfo:
+        observe(github_response(429, **{"Retry-After": "60"}))
+
+    assert excinfo.value.key == governor.APP_KEY
+    assert governor._observed[governor.APP_KEY][0] == 0
+    assert excinfo.value.reset_at > timezone.now() + timedelta(seconds=50)
+
+
+@pytest.mark.django_db
+def test_flush_persists_and_clears_observed_budgets() -> None:
+    reset_at = timezone.now() + timedelta(minutes=10)
+    governor._observed["token:abc"] = (50, reset_at)
+    RateLimitBudget.objects.create(key="token:abc", remaining=5000, reset_at=reset_at)
+
+    governor.flush()
+
+    budget = RateLimitBudget.objects.get(key="token:abc")
+    assert budget.remaining == 50
+    assert governor._observed == {}
+
+
+@pytest.mark.django_db
+def test_get_blocked_until_returns_latest_exhausted_reset(settings) -> None:
+    settings.GITHUB_RATE_LIMIT_RESERVE = 100
+    soon = timezone.now() + timedelta(minutes=5)
+    later = timezone.now() + timedelta(minutes=30)
+    RateLimitBudget.objects.create(
+        key=governor.get_token_key("a"), remaining=10, reset_at=soon
+    )
+    RateLimitBudget.objects.create(key=governor.APP_KEY, remaining=0, reset_at=later)
+    RateLimitBudget.objects.create(
+        key=governor.get_token_key("b"), remaining=4000, reset_at=later
+    )
+
+    assert governor.get_blocked_until(["a", "b"]) == later
+
+
+@pytest.mark.django_db
+def test_get_blocked_until_ignores_expired_and_healthy_budgets(settings) -> None:
+    settings.GITHUB_RATE_LIMIT_RESERVE = 100
+    RateLimitBudget.objects.create(
+        key=governor.get_token_key("a"),
+        remaining=0,
+        reset_at=timezone.now() - timedelta(minutes=1),
+    )
+    RateLimitBudget.objects.create(
+        key=governor.get_token_key("b"),
+        remaining=4000,
+        reset_at=timezone.now() + timedelta(minutes=30),
+    )
+
+    assert governor.get_blocked_until(["a", "b"]) is None
+
+
+@pytest.mark.django_db
+def test_get_blocked_until_only_checks_the_given_resource(settings) -> None:
+    settings.GITHUB_RATE_LIMIT_RESERVE = 100
+    reset_at = timezone.now() + timedelta(minutes=30)
+    RateLimitBudget.objects.create(
+        key=governor.get_token_key("a", governor.RESOURCE_GRAPHQL),
+        remaining=0,
+        reset_at=reset_at,
+    )
+
+    assert governor.get_blocked_until(["a"]) is None
+    assert governor.get_blocked_until(["a"], governor.RESOURCE_GRAPHQL) == reset_at
+
+
+@pytest.mark.django_db
+def test_get_blocked_until_sees_limits_this_process_has_not_flushed() -> None:
+    with pytest.raises(governor.RateLimitExhausted) as excinfo:
+        observe(github_response(429, **{"Retry-After": "60"}))
+
+    # other tokens are paused too, before any flush() shares the limit
+    assert governor.get_blocked_until(["another_token"]) == excinfo.value.reset_at
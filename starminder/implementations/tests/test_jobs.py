@@ -1,19 +1,64 @@
-from datetime import datetime
-from unittest.mock import MagicMock, Mock, patch
-
+import asyncio
+import json
+from collections import Counter
+from datetime import UTC, datetime, timedelta
+from typing import Any
+from unittest.mock import patch
+
+import httpx
 import pytest
 from allauth.socialaccount.models import SocialAccount, SocialToken
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from starminder.content.models import Reminder, Star
+from starminder.content.models import OutboxEmail, Reminder, Star
+from starminder.core.http import run_async
 from starminder.core.models import UserProfile
+from starminder.implementations import leases
+from starminder.implementations.governor import (
+    APP_KEY,
+    RESOURCE_GRAPHQL,
+    get_token_key,
+)
 from starminder.implementations.jobs import (
+    GITHUB_STARRED_URL,
     cleanup_temp_stars,
+    create_reminder,
+    discard_prebuilt_reminders,
     generate_data,
+    generate_reminder,
+    get_cycle_state,
+    get_last_page,
+    get_previously_shown_ids,
+    get_user_slot,
+    iter_starred_pages,
     pager,
+    prebuild_jobs,
+    sample_stars,
+    save_prebuilt_reminder,
+    save_shown_ids,
+    stage_temp_stars,
     start_jobs,
+    sync_incremental,
+    sync_snapshot,
+    take_from_cycle,
     user_job,
+    user_jobs,
 )
-from starminder.implementations.models import TempStar
+from starminder.implementations.models import (
+    JobLease,
+    PrebuiltReminder,
+    RateLimitBudget,
+    ShownSet,
+    ShuffleCycle,
+    SnapshotPage,
+    SnapshotStar,
+    SyncState,
+    TempStar,
+)
+from starminder.implementations.sampling import SortedIdSet, pack_ids, unpack_ids
+from starminder.implementations.tests.conftest import github_repo, github_transport
 
 
 @pytest.fixture
@@ -51,6 +96,97 @@ def social_token(social_account):
     )
 
 
+def stalling_transport(
+    last_page: int,
+    failing_page: int | None,
+    cancelled_pages: list[int],
+) -> httpx.MockTransport:
+    """Fake GitHub starred API whose pages past the second never finish.
+
+    `failing_page` comes back 404, and stalled pages record their cancellation.
+    """
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params["page"])
+        if page == failing_page:
+            return httpx.Response(404, request=request)
+
+        if page > 2:
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled_pages.append(page)
+                raise
+
+        return httpx.Response(
+            200,
+            json=[github_repo(page)],
+            headers={
+                "Link": (
+                    f'<{GITHUB_STARRED_URL}?per_page=100&page={last_page}>; rel="last"'
+                )
+            },
+        )
+
+    return httpx.MockTransport(handler)
+
+
+def starred_transport(
+    repo_ids: list[int],
+    requests: list[httpx.Request] | None = None,
+) -> httpx.MockTransport:
+    """Fake GitHub starred API serving `star+json` items, newest first."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if requests is not None:
+            requests.append(request)
+
+        page = int(request.url.params["page"])
+        page_ids = repo_ids[(page - 1) * 100 : page * 100]
+        return httpx.Response(
+            200,
+            json=[
+                {"starred_at": "2025-11-02T20:06:00Z", "repo": github_repo(repo_id)}
+                for repo_id in page_ids
+            ],
+        )
+
+    return httpx.MockTransport(handler)
+
+
+def graphql_transport(
+    repos: list[dict[str, Any]],
+    requests: list[httpx.Request] | None = None,
+) -> httpx.MockTransport:
+    """Fake GitHub GraphQL API serving `repos` through cursor pagination."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if requests is not None:
+            requests.append(request)
+
+        variables = json.loads(request.content)["variables"]
+        start = int(variables["after"] or 0)
+        end = start + variables["first"]
+        return httpx.Response(
+            200,
+            json={
+                "data": {
+                    "viewer": {
+                        "starredRepositories": {
+                            "pageInfo": {
+                                "hasNextPage": end < len(repos),
+                                "endCursor": str(end),
+                            },
+                            "nodes": repos[start:end],
+                        }
+                    }
+                }
+            },
+        )
+
+    return httpx.MockTransport(handler)
+
+
 @pytest.fixture
 def temp_star(user):
     return TempStar.objects.create(
@@ -89,9 +225,11 @@ def test_start_jobs_schedules_matching_profiles(
 
     start_jobs()
 
-    assert mock_async_task.call_count == 2
-    scheduled_user_ids = {call[0][1] for call in mock_async_task.call_args_list}
-    assert scheduled_user_ids == {user.id, user2.id}
+    mock_async_task.assert_called_once_with(
+        "starminder.implementations.jobs.user_jobs",
+        [user.id, user2.id],
+        leases.get_slot().isoformat(),
+    )
 
 
 @pytest.mark.django_db
@@ -128,8 +266,9 @@ def test_start_jobs_schedules_every_day_profiles(
     start_jobs()
 
     mock_async_task.assert_called_once_with(
-        "starminder.implementations.jobs.user_job",
-        user.id,
+        "starminder.implementations.jobs.user_jobs",
+        [user.id],
+        leases.get_slot().isoformat(),
     )
 
 
@@ -149,8 +288,339 @@ def test_start_jobs_calls_correct_function_name(
     start_jobs()
 
     mock_async_task.assert_called_once_with(
-        "starminder.implementations.jobs.user_job",
+        "starminder.implementations.jobs.user_jobs",
+        [user.id],
+        leases.get_slot().isoformat(),
+    )
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_user_jobs_routes_pager_to_fetch_queue(
+    mock_async_task, settings, user, social_token
+) -> None:
+    settings.Q_STAGE_CLUSTERS_ENABLED = True
+    user_jobs([user.id])
+
+    mock_async_task.assert_called_once_with(
+        "starminder.implementations.jobs.pager",
+        user.id,
+        [social_token.id],
+        leases.get_slot(),
+        cluster="fetch",
+    )
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.implementations.jobs.datetime")
+def test_start_jobs_queues_async_pipeline_when_enabled(
+    mock_datetime, mock_async_task, settings, user
+) -> None:
+    settings.ASYNC_PIPELINE = True
+    now = datetime(2025, 10, 11, 12, 0)
+    mock_datetime.now.return_value = now
+
+    user.user_profile.day_of_week = now.weekday()
+    user.user_profile.hour_of_day = now.hour
+    user.user_profile.save()
+
+    start_jobs()
+
+    mock_async_task.assert_called_once_with(
+        "starminder.implementations.pipeline.run_pipeline",
+        [user.id],
+        leases.get_slot().isoformat(),
+    )
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.USER_JOB_BATCH_SIZE", 2)
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.implementations.jobs.datetime")
+def test_start_jobs_queues_users_in_batches(
+    mock_datetime, mock_async_task, django_user_model, django_assert_num_queries
+) -> None:
+    now = datetime(2025, 10, 11, 12, 0)
+    mock_datetime.now.return_value = now
+    users = [
+        django_user_model.objects.create_user(username=f"user{i}") for i in range(5)
+    ]
+    UserProfile.objects.update(hour_of_day=now.hour)
+
+    with django_assert_num_queries(1):
+        start_jobs()
+
+    assert [call.args[1] for call in mock_async_task.call_args_list] == [
+        [users[0].id, users[1].id],
+        [users[2].id, users[3].id],
+        [users[4].id],
+    ]
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.schedule")
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.implementations.jobs.datetime")
+def test_start_jobs_spreads_users_over_delivery_window(
+    mock_datetime, mock_async_task, mock_schedule, django_user_model, settings
+) -> None:
+    settings.REMINDER_DELIVERY_WINDOW_MINUTES = 30
+    now = datetime(2025, 10, 11, 12, 0)
+    mock_datetime.now.return_value = now
+    users = [
+        django_user_model.objects.create_user(username=f"user{i}") for i in range(40)
+    ]
+    UserProfile.objects.update(hour_of_day=now.hour)
+
+    start_jobs()
+
+    queued_user_ids = [
+        user_id
+        for call in mock_async_task.call_args_list + mock_schedule.call_args_list
+        for user_id in call.args[1]
+    ]
+    assert sorted(queued_user_ids) == [user.id for user in users]
+    assert mock_schedule.call_count > 1
+    for call in mock_schedule.call_args_list:
+        slot = get_user_slot(call.args[1][0])
+        assert 0 < slot < 30
+        assert all(get_user_slot(user_id) == slot for user_id in call.args[1])
+        assert (
+            timedelta(minutes=slot - 1)
+            < call.kwargs["next_run"] - timezone.now()
+            <= timedelta(minutes=slot)
+        )
+        assert call.args[2] == leases.get_slot().isoformat()
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_user_jobs_keeps_the_slot_it_was_queued_for(
+    mock_async_task, user, social_token
+) -> None:
+    due_slot = leases.get_slot() - timedelta(hours=1)
+    reminder = create_prebuilt_reminder(user, due_slot)
+
+    user_jobs([user.id], due_slot.isoformat())
+
+    reminder.refresh_from_db()
+    assert reminder.delivered_at is not None
+    assert not PrebuiltReminder.objects.exists()
+    mock_async_task.assert_not_called()
+
+
+def test_get_user_slot_is_stable_and_within_window(settings) -> None:
+    settings.REMINDER_DELIVERY_WINDOW_MINUTES = 50
+
+    slots = [get_user_slot(user_id) for user_id in range(1000)]
+
+    assert slots == [get_user_slot(user_id) for user_id in range(1000)]
+    assert set(slots) == set(range(50))
+
+
+def test_get_user_slot_is_zero_without_window(settings) -> None:
+    settings.REMINDER_DELIVERY_WINDOW_MINUTES = 0
+
+    assert {get_user_slot(user_id) for user_id in range(100)} == {0}
+
+
+# user_jobs tests
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_user_jobs_queues_pager_per_user_with_tokens(
+    mock_async_task, user, user2, social_token, django_assert_num_queries
+) -> None:
+    token2 = SocialToken.objects.create(
+        account=SocialAccount.objects.create(user=user, provider="github", uid="uid2"),
+        token="token2",
+    )
+
+    # leases, prebuilt reminders, tokens and completing the tokenless leases,
+    # whatever the batch size
+    with django_assert_num_queries(6):
+        user_jobs([user.id, user2.id])
+
+    mock_async_task.assert_called_once_with(
+        "starminder.implementations.jobs.pager",
+        user.id,
+        [social_token.id, token2.id],
+        leases.get_slot(),
+    )
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_user_jobs_only_sends_prebuilt_reminders(
+    mock_async_task, user, user2, social_token
+) -> None:
+    reminder = Reminder.objects.create(user=user, delivered_at=None)
+    email = {"recipient": "test@example.com", "subject": "s", "html": "h", "text": "t"}
+    PrebuiltReminder.objects.create(
+        user=user, reminder=reminder, email=email, due_slot=leases.get_slot()
+    )
+
+    user_jobs([user.id, user2.id])
+
+    reminder.refresh_from_db()
+    assert reminder.delivered_at is not None
+    assert not PrebuiltReminder.objects.exists()
+    outbox_email = OutboxEmail.objects.get()
+    assert outbox_email.reminder == reminder
+    assert outbox_email.recipient == "test@example.com"
+    mock_async_task.assert_not_called()
+
+
+def create_prebuilt_reminder(user, due_slot) -> Reminder:
+    reminder = Reminder.objects.create(user=user, delivered_at=None)
+    Star.objects.create(
+        reminder=reminder,
+        provider="github",
+        provider_id="1",
+        name="repo1",
+        owner="owner",
+        owner_id="1",
+        star_count=10,
+        repo_url="https://github.com/owner/repo1",
+    )
+    PrebuiltReminder.objects.create(user=user, reminder=reminder, due_slot=due_slot)
+    return reminder
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_user_jobs_discards_stale_prebuilt_reminders(
+    mock_async_task, user, social_token
+) -> None:
+    create_prebuilt_reminder(user, leases.get_slot() - timedelta(hours=1))
+    save_shown_ids(user, SortedIdSet([1]))
+
+    user_jobs([user.id])
+
+    assert not Reminder.objects.exists()
+    assert not Star.objects.exists()
+    assert not ShownSet.objects.exists()
+    assert not OutboxEmail.objects.exists()
+    mock_async_task.assert_called_once_with(
+        "starminder.implementations.jobs.pager",
         user.id,
+        [social_token.id],
+        leases.get_slot(),
+    )
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_prebuild_jobs_discards_prebuilt_reminders_past_their_slot(
+    mock_async_task, settings, user, user2
+) -> None:
+    settings.REMINDER_PREBUILD_LEAD_MINUTES = 30
+    user.user_profile.enabled = False
+    user.user_profile.save()
+    create_prebuilt_reminder(user, leases.get_slot() - timedelta(hours=2))
+    pending = create_prebuilt_reminder(user2, leases.get_slot() - timedelta(hours=1))
+
+    prebuild_jobs()
+
+    assert list(Reminder.objects.all()) == [pending]
+    assert list(PrebuiltReminder.objects.values_list("user_id", flat=True)) == [
+        user2.id
+    ]
+
+
+def prebuild_reminder(user, due_slot) -> None:
+    user.user_profile.refresh_from_db()
+    cycle_state = get_cycle_state(user)
+    reminder = generate_reminder(user, delivered=False)
+    save_prebuilt_reminder(user, reminder, None, due_slot, cycle_state)
+
+
+# 3 repos: the prebuilt reminder starts a new cycle, 4: it finishes this one
+@pytest.mark.django_db
+@pytest.mark.parametrize("repo_count", [3, 4])
+@patch("starminder.implementations.jobs.async_task")
+def test_discarding_a_prebuilt_reminder_restores_the_shown_cycle(
+    mock_async_task, user, repo_count
+) -> None:
+    stage_temp_stars(user, [github_repo(i) for i in range(repo_count)])
+    user.user_profile.max_entries = 2
+    user.user_profile.save()
+    generate_data(user.id)
+    user.user_profile.refresh_from_db()
+    cycle_start_id = user.user_profile.cycle_start_id
+    shown_ids = star_query_shown_ids(user)
+
+    prebuild_reminder(user, leases.get_slot() + timedelta(hours=1))
+    user.user_profile.refresh_from_db()
+    assert user.user_profile.cycle_start_id != cycle_start_id
+
+    discard_prebuilt_reminders(list(PrebuiltReminder.objects.all()))
+
+    user.user_profile.refresh_from_db()
+    assert user.user_profile.cycle_start_id == cycle_start_id
+    assert set(get_previously_shown_ids(user).ids) == shown_ids
+
+
+# 5 repos: the prebuilt reminder moves the position, 3: it reshuffles the cycle
+@pytest.mark.django_db
+@pytest.mark.parametrize("repo_count", [5, 3])
+@patch("starminder.implementations.jobs.async_task")
+def test_discarding_a_prebuilt_reminder_restores_the_shuffle_cycle(
+    mock_async_task, settings, user, repo_count
+) -> None:
+    settings.REMINDER_CYCLE_MODE = "permutation"
+    stage_temp_stars(user, [github_repo(i) for i in range(repo_count)])
+    user.user_profile.max_entries = 2
+    user.user_profile.save()
+    generate_data(user.id)
+    cycle = ShuffleCycle.objects.get(user=user)
+
+    prebuild_reminder(user, leases.get_slot() + timedelta(hours=1))
+    prebuilt = PrebuiltReminder.objects.get(user=user)
+    if repo_count == 5:
+        # the order is only kept when building the reminder changed it
+        assert prebuilt.shuffle_provider_ids is None
+
+    discard_prebuilt_reminders([prebuilt])
+
+    restored_cycle = ShuffleCycle.objects.get(user=user)
+    assert restored_cycle.position == cycle.position
+    assert bytes(restored_cycle.provider_ids) == bytes(cycle.provider_ids)
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.implementations.jobs.datetime")
+def test_prebuild_jobs_queues_users_due_after_lead_time(
+    mock_datetime, mock_async_task, settings, user, user2, django_user_model
+) -> None:
+    settings.REMINDER_PREBUILD_LEAD_MINUTES = 30
+    now = datetime(2025, 10, 11, 11, 35)
+    mock_datetime.now.return_value = now
+
+    prebuilt_user = django_user_model.objects.create_user(username="prebuilt")
+    for profile_user in (user, prebuilt_user):
+        profile_user.user_profile.day_of_week = now.weekday()
+        profile_user.user_profile.hour_of_day = 12
+        profile_user.user_profile.save()
+    user2.user_profile.day_of_week = now.weekday()
+    user2.user_profile.hour_of_day = 11
+    user2.user_profile.save()
+    due_slot = leases.get_slot(timezone.now() + timedelta(minutes=30))
+    PrebuiltReminder.objects.create(
+        user=prebuilt_user,
+        reminder=Reminder.objects.create(user=prebuilt_user, delivered_at=None),
+        due_slot=due_slot,
+    )
+
+    prebuild_jobs()
+
+    mock_async_task.assert_called_once_with(
+        "starminder.implementations.pipeline.prebuild_reminders",
+        [user.id],
+        due_slot,
     )
 
 
@@ -159,17 +629,17 @@ def test_start_jobs_calls_correct_function_name(
 
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
-def test_user_job_queues_pager_with_user_and_tokens(
+def test_user_job_queues_pager_with_user_and_token_ids(
     mock_async_task, user, social_token
 ) -> None:
     user_job(user.id)
 
-    mock_async_task.assert_called_once()
-    call_args = mock_async_task.call_args
-    assert call_args[0][0] == "starminder.implementations.jobs.pager"
-    assert call_args[0][1] == user
-    assert len(call_args[0][2]) == 1
-    assert call_args[0][2][0] == social_token
+    mock_async_task.assert_called_once_with(
+        "starminder.implementations.jobs.pager",
+        user.id,
+        [social_token.id],
+        leases.get_slot(),
+    )
 
 
 @pytest.mark.django_db
@@ -180,6 +650,56 @@ def test_user_job_does_not_queue_when_no_tokens(mock_async_task, user) -> None:
     mock_async_task.assert_not_called()
 
 
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_user_job_sends_reminder_prebuilt_for_this_slot(
+    mock_async_task, user, social_token
+) -> None:
+    reminder = create_prebuilt_reminder(user, leases.get_slot())
+
+    user_job(user.id)
+
+    reminder.refresh_from_db()
+    assert reminder.delivered_at is not None
+    assert not PrebuiltReminder.objects.exists()
+    mock_async_task.assert_not_called()
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_user_job_discards_reminder_prebuilt_for_later_slot(
+    mock_async_task, user, social_token
+) -> None:
+    create_prebuilt_reminder(user, leases.get_slot() + timedelta(hours=1))
+
+    user_job(user.id)
+
+    assert not Reminder.objects.exists()
+    mock_async_task.assert_called_once_with(
+        "starminder.implementations.jobs.pager",
+        user.id,
+        [social_token.id],
+        leases.get_slot(),
+    )
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_user_job_drops_duplicate_runs_in_same_slot(
+    mock_async_task, user, social_token
+) -> None:
+    user_job(user.id)
+    user_jobs([user.id])
+    user_job(user.id)
+
+    mock_async_task.assert_called_once_with(
+        "starminder.implementations.jobs.pager",
+        user.id,
+        [social_token.id],
+        leases.get_slot(),
+    )
+
+
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
 def test_user_job_handles_multiple_tokens(mock_async_task, user, social_token) -> None:
@@ -197,10 +717,8 @@ def test_user_job_handles_multiple_tokens(mock_async_task, user, social_token) -
     user_job(user.id)
 
     mock_async_task.assert_called_once()
-    tokens = mock_async_task.call_args[0][2]
-    assert len(tokens) == 2
-    assert social_token in tokens
-    assert social_token2 in tokens
+    token_ids = mock_async_task.call_args[0][2]
+    assert token_ids == [social_token.id, social_token2.id]
 
 
 # pager tests
@@ -208,29 +726,27 @@ def test_user_job_handles_multiple_tokens(mock_async_task, user, social_token) -
 
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
-@patch("starminder.implementations.jobs.httpx.Client")
+@patch("starminder.core.http.get_async_transport")
 def test_pager_creates_temp_stars_from_api_response(
-    mock_client_class, mock_async_task, user, social_token
+    mock_get_async_transport, mock_async_task, user, social_token
 ) -> None:
-    mock_response = Mock()
-    mock_response.json.return_value = [
+    mock_get_async_transport.return_value = github_transport(
         {
-            "id": 123,
-            "name": "repo1",
-            "owner": {"login": "owner1", "id": 456},
-            "description": "Test repo",
-            "stargazers_count": 100,
-            "html_url": "https://github.com/owner1/repo1",
-            "homepage": "https://example.com",
+            1: [
+                {
+                    "id": 123,
+                    "name": "repo1",
+                    "owner": {"login": "owner1", "id": 456},
+                    "description": "Test repo",
+                    "stargazers_count": 100,
+                    "html_url": "https://github.com/owner1/repo1",
+                    "homepage": "https://example.com",
+                }
+            ]
         }
-    ]
-    mock_client = MagicMock()
-    mock_client.get.return_value = mock_response
-    mock_client.__enter__.return_value = mock_client
-    mock_client.__exit__.return_value = None
-    mock_client_class.return_value = mock_client
+    )
 
-    pager(user, [social_token])
+    pager(user.id, [social_token.id])
 
     assert TempStar.objects.filter(user=user).count() == 1
     temp_star = TempStar.objects.get(user=user)
@@ -247,42 +763,49 @@ def test_pager_creates_temp_stars_from_api_response(
 
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
-@patch("starminder.implementations.jobs.httpx.Client")
-def test_pager_schedules_next_page_when_100_items(
-    mock_client_class, mock_async_task, user, social_token
+@patch("starminder.core.http.get_async_transport")
+def test_pager_fetches_all_pages_from_link_header(
+    mock_get_async_transport, mock_async_task, user, social_token
 ) -> None:
-    mock_response = Mock()
-    mock_response.json.return_value = [
+    requests = []
+    mock_get_async_transport.return_value = github_transport(
         {
-            "id": i,
-            "name": f"repo{i}",
-            "owner": {"login": "owner", "id": 1},
-            "stargazers_count": 10,
-            "html_url": "https://github.com/owner/repo",
-        }
-        for i in range(100)
-    ]
-    mock_client = MagicMock()
-    mock_client.get.return_value = mock_response
-    mock_client.__enter__.return_value = mock_client
-    mock_client.__exit__.return_value = None
-    mock_client_class.return_value = mock_client
+            page: [
+                {
+                    "id": page * 1000 + i,
+                    "name": f"repo{i}",
+                    "owner": {"login": "owner", "id": 1},
+                    "stargazers_count": 10,
+                    "html_url": "https://github.com/owner/repo",
+                }
+                for i in range(100 if page < 3 else 42)
+            ]
+            for page in range(1, 4)
+        },
+        requests,
+    )
 
-    pager(user, [social_token], page=1)
+    slot = leases.get_slot()
+    pager(user.id, [social_token.id], slot)
 
-    mock_async_task.assert_called_once()
-    call_args = mock_async_task.call_args
-    assert call_args[0][0] == "starminder.implementations.jobs.pager"
-    assert call_args[0][1] == user
-    assert call_args[0][2] == [social_token]
-    assert call_args[0][3] == 2
+    assert TempStar.objects.filter(user=user).count() == 242
+    assert sorted(int(request.url.params["page"]) for request in requests) == [
+        1,
+        2,
+        3,
+    ]
+    mock_async_task.assert_called_once_with(
+        "starminder.implementations.jobs.generate_data",
+        user.id,
+        slot,
+    )
 
 
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
-@patch("starminder.implementations.jobs.httpx.Client")
-def test_pager_schedules_next_token_when_partial_page(
-    mock_client_class, mock_async_task, user
+@patch("starminder.core.http.get_async_transport")
+def test_pager_processes_all_tokens_in_one_task(
+    mock_get_async_transport, mock_async_task, user
 ) -> None:
     token1 = SocialToken.objects.create(
         account=SocialAccount.objects.create(user=user, provider="github", uid="uid1"),
@@ -293,55 +816,58 @@ def test_pager_schedules_next_token_when_partial_page(
         token="token2",
     )
 
-    mock_response = Mock()
-    mock_response.json.return_value = [
+    requests = []
+    mock_get_async_transport.side_effect = lambda service: github_transport(
         {
-            "id": 1,
-            "name": "repo1",
-            "owner": {"login": "owner", "id": 1},
-            "stargazers_count": 10,
-            "html_url": "https://github.com/owner/repo",
-        }
-    ]
-    mock_client = MagicMock()
-    mock_client.get.return_value = mock_response
-    mock_client.__enter__.return_value = mock_client
-    mock_client.__exit__.return_value = None
-    mock_client_class.return_value = mock_client
+            1: [
+                {
+                    "id": len(requests),
+                    "name": "repo1",
+                    "owner": {"login": "owner", "id": 1},
+                    "stargazers_count": 10,
+                    "html_url": "https://github.com/owner/repo",
+                }
+            ]
+        },
+        requests,
+    )
 
-    pager(user, [token1, token2], page=1)
+    slot = leases.get_slot()
+    pager(user.id, [token1.id, token2.id], slot)
 
-    mock_async_task.assert_called_once()
-    call_args = mock_async_task.call_args
-    assert call_args[0][0] == "starminder.implementations.jobs.pager"
-    assert call_args[0][1] == user
-    assert call_args[0][2] == [token2]
-    assert call_args[0][3] == 1
+    assert [request.headers["Authorization"] for request in requests] == [
+        "Bearer token1",
+        "Bearer token2",
+    ]
+    assert TempStar.objects.filter(user=user).count() == 2
+    mock_async_task.assert_called_once_with(
+        "starminder.implementations.jobs.generate_data",
+        user.id,
+        slot,
+    )
 
 
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
-@patch("starminder.implementations.jobs.httpx.Client")
-def test_pager_schedules_generate_data_when_last_token(
-    mock_client_class, mock_async_task, user, social_token
+@patch("starminder.core.http.get_async_transport")
+def test_pager_schedules_generate_data_when_done(
+    mock_get_async_transport, mock_async_task, user, social_token
 ) -> None:
-    mock_response = Mock()
-    mock_response.json.return_value = [
+    mock_get_async_transport.return_value = github_transport(
         {
-            "id": 1,
-            "name": "repo1",
-            "owner": {"login": "owner", "id": 1},
-            "stargazers_count": 10,
-            "html_url": "https://github.com/owner/repo",
+            1: [
+                {
+                    "id": 1,
+                    "name": "repo1",
+                    "owner": {"login": "owner", "id": 1},
+                    "stargazers_count": 10,
+                    "html_url": "https://github.com/owner/repo",
+                }
+            ]
         }
-    ]
-    mock_client = MagicMock()
-    mock_client.get.return_value = mock_response
-    mock_client.__enter__.return_value = mock_client
-    mock_client.__exit__.return_value = None
-    mock_client_class.return_value = mock_client
+    )
 
-    pager(user, [social_token], page=1)
+    pager(user.id, [social_token.id])
 
     mock_async_task.assert_called_once()
     call_args = mock_async_task.call_args
@@ -351,54 +877,65 @@ def test_pager_schedules_generate_data_when_last_token(
 
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
-@patch("starminder.implementations.jobs.httpx.Client")
+@patch("starminder.core.http.get_async_transport")
 def test_pager_calls_github_api_with_correct_headers(
-    mock_client_class, mock_async_task, user, social_token
+    mock_get_async_transport, mock_async_task, user, social_token
 ) -> None:
-    mock_response = Mock()
-    mock_response.json.return_value = []
-    mock_client = MagicMock()
-    mock_client.get.return_value = mock_response
-    mock_client.__enter__.return_value = mock_client
-    mock_client.__exit__.return_value = None
-    mock_client_class.return_value = mock_client
+    requests = []
+    mock_get_async_transport.return_value = github_transport({1: []}, requests)
+
+    pager(user.id, [social_token.id])
+
+    assert len(requests) == 1
+    request = requests[0]
+    assert str(request.url.copy_with(query=None)) == GITHUB_STARRED_URL
+    assert request.headers["Accept"] == "application/vnd.github+json"
+    assert request.headers["Authorization"] == f"Bearer {social_token.token}"
+    assert request.url.params["per_page"] == "100"
+    assert request.url.params["page"] == "1"
+
+
+def test_get_last_page_reads_link_header() -> None:
+    response = httpx.Response(
+        200,
+        headers={
+            "Link": (
+                f'<{GITHUB_STARRED_URL}?per_page=100&page=2>; rel="next", '
+                f'<{GITHUB_STARRED_URL}?per_page=100&page=50>; rel="last"'
+            )
+        },
+    )
 
-    pager(user, [social_token], page=1)
+    assert get_last_page(response) == 50
 
-    mock_client.get.assert_called_once()
-    call_args = mock_client.get.call_args
-    assert call_args[0][0] == "https://api.github.com/user/starred"
-    assert call_args[1]["headers"]["Accept"] == "application/vnd.github+json"
-    assert call_args[1]["headers"]["Authorization"] == f"Bearer {social_token.token}"
-    assert call_args[1]["params"]["per_page"] == 100
-    assert call_args[1]["params"]["page"] == 1
+
+def test_get_last_page_defaults_to_one_without_link_header() -> None:
+    assert get_last_page(httpx.Response(200)) == 1
 
 
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
-@patch("starminder.implementations.jobs.httpx.Client")
+@patch("starminder.core.http.get_async_transport")
 def test_pager_handles_null_description_and_project_url(
-    mock_client_class, mock_async_task, user, social_token
+    mock_get_async_transport, mock_async_task, user, social_token
 ) -> None:
-    mock_response = Mock()
-    mock_response.json.return_value = [
+    mock_get_async_transport.return_value = github_transport(
         {
-            "id": 123,
-            "name": "repo1",
-            "owner": {"login": "owner1", "id": 456},
-            "description": None,
-            "stargazers_count": 100,
-            "html_url": "https://github.com/owner1/repo1",
-            "homepage": None,
+            1: [
+                {
+                    "id": 123,
+                    "name": "repo1",
+                    "owner": {"login": "owner1", "id": 456},
+                    "description": None,
+                    "stargazers_count": 100,
+                    "html_url": "https://github.com/owner1/repo1",
+                    "homepage": None,
+                }
+            ]
         }
-    ]
-    mock_client = MagicMock()
-    mock_client.get.return_value = mock_response
-    mock_client.__enter__.return_value = mock_client
-    mock_client.__exit__.return_value = None
-    mock_client_class.return_value = mock_client
+    )
 
-    pager(user, [social_token])
+    pager(user.id, [social_token.id])
 
     temp_star = TempStar.objects.get(user=user)
     assert temp_star.description is None
@@ -407,41 +944,39 @@ def test_pager_handles_null_description_and_project_url(
 
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
-@patch("starminder.implementations.jobs.httpx.Client")
+@patch("starminder.core.http.get_async_transport")
 def test_pager_skips_repos_with_deleted_owner(
-    mock_client_class, mock_async_task, user, social_token
+    mock_get_async_transport, mock_async_task, user, social_token
 ) -> None:
-    mock_response = Mock()
-    mock_response.json.return_value = [
-        {
-            "id": 123,
-            "name": "repo1",
-            "owner": {"login": "owner1", "id": 456},
-            "stargazers_count": 100,
-            "html_url": "https://github.com/owner1/repo1",
-        },
+    mock_get_async_transport.return_value = github_transport(
         {
-            "id": 124,
-            "name": "deleted-repo",
-            "owner": None,
-            "stargazers_count": 50,
-            "html_url": "https://github.com/deleted-user/deleted-repo",
-        },
-        {
-            "id": 125,
-            "name": "repo2",
-            "owner": {"login": "owner2", "id": 789},
-            "stargazers_count": 200,
-            "html_url": "https://github.com/owner2/repo2",
-        },
-    ]
-    mock_client = MagicMock()
-    mock_client.get.return_value = mock_response
-    mock_client.__enter__.return_value = mock_client
-    mock_client.__exit__.return_value = None
-    mock_client_class.return_value = mock_client
+            1: [
+                {
+                    "id": 123,
+                    "name": "repo1",
+                    "owner": {"login": "owner1", "id": 456},
+                    "stargazers_count": 100,
+                    "html_url": "https://github.com/owner1/repo1",
+                },
+                {
+                    "id": 124,
+                    "name": "deleted-repo",
+                    "owner": None,
+                    "stargazers_count": 50,
+                    "html_url": "https://github.com/deleted-user/deleted-repo",
+                },
+                {
+                    "id": 125,
+                    "name": "repo2",
+                    "owner": {"login": "owner2", "id": 789},
+                    "stargazers_count": 200,
+                    "html_url": "https://github.com/owner2/repo2",
+                },
+            ]
+        }
+    )
 
-    pager(user, [social_token])
+    pager(user.id, [social_token.id])
 
     assert TempStar.objects.filter(user=user).count() == 2
     temp_stars = TempStar.objects.filter(user=user).order_by("provider_id")
@@ -449,6 +984,527 @@ def test_pager_skips_repos_with_deleted_owner(
     assert temp_stars[1].name == "repo2"
 
 
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.sentry_sdk")
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_reports_malformed_items_once_per_batch(
+    mock_get_async_transport, mock_async_task, mock_sentry_sdk, user, social_token
+) -> None:
+    malformed_repo = github_repo(2)
+    del malformed_repo["html_url"]
+    mock_get_async_transport.return_value = github_transport(
+        {1: [github_repo(1), malformed_repo, {**github_repo(3), "owner": 7}]}
+    )
+
+    pager(user.id, [social_token.id])
+
+    assert list(
+        TempStar.objects.filter(user=user).values_list("provider_id", flat=True)
+    ) == ["1"]
+    mock_sentry_sdk.capture_message.assert_called_once()
+    assert len(mock_sentry_sdk.capture_message.call_args[1]["extras"]["errors"]) == 2
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_bulk_inserts_temp_stars(
+    mock_get_async_transport,
+    mock_async_task,
+    user,
+    social_token,
+    django_assert_max_num_queries,
+) -> None:
+    mock_get_async_transport.return_value = github_transport(
+        {page: [github_repo(page * 100 + i) for i in range(100)] for page in (1, 2, 3)}
+    )
+
+    # user, tokens, rate limit budgets, sync state, an insert and a checkpoint
+    # per page of 100, then clearing the checkpoint
+    with django_assert_max_num_queries(14):
+        pager(user.id, [social_token.id])
+
+    assert TempStar.objects.filter(user=user).count() == 300
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_graphql_fetcher_follows_cursors(
+    mock_get_async_transport, mock_async_task, settings, user, social_token
+) -> None:
+    settings.STAR_FETCHER = "graphql"
+    requests = []
+    mock_get_async_transport.return_value = graphql_transport(
+        [github_repo(i) for i in range(250)], requests
+    )
+
+    pager(user.id, [social_token.id])
+
+    assert TempStar.objects.filter(user=user).count() == 250
+    assert len(requests) == 3
+    assert all(str(request.url) == settings.GITHUB_GRAPHQL_URL for request in requests)
+    assert [
+        json.loads(request.content)["variables"]["after"] for request in requests
+    ] == [
+        None,
+        "100",
+        "200",
+    ]
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_resumes_from_checkpoint_after_crash(
+    mock_get_async_transport, mock_async_task, settings, user, social_token
+) -> None:
+    settings.STAR_FETCHER = "graphql"
+    requests = []
+    serve_repos = graphql_transport([github_repo(i) for i in range(250)], requests)
+    failures = ["200"]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if json.loads(request.content)["variables"]["after"] in failures:
+            failures.clear()
+            return httpx.Response(500)
+        return serve_repos.handler(request)
+
+    mock_get_async_transport.return_value = httpx.MockTransport(handler)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        pager(user.id, [social_token.id])
+
+    assert TempStar.objects.filter(user=user).count() == 200
+    assert SyncState.objects.get(user=user).checkpoint == {
+        "fetcher": "graphql",
+        "token_id": social_token.id,
+        "position": "200",
+    }
+
+    requests.clear()
+    pager(user.id, [social_token.id])
+
+    assert TempStar.objects.filter(user=user).count() == 250
+    assert [
+        json.loads(request.content)["variables"]["after"] for request in requests
+    ] == ["200"]
+    assert SyncState.objects.get(user=user).checkpoint is None
+    mock_async_task.assert_called_once()
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_skips_tokens_finished_before_checkpoint(
+    mock_get_async_transport, mock_async_task, user, social_token
+) -> None:
+    token2 = SocialToken.objects.create(
+        account=SocialAccount.objects.create(user=user, provider="github", uid="uid2"),
+        token="token2",
+    )
+    SyncState.objects.create(
+        user=user,
+        checkpoint={"fetcher": "rest", "token_id": social_token.id, "position": None},
+        checkpointed_at=timezone.now(),
+    )
+    requests = []
+    mock_get_async_transport.return_value = github_transport(
+        {1: [github_repo(1)]}, requests
+    )
+
+    pager(user.id, [social_token.id, token2.id])
+
+    assert [request.headers["Authorization"] for request in requests] == [
+        "Bearer token2"
+    ]
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_discards_stale_checkpoint_and_staged_stars(
+    mock_get_async_transport, mock_async_task, settings, user, social_token, temp_star
+) -> None:
+    settings.INGEST_CHECKPOINT_TTL_MINUTES = 60
+    SyncState.objects.create(
+        user=user,
+        checkpoint={"fetcher": "rest", "token_id": social_token.id, "position": "5"},
+        checkpointed_at=timezone.now() - timedelta(minutes=61),
+    )
+    requests = []
+    mock_get_async_transport.return_value = github_transport(
+        {1: [github_repo(1)]}, requests
+    )
+
+    pager(user.id, [social_token.id])
+
+    assert [request.url.params["page"] for request in requests] == ["1"]
+    assert list(
+        TempStar.objects.filter(user=user).values_list("provider_id", flat=True)
+    ) == ["1"]
+
+
+@patch("starminder.core.http.get_async_transport")
+def test_iter_starred_pages_rest_resumes_from_position(
+    mock_get_async_transport, settings
+) -> None:
+    settings.STAR_FETCHER = "rest"
+    requests = []
+    mock_get_async_transport.return_value = github_transport(
+        {page: [github_repo(page)] for page in range(1, 5)}, requests
+    )
+
+    async def collect_pages() -> list[tuple[Any, ...]]:
+        return [page async for page in iter_starred_pages("test_token", "3")]
+
+    pages = run_async(collect_pages())
+
+    assert sorted(request.url.params["page"] for request in requests) == ["3", "4"]
+    assert [items for items, _ in pages] == [[github_repo(3)], [github_repo(4)]]
+    assert pages[-1][1] is None
+
+
+@patch("starminder.core.http.get_async_transport")
+def test_iter_starred_pages_rest_cancels_pending_pages_on_error(
+    mock_get_async_transport, settings
+) -> None:
+    settings.STAR_FETCHER = "rest"
+    cancelled_pages = []
+    mock_get_async_transport.return_value = stalling_transport(4, 2, cancelled_pages)
+
+    async def collect_pages() -> list[tuple[Any, ...]]:
+        return [page async for page in iter_starred_pages("test_token")]
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run_async(collect_pages())
+
+    assert sorted(cancelled_pages) == [3, 4]
+
+
+@patch("starminder.core.http.get_async_transport")
+def test_iter_starred_pages_rest_cancels_pending_pages_when_closed(
+    mock_get_async_transport, settings
+) -> None:
+    settings.STAR_FETCHER = "rest"
+    cancelled_pages = []
+    mock_get_async_transport.return_value = stalling_transport(4, None, cancelled_pages)
+
+    async def take_two_pages() -> None:
+        pages = iter_starred_pages("test_token")
+        await anext(pages)
+        await anext(pages)
+        await pages.aclose()
+
+    run_async(take_two_pages())
+
+    assert sorted(cancelled_pages) == [3, 4]
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_graphql_fetcher_maps_aliased_fields(
+    mock_get_async_transport, mock_async_task, settings, user, social_token
+) -> None:
+    settings.STAR_FETCHER = "graphql"
+    mock_get_async_transport.return_value = graphql_transport(
+        [
+            {
+                "id": 123,
+                "name": "repo1",
+                "owner": {"login": "owner1", "id": 456},
+                "description": "Test repo",
+                "stargazers_count": 100,
+                "html_url": "https://github.com/owner1/repo1",
+                "homepage": "https://example.com",
+                "archived": True,
+            }
+        ]
+    )
+
+    pager(user.id, [social_token.id])
+
+    temp_star = TempStar.objects.get(user=user)
+    assert temp_star.provider_id == "123"
+    assert temp_star.owner == "owner1"
+    assert temp_star.owner_id == "456"
+    assert temp_star.star_count == 100
+    assert temp_star.project_url == "https://example.com"
+    assert temp_star.archived is True
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_pager_graphql_fetcher_raises_on_errors(
+    mock_get_async_transport, settings, user, social_token
+) -> None:
+    settings.STAR_FETCHER = "graphql"
+    mock_get_async_transport.return_value = httpx.MockTransport(
+        lambda request: httpx.Response(
+            200, json={"errors": [{"message": "Bad credentials"}]}
+        )
+    )
+
+    with pytest.raises(RuntimeError, match="Bad credentials"):
+        pager(user.id, [social_token.id])
+
+
+# sync_snapshot tests
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_sync_snapshot_stores_stars_and_page_etags(
+    mock_get_async_transport, user, social_token
+) -> None:
+    requests = []
+    mock_get_async_transport.return_value = github_transport(
+        {
+            1: [github_repo(i) for i in range(100)],
+            2: [github_repo(i) for i in range(100, 130)],
+        },
+        requests,
+    )
+
+    sync_snapshot(user, [social_token])
+
+    assert SnapshotStar.objects.filter(user=user).count() == 130
+    pages = SnapshotPage.objects.filter(token=social_token).order_by("number")
+    assert [page.number for page in pages] == [1, 2]
+    assert all(page.etag for page in pages)
+    assert len(pages[0].provider_ids) == 100
+    assert all(request.url.params["direction"] == "asc" for request in requests)
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_sync_snapshot_skips_unchanged_pages(
+    mock_get_async_transport, user, social_token
+) -> None:
+    pages = {
+        1: [github_repo(i) for i in range(100)],
+        2: [github_repo(i) for i in range(100, 130)],
+    }
+    mock_get_async_transport.return_value = github_transport(pages)
+    sync_snapshot(user, [social_token])
+
+    pages[2].append(github_repo(130))
+    requests = []
+    mock_get_async_transport.return_value = github_transport(pages, requests)
+    sync_snapshot(user, [social_token])
+
+    assert all("If-None-Match" in request.headers for request in requests)
+    assert SnapshotStar.objects.filter(user=user).count() == 131
+    assert (
+        len(SnapshotPage.objects.get(token=social_token, number=2).provider_ids) == 31
+    )
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_sync_snapshot_follows_new_pages_when_last_page_fills_up(
+    mock_get_async_transport, user, social_token
+) -> None:
+    pages = {1: [github_repo(i) for i in range(100)]}
+    mock_get_async_transport.return_value = github_transport(pages)
+    sync_snapshot(user, [social_token])
+
+    pages[2] = [github_repo(100)]
+    mock_get_async_transport.return_value = github_transport(pages)
+    sync_snapshot(user, [social_token])
+
+    assert SnapshotStar.objects.filter(user=user).count() == 101
+    assert SnapshotPage.objects.filter(token=social_token).count() == 2
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_sync_snapshot_removes_unstarred_repos(
+    mock_get_async_transport, user, social_token
+) -> None:
+    mock_get_async_transport.return_value = github_transport(
+        {1: [github_repo(1), github_repo(2)]}
+    )
+    sync_snapshot(user, [social_token])
+
+    mock_get_async_transport.return_value = github_transport({1: [github_repo(2)]})
+    sync_snapshot(user, [social_token])
+
+    assert list(
+        SnapshotStar.objects.filter(user=user).values_list("provider_id", flat=True)
+    ) == ["2"]
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_sync_snapshot_cancels_pending_pages_on_error(
+    mock_get_async_transport, user, social_token
+) -> None:
+    cancelled_pages = []
+    mock_get_async_transport.return_value = stalling_transport(4, 2, cancelled_pages)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        sync_snapshot(user, [social_token])
+
+    assert sorted(cancelled_pages) == [3, 4]
+
+
+# sync_incremental tests
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.refresh_snapshot")
+def test_sync_incremental_starts_with_full_sync(
+    mock_refresh_snapshot, user, social_token
+) -> None:
+    sync_incremental(user, [social_token])
+
+    mock_refresh_snapshot.assert_awaited_once()
+    assert mock_refresh_snapshot.call_args[0][:2] == (user, [social_token])
+    assert SyncState.objects.get(user=user).full_synced_at is not None
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_sync_incremental_stops_at_first_known_star(
+    mock_get_async_transport, user, social_token
+) -> None:
+    SyncState.objects.create(user=user, full_synced_at=timezone.now())
+    mock_get_async_transport.return_value = github_transport({1: [github_repo(1)]})
+    sync_snapshot(user, [social_token])
+
+    requests = []
+    mock_get_async_transport.return_value = starred_transport(
+        [3, 2, 1, *range(100, 300)], requests
+    )
+    with patch("starminder.implementations.jobs.refresh_snapshot") as mock_refresh:
+        sync_incremental(user, [social_token])
+
+    mock_refresh.assert_not_called()
+    assert len(requests) == 1
+    assert requests[0].headers["Accept"] == "application/vnd.github.star+json"
+    assert requests[0].url.params["direction"] == "desc"
+    assert set(
+        SnapshotStar.objects.filter(user=user).values_list("provider_id", flat=True)
+    ) == {"1", "2", "3"}
+
+
+@pytest.mark.django_db
+@patch("starminder.core.http.get_async_transport")
+def test_sync_incremental_pages_until_known_star(
+    mock_get_async_transport, user, social_token
+) -> None:
+    SyncState.objects.create(user=user, full_synced_at=timezone.now())
+    SnapshotStar.objects.create(
+        user=user,
+        provider="github",
+        provider_id="1",
+        name="repo1",
+        owner="owner",
+        owner_id="1",
+        star_count=10,
+        repo_url="https://github.com/owner/repo1",
+    )
+
+    requests = []
+    mock_get_async_transport.return_value = starred_transport(
+        [*range(100, 250), 1], requests
+    )
+    sync_incremental(user, [social_token])
+
+    assert len(requests) == 2
+    assert SnapshotStar.objects.filter(user=user).count() == 151
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_generate_data_samples_snapshot_without_cleanup(
+    mock_async_task, settings, user
+) -> None:
+    settings.STAR_SYNC_MODE = "snapshot"
+    SnapshotStar.objects.create(
+        user=user,
+        provider="github",
+        provider_id="1",
+        name="repo1",
+        owner="owner",
+        owner_id="123",
+        star_count=10,
+        repo_url="https://github.com/owner/repo1",
+    )
+    user.user_profile.reminder_email = None
+    user.user_profile.save()
+
+    generate_data(user.id)
+
+    reminder = Reminder.objects.get(user=user)
+    assert list(reminder.star_set.values_list("provider_id", flat=True)) == ["1"]
+    assert SnapshotStar.objects.filter(user=user).count() == 1
+    mock_async_task.assert_not_called()
+
+
+# reservoir mode tests
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_reservoir_mode_stores_only_sampled_stars(
+    mock_get_async_transport, mock_async_task, settings, user, social_token
+) -> None:
+    settings.STAR_SYNC_MODE = "reservoir"
+    mock_get_async_transport.return_value = github_transport(
+        {page: [github_repo(page * 100 + i) for i in range(100)] for page in (1, 2, 3)}
+    )
+    user.user_profile.reminder_email = None
+    user.user_profile.max_entries = 5
+    user.user_profile.save()
+
+    pager(user.id, [social_token.id])
+
+    reminder = Reminder.objects.get(user=user)
+    assert reminder.star_set.count() == 5
+    assert not TempStar.objects.exists()
+    mock_async_task.assert_not_called()
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_reservoir_mode_skips_archived_and_shown(
+    mock_get_async_transport, mock_async_task, settings, user, social_token
+) -> None:
+    settings.STAR_SYNC_MODE = "reservoir"
+    mock_get_async_transport.return_value = github_transport(
+        {
+            1: [
+                github_repo(1),
+                github_repo(2),
+                {**github_repo(3), "archived": True},
+                github_repo(4),
+                github_repo(5),
+            ]
+        }
+    )
+    user.user_profile.reminder_email = None
+    user.user_profile.include_archived = False
+    user.user_profile.max_entries = 2
+    user.user_profile.save()
+
+    pager(user.id, [social_token.id])
+    user.user_profile.refresh_from_db()
+    pager(user.id, [social_token.id])
+
+    first_ids, second_ids = (
+        set(reminder.star_set.values_list("provider_id", flat=True))
+        for reminder in Reminder.objects.filter(user=user).order_by("created_at")
+    )
+    assert len(first_ids) == len(second_ids) == 2
+    assert first_ids | second_ids == {"1", "2", "4", "5"}
+
+
 # generate_data tests
 
 
@@ -517,6 +1573,35 @@ def test_generate_data_does_not_create_reminder_when_no_temp_stars(
     assert Reminder.objects.filter(user=user).count() == 0
 
 
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_generate_data_completes_the_lease_when_no_temp_stars(
+    mock_async_task, user
+) -> None:
+    slot = leases.get_slot()
+    leases.acquire([user.id], slot)
+
+    generate_data(user.id, slot)
+
+    assert JobLease.objects.get(user=user).expires_at is None
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_generate_data_completes_the_lease_of_the_slot_it_started_in(
+    mock_async_task, user, temp_star
+) -> None:
+    # the run started in the previous hour and only finishes in this one
+    slot = leases.get_slot() - timedelta(hours=1)
+    leases.acquire([user.id], slot)
+
+    generate_data(user.id, slot)
+
+    lease = JobLease.objects.get(user=user)
+    assert lease.slot == slot
+    assert lease.expires_at is None
+
+
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
 @patch("starminder.implementations.jobs.render_to_string")
@@ -530,14 +1615,31 @@ def test_generate_data_queues_email_when_email_configured(
 
     generate_data(user.id)
 
-    # Should have 2 calls: one for email send, one for cleanup
-    assert mock_async_task.call_count == 2
+    # the email waits in the outbox, only cleanup is queued
+    assert mock_async_task.call_count == 1
+
+    outbox_email = OutboxEmail.objects.get()
+    assert outbox_email.reminder == Reminder.objects.get(user=user)
+    assert outbox_email.recipient == "user@example.com"
+    assert "☆ Starminder ☆" in outbox_email.subject
+    assert outbox_email.status == OutboxEmail.STATUS_PENDING
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_generate_data_routes_cleanup_to_its_queue(
+    mock_async_task, settings, user, temp_star
+) -> None:
+    settings.Q_STAGE_CLUSTERS_ENABLED = True
+
+    generate_data(user.id)
 
-    # Check email send call
-    email_call = mock_async_task.call_args_list[0]
-    assert email_call[0][0] == "starminder.content.email.send_email"
-    assert email_call[1]["recipient"] == "user@example.com"
-    assert "☆ Starminder ☆" in email_call[1]["subject"]
+    assert [
+        (call.args[0], call.kwargs["cluster"])
+        for call in mock_async_task.call_args_list
+    ] == [
+        ("starminder.implementations.jobs.cleanup_temp_stars", "cleanup"),
+    ]
 
 
 @pytest.mark.django_db
@@ -571,7 +1673,7 @@ def test_generate_data_queues_cleanup(mock_async_task, user, temp_star) -> None:
 
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
-@patch("starminder.implementations.jobs.random.sample")
+@patch("starminder.implementations.jobs.sample_queryset")
 def test_generate_data_samples_randomly(mock_sample, mock_async_task, user) -> None:
     temp_stars = []
     for i in range(10):
@@ -596,7 +1698,7 @@ def test_generate_data_samples_randomly(mock_sample, mock_async_task, user) -> N
     generate_data(user.id)
 
     mock_sample.assert_called_once()
-    assert len(mock_sample.call_args[0][0]) == 10
+    assert mock_sample.call_args[0][0].count() == 10
     assert mock_sample.call_args[0][1] == 5
 
 
@@ -674,39 +1776,37 @@ def test_cleanup_temp_stars_handles_no_temp_stars(user) -> None:
 
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
-@patch("starminder.implementations.jobs.httpx.Client")
+@patch("starminder.core.http.get_async_transport")
 def test_pager_captures_archived_status(
-    mock_client_class, mock_async_task, user, social_token
+    mock_get_async_transport, mock_async_task, user, social_token
 ) -> None:
     """Test that pager captures archived field from GitHub API."""
-    mock_response = Mock()
-    mock_response.json.return_value = [
-        {
-            "id": 123,
-            "name": "active-repo",
-            "owner": {"login": "owner1", "id": 456},
-            "description": "Active repo",
-            "stargazers_count": 100,
-            "html_url": "https://github.com/owner1/active-repo",
-            "archived": False,
-        },
+    mock_get_async_transport.return_value = github_transport(
         {
-            "id": 124,
-            "name": "archived-repo",
-            "owner": {"login": "owner2", "id": 789},
-            "description": "Archived repo",
-            "stargazers_count": 50,
-            "html_url": "https://github.com/owner2/archived-repo",
-            "archived": True,
-        },
-    ]
-    mock_client = MagicMock()
-    mock_client.get.return_value = mock_response
-    mock_client.__enter__.return_value = mock_client
-    mock_client.__exit__.return_value = None
-    mock_client_class.return_value = mock_client
+            1: [
+                {
+                    "id": 123,
+                    "name": "active-repo",
+                    "owner": {"login": "owner1", "id": 456},
+                    "description": "Active repo",
+                    "stargazers_count": 100,
+                    "html_url": "https://github.com/owner1/active-repo",
+                    "archived": False,
+                },
+                {
+                    "id": 124,
+                    "name": "archived-repo",
+                    "owner": {"login": "owner2", "id": 789},
+                    "description": "Archived repo",
+                    "stargazers_count": 50,
+                    "html_url": "https://github.com/owner2/archived-repo",
+                    "archived": True,
+                },
+            ]
+        }
+    )
 
-    pager(user, [social_token])
+    pager(user.id, [social_token.id])
 
     temp_stars = TempStar.objects.filter(user=user).order_by("provider_id")
     assert temp_stars.count() == 2
@@ -716,28 +1816,26 @@ def test_pager_captures_archived_status(
 
 @pytest.mark.django_db
 @patch("starminder.implementations.jobs.async_task")
-@patch("starminder.implementations.jobs.httpx.Client")
+@patch("starminder.core.http.get_async_transport")
 def test_pager_defaults_archived_to_false_when_missing(
-    mock_client_class, mock_async_task, user, social_token
+    mock_get_async_transport, mock_async_task, user, social_token
 ) -> None:
     """Test that pager defaults archived to False if not in API response."""
-    mock_response = Mock()
-    mock_response.json.return_value = [
+    mock_get_async_transport.return_value = github_transport(
         {
-            "id": 123,
-            "name": "repo-without-archived",
-            "owner": {"login": "owner1", "id": 456},
-            "stargazers_count": 100,
-            "html_url": "https://github.com/owner1/repo-without-archived",
+            1: [
+                {
+                    "id": 123,
+                    "name": "repo-without-archived",
+                    "owner": {"login": "owner1", "id": 456},
+                    "stargazers_count": 100,
+                    "html_url": "https://github.com/owner1/repo-without-archived",
+                }
+            ]
         }
-    ]
-    mock_client = MagicMock()
-    mock_client.get.return_value = mock_response
-    mock_client.__enter__.return_value = mock_client
-    mock_client.__exit__.return_value = None
-    mock_client_class.return_value = mock_client
+    )
 
-    pager(user, [social_token])
+    pager(user.id, [social_token.id])
 
     temp_star = TempStar.objects.get(user=user)
     assert temp_star.archived is False
@@ -1150,8 +2248,9 @@ def test_start_jobs_excludes_disabled_users(
 
     # Only the enabled user should be scheduled
     mock_async_task.assert_called_once_with(
-        "starminder.implementations.jobs.user_job",
-        user.id,
+        "starminder.implementations.jobs.user_jobs",
+        [user.id],
+        leases.get_slot().isoformat(),
     )
 
 
@@ -1248,6 +2347,567 @@ def test_reenabling_user_allows_scheduling(
 
     start_jobs()
     mock_async_task.assert_called_once_with(
-        "starminder.implementations.jobs.user_job",
-        user.id,
+        "starminder.implementations.jobs.user_jobs",
+        [user.id],
+        leases.get_slot().isoformat(),
+    )
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.schedule")
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_reschedules_without_requests_when_budget_exhausted(
+    mock_get_async_transport, mock_async_task, mock_schedule, user, social_token
+) -> None:
+    reset_at = timezone.now() + timedelta(minutes=20)
+    RateLimitBudget.objects.create(
+        key=get_token_key(social_token.token), remaining=0, reset_at=reset_at
+    )
+    requests: list[httpx.Request] = []
+    mock_get_async_transport.return_value = github_transport({1: []}, requests)
+
+    pager(user.id, [social_token.id])
+
+    assert requests == []
+    mock_async_task.assert_not_called()
+    mock_schedule.assert_called_once_with(
+        "starminder.implementations.jobs.user_job",
+        user.id,
+        next_run=reset_at,
+    )
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.schedule")
+@patch("starminder.implementations.jobs.async_task")
+def test_pager_checks_the_graphql_budget_with_graphql_fetcher(
+    mock_async_task, mock_schedule, settings, user, social_token
+) -> None:
+    settings.STAR_SYNC_MODE = "staging"
+    settings.STAR_FETCHER = "graphql"
+    reset_at = timezone.now() + timedelta(minutes=20)
+    RateLimitBudget.objects.create(
+        key=get_token_key(social_token.token, RESOURCE_GRAPHQL),
+        remaining=0,
+        reset_at=reset_at,
+    )
+
+    pager(user.id, [social_token.id])
+
+    mock_schedule.assert_called_once_with(
+        "starminder.implementations.jobs.user_job",
+        user.id,
+        next_run=reset_at,
+    )
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.schedule")
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_stops_and_reschedules_when_reserve_reached(
+    mock_get_async_transport,
+    mock_async_task,
+    mock_schedule,
+    user,
+    social_token,
+    settings,
+) -> None:
+    settings.GITHUB_RATE_LIMIT_RESERVE = 100
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            json=[github_repo(1)],
+            headers={"X-RateLimit-Remaining": "99", "X-RateLimit-Reset": "1800000000"},
+        )
+
+    mock_get_async_transport.return_value = httpx.MockTransport(handler)
+
+    pager(user.id, [social_token.id])
+
+    reset_at = datetime.fromtimestamp(1800000000, tz=UTC)
+    assert not TempStar.objects.filter(user=user).exists()
+    mock_async_task.assert_not_called()
+    mock_schedule.assert_called_once_with(
+        "starminder.implementations.jobs.user_job",
+        user.id,
+        next_run=reset_at,
+    )
+    budget = RateLimitBudget.objects.get(key=get_token_key(social_token.token))
+    assert budget.remaining == 99
+    assert budget.reset_at == reset_at
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.schedule")
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_pauses_all_users_on_secondary_rate_limit(
+    mock_get_async_transport, mock_async_task, mock_schedule, user, social_token
+) -> None:
+    mock_get_async_transport.return_value = httpx.MockTransport(
+        lambda request: httpx.Response(429, headers={"Retry-After": "60"})
+    )
+
+    pager(user.id, [social_token.id])
+
+    mock_async_task.assert_not_called()
+    mock_schedule.assert_called_once()
+    assert RateLimitBudget.objects.get(key=APP_KEY).remaining == 0
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_dedupes_stars_shared_between_tokens(
+    mock_get_async_transport, mock_async_task, user
+) -> None:
+    token1 = SocialToken.objects.create(
+        account=SocialAccount.objects.create(user=user, provider="github", uid="uid1"),
+        token="token1",
+    )
+    token2 = SocialToken.objects.create(
+        account=SocialAccount.objects.create(user=user, provider="github", uid="uid2"),
+        token="token2",
+    )
+    pages_by_token = {
+        "Bearer token1": [github_repo(1), github_repo(2), github_repo(2)],
+        "Bearer token2": [github_repo(2), github_repo(3)],
+    }
+    mock_get_async_transport.return_value = httpx.MockTransport(
+        lambda request: httpx.Response(
+            200, json=pages_by_token[request.headers["Authorization"]]
+        )
+    )
+
+    slot = leases.get_slot()
+    pager(user.id, [token1.id, token2.id], slot)
+
+    assert sorted(
+        TempStar.objects.filter(user=user).values_list("provider_id", flat=True)
+    ) == ["1", "2", "3"]
+
+
+@pytest.mark.django_db
+def test_stage_temp_stars_updates_existing_rows(user) -> None:
+    stage_temp_stars(user, [github_repo(1)])
+
+    repo = github_repo(1) | {"stargazers_count": 99}
+    staged_count = stage_temp_stars(user, [repo])
+
+    assert staged_count == 1
+    temp_star = TempStar.objects.get(user=user)
+    assert temp_star.star_count == 99
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_skips_tokens_removed_since_queueing(
+    mock_get_async_transport, mock_async_task, user, social_token
+) -> None:
+    requests: list[httpx.Request] = []
+    mock_get_async_transport.return_value = github_transport({1: []}, requests)
+    token_id = social_token.id
+    social_token.delete()
+
+    pager(user.id, [token_id])
+
+    assert requests == []
+    mock_async_task.assert_not_called()
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+@patch("starminder.core.http.get_async_transport")
+def test_pager_ignores_token_ids_of_other_users(
+    mock_get_async_transport, mock_async_task, user, user2, social_token
+) -> None:
+    requests: list[httpx.Request] = []
+    mock_get_async_transport.return_value = github_transport({1: []}, requests)
+
+    pager(user2.id, [social_token.id])
+
+    assert requests == []
+
+
+# shuffle cycle tests
+
+
+def test_take_from_cycle_walks_the_stored_order() -> None:
+    cycle = ShuffleCycle(provider_ids=pack_ids([3, 1, 2, 4]), position=1)
+    stored_provider_ids = cycle.provider_ids
+
+    taken, cutoff_index = take_from_cycle(cycle, {"1", "2", "3", "4"}, 2)
+
+    assert taken == ["1", "2"]
+    assert cutoff_index is None
+    assert cycle.position == 3
+    # only the position moves, the stored order is left alone
+    assert cycle.provider_ids is stored_provider_ids
+
+
+def test_take_from_cycle_skips_unstarred_repos() -> None:
+    cycle = ShuffleCycle(provider_ids=pack_ids([1, 2, 3, 4]), position=0)
+
+    taken, _ = take_from_cycle(cycle, {"1", "3", "4"}, 2)
+
+    assert taken == ["1", "3"]
+
+
+def test_take_from_cycle_splices_new_repos_into_unvisited_tail() -> None:
+    cycle = ShuffleCycle(provider_ids=pack_ids([1, 2, 3]), position=2)
+
+    taken, _ = take_from_cycle(cycle, {"1", "2", "3", "4", "5"}, 3)
+
+    assert sorted(taken) == ["3", "4", "5"]
+    assert list(unpack_ids(cycle.provider_ids))[:2] == [1, 2]
+
+
+def test_take_from_cycle_starts_new_cycle_when_exhausted() -> None:
+    cycle = ShuffleCycle(provider_ids=pack_ids([1, 2, 3]), position=2)
+
+    taken, cutoff_index = take_from_cycle(cycle, {"1", "2", "3"}, 3)
+
+    assert taken[0] == "3"
+    assert len(set(taken)) == 3
+    assert cutoff_index == 1
+    assert sorted(unpack_ids(cycle.provider_ids)) == [1, 2, 3]
+
+
+def test_take_from_cycle_keeps_repos_taken_before_wraparound_in_new_cycle() -> None:
+    cycle = ShuffleCycle(provider_ids=pack_ids([1, 2, 3, 4]), position=3)
+    provider_ids = {"1", "2", "3", "4"}
+
+    taken, cutoff_index = take_from_cycle(cycle, provider_ids, 2)
+    assert taken[0] == "4"
+    assert cutoff_index == 1
+
+    new_cycle_ids = taken[cutoff_index:]
+    while cycle.position < len(unpack_ids(cycle.provider_ids)):
+        taken, _ = take_from_cycle(cycle, provider_ids, 1)
+        new_cycle_ids += taken
+
+    # "4" came from the old cycle, so the new one still shows it, last
+    assert sorted(new_cycle_ids) == ["1", "2", "3", "4"]
+    assert new_cycle_ids[-1] == "4"
+
+
+def test_take_from_cycle_reports_exact_cycle_completion() -> None:
+    cycle = ShuffleCycle(provider_ids=pack_ids([1, 2, 3]), position=1)
+
+    taken, cutoff_index = take_from_cycle(cycle, {"1", "2", "3"}, 2)
+
+    assert taken == ["2", "3"]
+    assert cutoff_index == 2
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_generate_data_shows_every_repo_once_per_permutation_cycle(
+    mock_async_task, user, settings
+) -> None:
+    settings.REMINDER_CYCLE_MODE = "permutation"
+    stage_temp_stars(user, [github_repo(i) for i in range(12)])
+    user.user_profile.max_entries = 4
+    user.user_profile.save()
+
+    for _ in range(3):
+        generate_data(user.id)
+
+    shown_ids = list(Star.objects.values_list("provider_id", flat=True))
+    assert sorted(shown_ids) == sorted(str(i) for i in range(12))
+    assert user.shuffle_cycle.position == 12
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_generate_data_permutation_cycle_only_advances_position(
+    mock_async_task, user, settings
+) -> None:
+    settings.REMINDER_CYCLE_MODE = "permutation"
+    stage_temp_stars(user, [github_repo(i) for i in range(12)])
+    user.user_profile.max_entries = 4
+    user.user_profile.save()
+    generate_data(user.id)
+
+    with CaptureQueriesContext(connection) as captured:
+        generate_data(user.id)
+
+    (cycle_update,) = [
+        query["sql"]
+        for query in captured.captured_queries
+        if query["sql"].startswith('UPDATE "implementations_shufflecycle"')
+    ]
+    assert '"position"' in cycle_update
+    assert '"provider_ids"' not in cycle_update
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_generate_data_permutation_cycle_picks_up_new_stars(
+    mock_async_task, user, settings
+) -> None:
+    settings.REMINDER_CYCLE_MODE = "permutation"
+    stage_temp_stars(user, [github_repo(i) for i in range(4)])
+    user.user_profile.max_entries = 2
+    user.user_profile.save()
+
+    generate_data(user.id)
+    first_ids = set(Star.objects.values_list("provider_id", flat=True))
+    unshown_ids = sorted({"0", "1", "2", "3"} - first_ids)
+    TempStar.objects.filter(provider_id=unshown_ids[0]).delete()
+    stage_temp_stars(user, [github_repo(4), github_repo(5)])
+    user.user_profile.max_entries = 3
+    user.user_profile.save()
+
+    generate_data(user.id)
+
+    second_reminder = Reminder.objects.order_by("created_at")[1]
+    assert set(second_reminder.star_set.values_list("provider_id", flat=True)) == {
+        unshown_ids[1],
+        "4",
+        "5",
+    }
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_generate_data_permutation_cycle_sets_cycle_start(
+    mock_async_task, user, settings
+) -> None:
+    settings.REMINDER_CYCLE_MODE = "permutation"
+    stage_temp_stars(user, [github_repo(i) for i in range(5)])
+    user.user_profile.max_entries = 3
+    user.user_profile.save()
+
+    generate_data(user.id)
+    generate_data(user.id)
+
+    user.user_profile.refresh_from_db()
+    second_reminder = Reminder.objects.order_by("created_at")[1]
+    stars = list(second_reminder.star_set.order_by("id"))
+    assert user.user_profile.cycle_start == stars[2]
+
+
+# shown set tests
+
+
+def star_query_shown_ids(user) -> set[int]:
+    cycle_start_id = user.user_profile.cycle_start_id
+    if cycle_start_id is None:
+        return set()
+    return {
+        int(provider_id)
+        for provider_id in Star.objects.filter(
+            reminder__user=user, id__gte=cycle_start_id
+        ).values_list("provider_id", flat=True)
+    }
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_shown_set_tracks_stars_across_cycles(mock_async_task, user) -> None:
+    stage_temp_stars(user, [github_repo(i) for i in range(7)])
+    user.user_profile.max_entries = 3
+    user.user_profile.save()
+
+    for _ in range(5):
+        generate_data(user.id)
+
+        user.user_profile.refresh_from_db()
+        shown_set = ShownSet.objects.get(user=user)
+        assert shown_set.cycle_start_id == user.user_profile.cycle_start_id
+        assert set(get_previously_shown_ids(user).ids) == star_query_shown_ids(user)
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_shown_set_is_rebuilt_when_cycle_start_changes(mock_async_task, user) -> None:
+    stage_temp_stars(user, [github_repo(i) for i in range(10)])
+    user.user_profile.max_entries = 4
+    user.user_profile.save()
+    generate_data(user.id)
+    generate_data(user.id)
+
+    later_star = Star.objects.order_by("id")[4]
+    user.user_profile.cycle_start = later_star
+    user.user_profile.save()
+
+    shown_ids = get_previously_shown_ids(user)
+
+    assert set(shown_ids.ids) == star_query_shown_ids(user)
+    assert len(shown_ids) == 4
+    assert ShownSet.objects.get(user=user).cycle_start_id == later_star.id
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_generate_data_reads_shown_set_without_distinct_query(
+    mock_async_task, user
+) -> None:
+    stage_temp_stars(user, [github_repo(i) for i in range(10)])
+    user.user_profile.max_entries = 3
+    user.user_profile.save()
+    generate_data(user.id)
+
+    with CaptureQueriesContext(connection) as captured:
+        generate_data(user.id)
+
+    assert not any("DISTINCT" in query["sql"] for query in captured.captured_queries)
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_generate_data_samples_the_pool_left_out_of_the_shown_set(
+    mock_async_task, user
+) -> None:
+    stage_temp_stars(user, [github_repo(i) for i in range(10)])
+    user.user_profile.max_entries = 4
+    user.user_profile.save()
+    generate_data(user.id)
+    user.user_profile.refresh_from_db()
+    first_ids = star_query_shown_ids(user)
+
+    with CaptureQueriesContext(connection) as captured:
+        generate_data(user.id)
+
+    # the pool excludes the stored shown set, not an anti-join against stars
+    assert not any("EXISTS" in query["sql"] for query in captured.captured_queries)
+    assert any(
+        'NOT ("implementations_tempstar"."provider_id" IN' in query["sql"]
+        for query in captured.captured_queries
+    )
+    user.user_profile.refresh_from_db()
+    assert len(star_query_shown_ids(user)) == 8
+    assert first_ids < star_query_shown_ids(user)
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_generate_data_permutation_cycle_skips_shown_set(
+    mock_async_task, user, settings
+) -> None:
+    settings.REMINDER_CYCLE_MODE = "permutation"
+    stage_temp_stars(user, [github_repo(i) for i in range(7)])
+    user.user_profile.max_entries = 3
+    user.user_profile.save()
+    save_shown_ids(user, SortedIdSet([1, 2]))
+
+    generate_data(user.id)
+
+    assert not ShownSet.objects.filter(user=user).exists()
+
+
+# sampling strategy tests
+
+
+@pytest.mark.django_db
+def test_sample_stars_popular_strategy_favors_starred_repos(user) -> None:
+    stage_temp_stars(
+        user,
+        [github_repo(1) | {"stargazers_count": 0}]
+        + [github_repo(2) | {"stargazers_count": 999}],
+    )
+    user.user_profile.sampling_strategy = UserProfile.SAMPLING_POPULAR
+
+    picks = Counter(
+        sample_stars(user, TempStar.objects.filter(user=user), 1)[0].provider_id
+        for _ in range(200)
+    )
+
+    assert picks["2"] > 190
+
+
+@pytest.mark.django_db
+def test_sample_stars_stale_strategy_favors_long_unseen_repos(user) -> None:
+    stage_temp_stars(user, [github_repo(1), github_repo(2)])
+    reminder = Reminder.objects.create(user=user)
+    Star.objects.create(
+        reminder=reminder,
+        provider="github",
+        provider_id="1",
+        name="repo1",
+        owner="owner",
+        owner_id="1",
+        star_count=10,
+        repo_url="https://github.com/owner/repo1",
+    )
+    user.user_profile.sampling_strategy = UserProfile.SAMPLING_STALE
+
+    picks = Counter(
+        sample_stars(user, TempStar.objects.filter(user=user), 1)[0].provider_id
+        for _ in range(200)
+    )
+
+    # never shown weighs 365 days against 1 for the repo shown today
+    assert picks["2"] > 190
+
+
+@pytest.mark.django_db
+@patch("starminder.implementations.jobs.async_task")
+def test_generate_data_uses_profile_sampling_strategy(mock_async_task, user) -> None:
+    stage_temp_stars(user, [github_repo(i) for i in range(10)])
+    user.user_profile.max_entries = 3
+    user.user_profile.sampling_strategy = UserProfile.SAMPLING_POPULAR
+    user.user_profile.save()
+
+    with patch(
+        "starminder.implementations.jobs.weighted_sample",
+        side_effect=lambda items, weights, size: items[:size],
+    ) as mock_weighted_sample:
+        generate_data(user.id)
+
+    mock_weighted_sample.assert_called_once()
+    assert Star.objects.count() == 3
+
+
+# reminder creation tests
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("star_count", [1, 10, 50])
+def test_create_reminder_uses_constant_queries(
+    user, star_count, django_assert_max_num_queries
+) -> None:
+    stage_temp_stars(user, [github_repo(i) for i in range(star_count)])
+    temp_stars = list(TempStar.objects.filter(user=user))
+
+    # reminder, stars, profile, shown set, plus the savepoint around them
+    with django_assert_max_num_queries(6):
+        reminder = create_reminder(user, temp_stars, None)
+
+    assert reminder.star_set.count() == star_count
+    user.user_profile.refresh_from_db()
+    assert user.user_profile.cycle_start == reminder.star_set.order_by("id").first()
+
+
+@pytest.mark.django_db
+def test_create_reminder_stores_rendered_body(user) -> None:
+    stage_temp_stars(user, [github_repo(i) for i in range(2)])
+    temp_stars = list(TempStar.objects.filter(user=user))
+
+    reminder = create_reminder(user, temp_stars, None)
+
+    reminder.refresh_from_db()
+    assert "owner/repo0" in reminder.body_html
+    assert "owner/repo1" in reminder.body_html
+
+
+@pytest.mark.django_db
+def test_create_reminder_skips_profile_write_mid_cycle(user) -> None:
+    stage_temp_stars(user, [github_repo(i) for i in range(4)])
+    temp_stars = list(TempStar.objects.filter(user=user))
+    first_reminder = create_reminder(user, temp_stars[:2], None)
+    user.user_profile.refresh_from_db()
+    updated_at = user.user_profile.updated_at
+
+    create_reminder(user, temp_stars[2:], None)
+
+    user.user_profile.refresh_from_db()
+    assert user.user_profile.updated_at == updated_at
+    assert (
+        user.user_profile.cycle_start == first_reminder.star_set.order_by("id").first()
     )
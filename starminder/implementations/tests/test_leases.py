@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from starminder.implementations import leases
+from starminder.implementations.models import JobLease
+
+
+@pytest.fixture
+def users(db, django_user_model):
+    return [
+        django_user_model.objects.create_user(username=f"user{i}") for i in range(3)
+    ]
+
+
+def test_get_slot_truncates_to_the_hour() -> None:
+    at = timezone.now().replace(hour=12, minute=34, second=56)
+
+    assert leases.get_slot(at) == at.replace(minute=0, second=0, microsecond=0)
+
+
+def test_acquire_drops_users_already_leased(users) -> None:
+    slot = leases.get_slot()
+    user_ids = [user.id for user in users]
+
+    assert leases.acquire(user_ids[:2], slot) == user_ids[:2]
+    assert leases.acquire(user_ids, slot) == user_ids[2:]
+    assert leases.acquire(user_ids, slot) == []
+
+
+def test_acquire_keys_leases_by_slot_and_kind(users) -> None:
+    slot = leases.get_slot()
+    user_ids = [users[0].id]
+
+    assert leases.acquire(user_ids, slot) == user_ids
+    assert leases.acquire(user_ids, slot, JobLease.KIND_PREBUILD) == user_ids
+    assert leases.acquire(user_ids, slot + timedelta(hours=1)) == user_ids
+
+
+def test_acquire_takes_over_expired_leases(settings, users) -> None:
+    slot = leases.get_slot()
+    user_ids = [users[0].id]
+    leases.acquire(user_ids, slot)
+
+    JobLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    assert leases.acquire(user_ids, slot) == user_ids
+
+
+def test_complete_holds_the_lease_for_the_rest_of_the_slot(users) -> None:
+    slot = leases.get_slot()
+    user_ids = [users[0].id]
+    leases.acquire(user_ids, slot)
+
+    leases.complete(user_ids, slot)
+
+    assert JobLease.objects.get().expires_at is None
+    assert leases.acquire(user_ids, slot) == []
+
+
+def test_release_lets_the_next_run_acquire(users) -> None:
+    slot = leases.get_slot()
+    user_ids = [users[0].id]
+    leases.acquire(user_ids, slot)
+
+    leases.release(users[0].id, slot)
+
+    assert leases.acquire(user_ids, slot) == user_ids
+
+
+def test_acquire_deletes_leases_of_past_slots(users) -> None:
+    slot = leases.get_slot()
+    user_ids = [users[0].id]
+    leases.acquire(user_ids, slot - timedelta(hours=1))
+
+    leases.acquire(user_ids, slot)
+
+    assert list(JobLease.objects.values_list("slot", flat=True)) == [slot]
@@ -0,0 +1,244 @@
+import asyncio
+from datetime import timedelta
+from unittest.mock import patch
+
+import httpx
+import pytest
+from allauth.socialaccount.models import SocialAccount, SocialToken
+
+from starminder.content.models import OutboxEmail, Reminder
+from starminder.core import http
+from starminder.implementations import leases
+from starminder.implementations.models import (
+    PrebuiltReminder,
+    SnapshotStar,
+    TempStar,
+)
+from starminder.implementations.pipeline import (
+    prebuild_reminders,
+    process_users,
+    run_pipeline,
+)
+from starminder.implementations.tests.conftest import github_repo, github_transport
+
+# the pipeline queries from asgiref's executor thread, which can't see the
+# rows of a test that is still inside its transaction
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def create_user_with_token(django_user_model, username: str, token: str):
+    user = django_user_model.objects.create_user(
+        username=username,
+        email=f"{username}@example.com",
+        password="testpass123",
+    )
+    account = SocialAccount.objects.create(user=user, provider="github", uid=username)
+    SocialToken.objects.create(account=account, token=token)
+    return user
+
+
+@patch("starminder.core.http.get_async_transport")
+def test_run_pipeline_builds_and_emails_reminders_for_each_user(
+    mock_get_async_transport, django_user_model
+) -> None:
+    mock_get_async_transport.return_value = github_transport(
+        {1: [github_repo(i) for i in range(3)]}
+    )
+    users = [
+        create_user_with_token(django_user_model, f"user{i}", f"token{i}")
+        for i in range(3)
+    ]
+
+    run_pipeline([user.id for user in users])
+
+    for user in users:
+        assert Reminder.objects.get(user=user).star_set.count() == 3
+    assert not TempStar.objects.exists()
+    assert sorted(OutboxEmail.objects.values_list("recipient", flat=True)) == [
+        "user0@example.com",
+        "user1@example.com",
+        "user2@example.com",
+    ]
+
+
+@pytest.mark.parametrize("sync_mode", ["snapshot", "incremental"])
+@patch("starminder.core.http._runners", {})
+@patch("starminder.core.http.get_async_transport")
+def test_process_users_syncs_catalogs_on_the_pipeline_loop(
+    mock_get_async_transport, sync_mode, settings, django_user_model
+) -> None:
+    settings.STAR_SYNC_MODE = sync_mode
+    mock_get_async_transport.return_value = github_transport(
+        {1: [github_repo(i) for i in range(3)]}
+    )
+    users = [
+        create_user_with_token(django_user_model, f"user{i}", f"token{i}")
+        for i in range(2)
+    ]
+
+    asyncio.run(process_users([user.id for user in users]))
+
+    for user in users:
+        assert Reminder.objects.get(user=user).star_set.count() == 3
+        assert SnapshotStar.objects.filter(user=user).count() == 3
+    # no thread of its own with another event loop per user
+    assert http._runners == {}
+
+
+@patch("starminder.core.http.get_async_transport")
+def test_process_users_bounds_concurrent_github_users(
+    mock_get_async_transport, settings, django_user_model
+) -> None:
+    settings.PIPELINE_CONCURRENCY = {"github": 2}
+    in_flight = set()
+    max_in_flight = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal max_in_flight
+        token = request.headers["Authorization"]
+        in_flight.add(token)
+        max_in_flight = max(max_in_flight, len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.discard(token)
+        return httpx.Response(200, json=[github_repo(1)])
+
+    mock_get_async_transport.return_value = httpx.MockTransport(handler)
+    users = [
+        create_user_with_token(django_user_model, f"user{i}", f"token{i}")
+        for i in range(5)
+    ]
+
+    asyncio.run(process_users([user.id for user in users]))
+
+    assert Reminder.objects.count() == 5
+    assert max_in_flight == 2
+
+
+@patch("starminder.implementations.pipeline.reschedule_user_job")
+@patch("starminder.core.http.get_async_transport")
+def test_process_users_stops_calling_github_after_a_secondary_limit(
+    mock_get_async_transport, mock_reschedule_user_job, settings, django_user_model
+) -> None:
+    settings.PIPELINE_CONCURRENCY = {"github": 1}
+    requested_tokens = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested_tokens.append(request.headers["Authorization"])
+        return httpx.Response(429, headers={"Retry-After": "60"})
+
+    mock_get_async_transport.return_value = httpx.MockTransport(handler)
+    users = [
+        create_user_with_token(django_user_model, f"user{i}", f"token{i}")
+        for i in range(3)
+    ]
+
+    asyncio.run(process_users([user.id for user in users]))
+
+    # the users waiting for the semaphore see the limit before it's flushed
+    assert len(requested_tokens) == 1
+    assert mock_reschedule_user_job.call_count == 3
+    assert not Reminder.objects.exists()
+
+
+@patch("starminder.implementations.pipeline.sentry_sdk")
+@patch("starminder.core.http.get_async_transport")
+def test_process_users_isolates_failing_users(
+    mock_get_async_transport, mock_sentry_sdk, django_user_model
+) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers["Authorization"] == "Bearer broken":
+            return httpx.Response(500)
+        return httpx.Response(200, json=[github_repo(1)])
+
+    mock_get_async_transport.return_value = httpx.MockTransport(handler)
+    broken_user = create_user_with_token(django_user_model, "broken", "broken")
+    user = create_user_with_token(django_user_model, "fine", "fine")
+
+    asyncio.run(process_users([broken_user.id, user.id]))
+
+    assert not Reminder.objects.filter(user=broken_user).exists()
+    assert Reminder.objects.filter(user=user).exists()
+    mock_sentry_sdk.capture_exception.assert_called_once()
+
+
+@patch("starminder.core.http.get_async_transport")
+def test_process_users_skips_users_without_tokens(
+    mock_get_async_transport, django_user_model
+) -> None:
+    user = django_user_model.objects.create_user(username="tokenless")
+
+    asyncio.run(process_users([user.id]))
+
+    assert not Reminder.objects.exists()
+    mock_get_async_transport.assert_not_called()
+    assert not OutboxEmail.objects.exists()
+
+
+@patch("starminder.core.http.get_async_transport")
+def test_prebuilt_reminder_is_only_sent_at_delivery(
+    mock_get_async_transport, django_user_model
+) -> None:
+    requests = []
+    mock_get_async_transport.return_value = github_transport(
+        {1: [github_repo(i) for i in range(3)]}, requests
+    )
+    user = create_user_with_token(django_user_model, "early", "token")
+
+    prebuild_reminders([user.id])
+
+    reminder = Reminder.objects.get(user=user)
+    assert reminder.delivered_at is None
+    assert reminder.star_set.count() == 3
+    prebuilt = PrebuiltReminder.objects.get(user=user)
+    assert prebuilt.email["recipient"] == "early@example.com"
+    assert not OutboxEmail.objects.exists()
+
+    requests.clear()
+    run_pipeline([user.id])
+
+    reminder.refresh_from_db()
+    assert reminder.delivered_at is not None
+    assert Reminder.objects.filter(user=user).count() == 1
+    assert not PrebuiltReminder.objects.exists()
+    assert not requests
+    outbox_email = OutboxEmail.objects.get()
+    assert outbox_email.reminder == reminder
+    assert outbox_email.html == prebuilt.email["html"]
+
+
+@patch("starminder.core.http.get_async_transport")
+def test_stale_prebuilt_reminder_is_replaced_at_delivery(
+    mock_get_async_transport, django_user_model
+) -> None:
+    mock_get_async_transport.return_value = github_transport(
+        {1: [github_repo(i) for i in range(3)]}
+    )
+    user = create_user_with_token(django_user_model, "late", "token")
+    prebuild_reminders([user.id], leases.get_slot() - timedelta(hours=1))
+    stale_reminder = Reminder.objects.get(user=user)
+
+    run_pipeline([user.id])
+
+    reminder = Reminder.objects.get(user=user)
+    assert reminder != stale_reminder
+    assert reminder.delivered_at is not None
+    assert not PrebuiltReminder.objects.exists()
+    assert OutboxEmail.objects.get().reminder == reminder
+
+
+@patch("starminder.core.http.get_async_transport")
+def test_run_pipeline_drops_duplicate_runs(
+    mock_get_async_transport, django_user_model
+) -> None:
+    requests = []
+    mock_get_async_transport.return_value = github_transport(
+        {1: [github_repo(1)]}, requests
+    )
+    user = create_user_with_token(django_user_model, "once", "token")
+
+    run_pipeline([user.id])
+    run_pipeline([user.id])
+
+    assert Reminder.objects.filter(user=user).count() == 1
+    assert len(requests) == 1
+    assert OutboxEmail.objects.count() == 1
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+from django.db import connection
+
+from starminder.content.models import Reminder, Star
+from starminder.core.models import UserProfile
+from starminder.implementations.jobs import get_shown_stars, stage_temp_stars
+from starminder.implementations.models import TempStar
+
+# PostgreSQL rightly prefers sequential scans on tables this small
+pytestmark = pytest.mark.skipif(
+    connection.vendor != "sqlite",
+    reason="query plans are asserted for SQLite",
+)
+
+
+@pytest.fixture
+def seeded_user(db, django_user_model):
+    user = django_user_model.objects.create_user(username="testuser")
+    stage_temp_stars(
+        user,
+        [
+            {
+                "id": i,
+                "name": f"repo{i}",
+                "owner": {"login": "owner", "id": 1},
+                "stargazers_count": i,
+                "html_url": f"https://github.com/owner/repo{i}",
+                "archived": i % 10 == 0,
+            }
+            for i in range(200)
+        ],
+    )
+
+    reminder = Reminder.objects.create(user=user)
+    stars = Star.objects.bulk_create(
+        Star(
+            reminder=reminder,
+            provider="github",
+            provider_id=str(i),
+            name=f"repo{i}",
+            owner="owner",
+            owner_id="1",
+            star_count=i,
+            repo_url=f"https://github.com/owner/repo{i}",
+        )
+        for i in range(20)
+    )
+    user.user_profile.cycle_start = stars[0]
+    user.user_profile.save()
+    return user
+
+
+def test_scheduled_profiles_use_partial_index(seeded_user) -> None:
+    plan = UserProfile.objects.scheduled_for(datetime(2025, 1, 1, 5)).explain()
+
+    assert "userprofile_scheduled_idx" in plan
+
+
+def test_feed_reminders_use_user_created_index(seeded_user) -> None:
+    plan = Reminder.objects.filter(user=seeded_user).order_by("-created_at").explain()
+
+    assert "reminder_user_created_idx" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_unshown_candidates_use_candidate_index(seeded_user) -> None:
+    plan = TempStar.objects.filter(user=seeded_user, archived=False).explain()
+
+    assert "tempstar_candidates_idx" in plan
+
+
+def test_shown_set_rebuild_reads_only_the_shown_index(seeded_user) -> None:
+    plan = get_shown_stars(seeded_user).values_list("provider_id").explain()
+
+    assert "COVERING INDEX star_reminder_shown_idx" in plan
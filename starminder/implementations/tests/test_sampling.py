@@ -0,0 +1,159 @@
+from collections import Counter
+from unittest.mock import patch
+
+import pytest
+
+from starminder.implementations.models import TempStar
+from starminder.implementations.sampling import (
+    ReservoirSampler,
+    SortedIdSet,
+    sample_queryset,
+    splice_into_tail,
+    weighted_sample,
+)
+
+
+@pytest.fixture
+def temp_stars(db, django_user_model):
+    user = django_user_model.objects.create_user(username="testuser")
+    return TempStar.objects.bulk_create(
+        TempStar(
+            user=user,
+            provider="github",
+            provider_id=str(i),
+            name=f"repo{i}",
+            owner="owner",
+            owner_id="1",
+            star_count=1,
+            repo_url=f"https://github.com/owner/repo{i}",
+        )
+        for i in range(20)
+    )
+
+
+def test_reservoir_sampler_keeps_everything_when_stream_is_short() -> None:
+    sampler = ReservoirSampler[int](5)
+    for i in range(3):
+        sampler.add(i)
+
+    assert sampler.seen == 3
+    assert sorted(sampler.sample) == [0, 1, 2]
+
+
+def test_reservoir_sampler_caps_sample_size() -> None:
+    sampler = ReservoirSampler[int](5)
+    for i in range(1000):
+        sampler.add(i)
+
+    assert sampler.seen == 1000
+    assert len(sampler.sample) == 5
+    assert len(set(sampler.sample)) == 5
+
+
+def test_reservoir_sampler_is_roughly_uniform() -> None:
+    counts: Counter[int] = Counter()
+    for _ in range(2000):
+        sampler = ReservoirSampler[int](2)
+        for i in range(10):
+            sampler.add(i)
+        counts.update(sampler.sample)
+
+    # each item is expected 400 times
+    assert all(250 < counts[i] < 550 for i in range(10))
+
+
+def test_sample_queryset_picks_distinct_rows(temp_stars) -> None:
+    sampled = sample_queryset(TempStar.objects.all(), 5)
+
+    assert len(sampled) == 5
+    assert len({star.pk for star in sampled}) == 5
+    assert all(isinstance(star, TempStar) for star in sampled)
+
+
+def test_sample_queryset_returns_everything_when_pool_is_small(temp_stars) -> None:
+    sampled = sample_queryset(TempStar.objects.filter(provider_id__in=["1", "2"]), 5)
+
+    assert sorted(star.provider_id for star in sampled) == ["1", "2"]
+
+
+def test_sample_queryset_is_roughly_uniform(temp_stars) -> None:
+    counts: Counter[str] = Counter()
+    for _ in range(400):
+        for star in sample_queryset(TempStar.objects.all(), 5):
+            counts[star.provider_id] += 1
+
+    # each row is expected 100 times
+    assert len(counts) == 20
+    assert min(counts.values()) > 50
+
+
+@patch("starminder.implementations.sampling.connections")
+def test_sample_queryset_orders_randomly_in_database_on_postgres(
+    mock_connections, temp_stars, django_assert_num_queries
+) -> None:
+    mock_connections.__getitem__.return_value.vendor = "postgresql"
+
+    with django_assert_num_queries(1) as captured:
+        sampled = sample_queryset(TempStar.objects.all(), 5)
+
+    assert len(sampled) == 5
+    assert "ORDER BY RAND" in captured.captured_queries[0]["sql"]
+    assert "LIMIT 5" in captured.captured_queries[0]["sql"]
+
+
+def test_splice_into_tail_keeps_visited_head() -> None:
+    order = [1, 2, 3]
+
+    splice_into_tail(order, 2, [4, 5])
+
+    assert order[:2] == [1, 2]
+    assert sorted(order[2:]) == [3, 4, 5]
+
+
+def test_sorted_id_set_round_trips_through_bytes() -> None:
+    id_set = SortedIdSet(["30", "10", "20", "10"])
+
+    restored = SortedIdSet.from_bytes(id_set.to_bytes())
+
+    assert list(restored.ids) == [10, 20, 30]
+    assert len(id_set.to_bytes()) == 3 * 8
+
+
+def test_sorted_id_set_membership_accepts_str_and_int() -> None:
+    id_set = SortedIdSet([1, 5, 9])
+
+    assert "5" in id_set
+    assert 9 in id_set
+    assert "4" not in id_set
+    assert 10 not in id_set
+    assert None not in id_set
+
+
+def test_sorted_id_set_update() -> None:
+    id_set = SortedIdSet(["1", "3"])
+
+    id_set.update(["2", "3"])
+
+    assert list(id_set.ids) == [1, 2, 3]
+
+
+def test_weighted_sample_picks_distinct_items() -> None:
+    sampled = weighted_sample(list(range(10)), [1.0] * 10, 5)
+
+    assert len(sampled) == 5
+    assert len(set(sampled)) == 5
+
+
+def test_weighted_sample_never_picks_weightless_items() -> None:
+    sampled = weighted_sample(["a", "b", "c"], [0, 1, 0], 3)
+
+    assert sampled == ["b"]
+
+
+def test_weighted_sample_favors_heavy_items() -> None:
+    counts: Counter[str] = Counter()
+    for _ in range(2000):
+        counts.update(weighted_sample(["light", "heavy"], [1, 9], 1))
+
+    # expected 1800 heavy picks
+    assert 1650 < counts["heavy"] < 1950
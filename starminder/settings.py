@@ -218,7 +218,18 @@ Q_CLUSTER = {
     "orm": "default",
     "timeout": 3 * 60,
     "retry": 3 * 60 + 30,  # has to be longer than timeout
+    # per-stage queues (see starminder.core.queues), each worked by its own
+    # cluster started with `Q_CLUSTER_NAME=<stage> manage.py qcluster`
+    "ALT_CLUSTERS": {
+        "fetch": {"workers": 4, "timeout": 10 * 60, "retry": 10 * 60 + 30},
+        "sample": {"workers": 2, "timeout": 3 * 60, "retry": 3 * 60 + 30},
+        "email": {"workers": 2, "timeout": 60, "retry": 90},
+        "cleanup": {"workers": 1, "timeout": 3 * 60, "retry": 3 * 60 + 30},
+        "signup": {"workers": 1, "timeout": 3 * 60, "retry": 3 * 60 + 30},
+    },
 }
+# route tasks to the per-stage queues, only once a cluster runs for each stage
+Q_STAGE_CLUSTERS_ENABLED = parsenvy.bool("Q_STAGE_CLUSTERS_ENABLED", False)
 if DEBUG:
     # Use sync mode to avoid SQLite multiprocessing issues
     Q_CLUSTER["sync"] = True
@@ -238,7 +249,95 @@ PYPROJECT_TOML_PATH = BASE_DIR / "pyproject.toml"
 PYPROJECT_TOML_DATA = tomllib.loads(PYPROJECT_TOML_PATH.read_text())
 STARMINDER_VERSION = PYPROJECT_TOML_DATA["project"]["version"]
 
+# "staging" refetches every star into TempStars on each run, "snapshot" keeps a
+# persistent SnapshotStar catalog and only refetches pages whose ETag changed,
+# "incremental" only fetches stars newer than the catalog between full sweeps,
+# "reservoir" samples while streaming and stores nothing but the reminder
+STAR_SYNC_MODE = parsenvy.str("STAR_SYNC_MODE", "staging")
+FULL_SYNC_INTERVAL_DAYS = parsenvy.int("FULL_SYNC_INTERVAL_DAYS", 7)
+# staging ingestion checkpoints every page; a retry within this many minutes
+# resumes from the checkpoint instead of starting over
+INGEST_CHECKPOINT_TTL_MINUTES = parsenvy.int("INGEST_CHECKPOINT_TTL_MINUTES", 120)
+
+# minutes after the hourly start_jobs tick over which users' jobs are spread,
+# each user in a stable slot; 0 starts everyone at once. Jobs keep the hour's
+# lease slot even when they start past the hour
+REMINDER_DELIVERY_WINDOW_MINUTES = parsenvy.int("REMINDER_DELIVERY_WINDOW_MINUTES", 0)
+
+# minutes ahead of their slot that reminders are fetched, sampled and rendered,
+# leaving only the send for the slot itself; 0 builds them at the slot
+REMINDER_PREBUILD_LEAD_MINUTES = parsenvy.int("REMINDER_PREBUILD_LEAD_MINUTES", 0)
+
+# each user's run is leased per hourly slot so overlapping triggers (signup,
+# start_jobs, generate_content) don't run it twice; an unfinished run's lease
+# expires after this long so it can be retried
+JOB_LEASE_MINUTES = parsenvy.int("JOB_LEASE_MINUTES", 30)
+
+# run each batch of user jobs as coroutines in one worker (see
+# starminder.implementations.pipeline) instead of a chain of tasks per user,
+# with at most this many users talking to each service at a time
+ASYNC_PIPELINE = parsenvy.bool("ASYNC_PIPELINE", False)
+PIPELINE_CONCURRENCY = {
+    "github": parsenvy.int("PIPELINE_GITHUB_CONCURRENCY", 16),
+}
+
+# "shown" samples repos not yet shown since the cycle started, "permutation"
+# walks a stored shuffle of all repos; reservoir syncs always use "shown"
+REMINDER_CYCLE_MODE = parsenvy.str("REMINDER_CYCLE_MODE", "shown")
+
+# "rest" pages through /user/starred, "graphql" asks only for the stored fields;
+# used by the staging and reservoir modes, the others rely on REST ETags
+STAR_FETCHER = parsenvy.str("STAR_FETCHER", "rest")
+GITHUB_GRAPHQL_URL = parsenvy.str(
+    "GITHUB_GRAPHQL_URL", "https://api.github.com/graphql"
+)
+
+# requests to keep in hand per token, work is rescheduled instead of spending them
+GITHUB_RATE_LIMIT_RESERVE = parsenvy.int("GITHUB_RATE_LIMIT_RESERVE", 100)
+
+# outbound HTTP pools, one per service per worker process (see starminder.core.http)
+HTTP_CLIENT_DEFAULTS = {
+    "timeout": 10.0,
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30.0,
+    "retries": 5,
+    "backoff_factor": 0.5,
+    "retry_statuses": [429, 502, 503, 504],
+    # only requests that are safe to repeat, services opt their POSTs in
+    "retry_methods": ["GET", "HEAD", "OPTIONS", "PUT", "DELETE"],
+    "respect_retry_after": True,
+}
+HTTP_CLIENTS = {
+    "github": {
+        "max_connections": 40,
+        "max_keepalive_connections": 20,
+        # rate limited responses go to the governor, which reschedules the work,
+        # instead of being slept on and retried inside the task
+        "retry_statuses": [502, 503, 504],
+        "respect_retry_after": False,
+        # GraphQL queries are POSTed, but only ever read
+        "retry_methods": ["GET", "POST"],
+    },
+    # the outbox retries failed sends itself, with backoff and a status per email
+    "forwardemail": {"retries": 0},
+    "pushover": {"retries": 2, "retry_methods": ["POST"]},
+}
+
 FORWARDEMAIL_TOKEN = parsenvy.str("FORWARDEMAIL_TOKEN")
+# point at a local fake ForwardEmail server to exercise delivery without sending
+FORWARDEMAIL_API_URL = parsenvy.str(
+    "FORWARDEMAIL_API_URL", "https://api.forwardemail.net/v1/emails"
+)
+
+# emails go through the outbox (see starminder.content.outbox), drained every
+# minute with at most this many sends in flight; transient failures are retried
+# with exponential backoff until the email has been tried this many times
+OUTBOX_CONCURRENCY = parsenvy.int("OUTBOX_CONCURRENCY", 8)
+OUTBOX_MAX_ATTEMPTS = parsenvy.int("OUTBOX_MAX_ATTEMPTS", 6)
+OUTBOX_RETRY_BACKOFF_SECONDS = parsenvy.int("OUTBOX_RETRY_BACKOFF_SECONDS", 60)
+# sent and failed emails are purged daily once they are this old
+OUTBOX_RETENTION_DAYS = parsenvy.int("OUTBOX_RETENTION_DAYS", 30)
 EMAIL_FROM = "Starminder <hello@starminder.dev>"
 
 PUSHOVER_USER_KEY = parsenvy.str("PUSHOVER_USER_KEY")